@@ -0,0 +1,116 @@
+"""
+    BackgroundWorker.py
+    See class description
+"""
+import threading
+try:
+    # for Python2
+    import Queue as queue
+except ImportError:
+    # for Python3
+    import queue
+
+# Milliseconds between two checks for messages of the running task
+POLL_INTERVAL = 100
+
+
+class BackgroundWorker(object):
+
+    """ Runs tasks on a background thread, so long computations don't
+        block the Tk loop. Tk must only be used from its own thread, so
+        messages and results of a task are put into a queue that is polled
+        on the Tk loop of the given widget with after(). The callbacks are
+        therefore always executed on the Tk thread.
+        Only one task runs at a time, starting a task cancels the previous
+        one. Messages of a cancelled task are discarded."""
+
+    def __init__(self, widget):
+        self._widget = widget
+        self._task = None
+
+    def start(self, task, on_progress=None, on_done=None, on_error=None):
+        """ Cancels a running task and starts the given one. The task is
+            called with a TaskContext as its only argument"""
+        self.cancel()
+        context = TaskContext()
+        callbacks = {'progress': on_progress, 'done': on_done,
+                     'error': on_error}
+        thread = threading.Thread(target=context.run, args=(task,))
+        thread.daemon = True
+        self._task = (context, thread)
+        thread.start()
+        self._widget.after(POLL_INTERVAL, self._poll, context, callbacks)
+
+    def is_running(self):
+        """ Returns true while a task is running"""
+        return self._task is not None and self._task[1].is_alive()
+
+    def cancel(self):
+        """ Cancels the running task"""
+        if self._task is not None:
+            self._task[0].cancel()
+            self._task = None
+
+    def _poll(self, context, callbacks):
+        """ Private: passes the messages of a task to the callbacks and
+            reschedules itself until the task has finished"""
+        messages = []
+        while True:
+            try:
+                messages.append(context.messages.get_nowait())
+            except queue.Empty:
+                break
+        for (index, (kind, value)) in enumerate(messages):
+            if kind == 'finished':
+                return
+            # only the latest of consecutive progress messages is shown
+            if kind == 'progress' and messages[index + 1:index + 2] and \
+                    messages[index + 1][0] == 'progress':
+                continue
+            if callbacks[kind] and not context.cancelled():
+                callbacks[kind](value)
+        self._widget.after(POLL_INTERVAL, self._poll, context, callbacks)
+
+
+class TaskContext(object):
+
+    """ The interface of a running task to its worker. The task reports
+        progress messages, checks whether it was cancelled and registers
+        external processes that have to be killed on cancellation."""
+
+    def __init__(self):
+        self.messages = queue.Queue()
+        self._cancelled = threading.Event()
+        self._process = None
+
+    def run(self, task):
+        """ Executes the task and queues its result"""
+        try:
+            result = task(self)
+        except Exception as error:  # pylint: disable=broad-except
+            self.messages.put(('error', error))
+        else:
+            self.messages.put(('done', result))
+        self.messages.put(('finished', None))
+
+    def report(self, message):
+        """ Passes a progress message to the Tk loop"""
+        self.messages.put(('progress', message))
+
+    def cancel(self):
+        """ Marks the task as cancelled and kills an attached process"""
+        self._cancelled.set()
+        process = self._process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def cancelled(self):
+        """ Returns true if the task was cancelled"""
+        return self._cancelled.is_set()
+
+    def attach_process(self, process):
+        """ Registers an external process of the task, that is killed when
+            the task is cancelled"""
+        self._process = process
+        if self.cancelled():
+            process.kill()
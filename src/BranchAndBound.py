@@ -0,0 +1,287 @@
+"""
+    BranchAndBound.py
+    See class description
+"""
+import time
+import numpy as np
+
+# Subgradient iterations of the bound of the root and of the other
+# subproblems, which start from the penalties of their parent
+ROOT_ITERATIONS = 200
+ITERATIONS = 30
+# Number of iterations without a better bound after which the step size is
+# halved
+PATIENCE = 5
+# Subproblems whose bound is within this relative distance of the best tour
+# are pruned
+TOLERANCE = 1e-9
+
+# States of an edge in a subproblem
+FREE = 0
+FORCED = 1
+FORBIDDEN = -1
+
+
+class BranchAndBound(object):
+
+    """ An exact solver for problems of moderate size. Subproblems force or
+        forbid edges, their lower bound is the Held-Karp 1-tree bound on
+        the complete graph with forbidden edges removed and forced edges
+        made so short that every 1-tree contains them. A subproblem whose
+        1-tree is a tour is solved, a subproblem whose bound is not below
+        the best tour is pruned. Otherwise a node of degree three or more
+        in the 1-tree is branched on (Volgenant and Jonker): the first
+        subproblem forbids one of its free tree edges, the second forces it
+        and forbids another one, the third forces both.
+        The search is depth first, so better tours are found early. It
+        starts from a given tour and runs until the problem is solved or
+        the time budget is spent; every better tour is passed to a
+        callback."""
+
+    def __init__(self, matrix, tour):
+        self._matrix = matrix
+        self._size = len(matrix)
+        self.tour = list(tour)
+        self.length = self._tour_length(self.tour)
+        # the lowest bound of the subproblems left when the search stopped
+        self.bound = None
+        self.optimal = False
+        self.subproblems = 0
+
+    def solve(self, budget, context=None, on_improvement=None):
+        """ Searches for at most budget seconds and returns true if the
+            tour is optimal. The search stops early when the task of the
+            given context is cancelled"""
+        deadline = time.time() + budget
+        self._on_improvement = on_improvement
+        if on_improvement is not None:
+            on_improvement(list(self.tour))
+        fixed = np.zeros((self._size, self._size), dtype=np.int8)
+        np.fill_diagonal(fixed, FORBIDDEN)
+        penalties = np.zeros(self._size)
+        root = self._bound(fixed, penalties, ROOT_ITERATIONS, deadline)
+        stack = [root] if root is not None else []
+        while stack:
+            if time.time() > deadline or \
+                    (context is not None and context.cancelled()):
+                self.bound = min(min(entry[0] for entry in stack), self.length)
+                return False
+            (bound, fixed, penalties, edges) = stack.pop()
+            if bound >= self.length * (1 - TOLERANCE):
+                continue
+            children = []
+            for child in self._branch(fixed, edges):
+                if _propagate(child):
+                    entry = self._bound(child, penalties, ITERATIONS, deadline)
+                    if entry is not None:
+                        children.append(entry)
+            # the most promising subproblem is searched first
+            stack.extend(sorted(children, key=lambda entry: -entry[0]))
+        self.bound = self.length
+        self.optimal = True
+        return True
+
+    def _bound(self, fixed, penalties, iterations, deadline):
+        """ Private: optimizes the penalties of a subproblem and returns
+            (bound, fixed, penalties, 1-tree edges) or None if the
+            subproblem is solved or pruned"""
+        self.subproblems += 1
+        (cost, forced) = _constrained_costs(self._matrix, fixed)
+        (best, best_penalties, best_edges) = (-np.inf, penalties, None)
+        (factor, stale) = (2.0, 0)
+        for _ in range(iterations):
+            (value, edges) = _one_tree(cost + penalties[:, np.newaxis] +
+                                       penalties)
+            if not np.isfinite(value):
+                # no 1-tree avoids the forbidden edges
+                return None
+            value += forced - 2 * penalties.sum()
+            degrees = np.bincount(edges.ravel(), minlength=self._size)
+            if value > best:
+                (best, best_penalties, best_edges) = (value, penalties, edges)
+                stale = 0
+            else:
+                stale += 1
+                if stale >= PATIENCE:
+                    (factor, stale) = (factor / 2, 0)
+            if best >= self.length * (1 - TOLERANCE):
+                return None
+            subgradient = degrees - 2
+            if not subgradient.any():
+                # the 1-tree is a tour that respects all fixed edges
+                self._improve(edges)
+                return None
+            if time.time() > deadline:
+                break
+            step = factor * (self.length - value) / \
+                float(np.dot(subgradient, subgradient))
+            penalties = penalties + step * subgradient
+        return (best, fixed, best_penalties, best_edges)
+
+    def _branch(self, fixed, edges):
+        """ Private: returns the edge states of the subproblems for a node
+            of the given 1-tree with the highest degree"""
+        nid = int(np.argmax(np.bincount(edges.ravel(), minlength=self._size)))
+        # the free tree edges of the node, shortest first
+        others = [int(end if start == nid else start)
+                  for (start, end) in edges.tolist() if nid in (start, end)]
+        others = sorted(set(other for other in others
+                            if fixed[nid, other] == FREE),
+                        key=lambda other: (self._matrix[nid, other], other))
+        if not others:
+            return []
+        (first, children) = (others[0], [])
+        children.append(_with(fixed, [(nid, first, FORBIDDEN)]))
+        if len(others) > 1:
+            second = others[1]
+            children.append(_with(fixed, [(nid, first, FORCED),
+                                          (nid, second, FORBIDDEN)]))
+            if not np.any(fixed[nid] == FORCED):
+                children.append(_with(fixed, [(nid, first, FORCED),
+                                              (nid, second, FORCED)]))
+        else:
+            children.append(_with(fixed, [(nid, first, FORCED)]))
+        return children
+
+    def _improve(self, edges):
+        """ Private: replaces the best tour by the tour of the given edges
+            if it is shorter"""
+        neighbors = [[] for _ in range(self._size)]
+        for (start, end) in edges.tolist():
+            neighbors[start].append(end)
+            neighbors[end].append(start)
+        tour = [0, neighbors[0][0]]
+        while tour[-1] != 0:
+            (first, second) = neighbors[tour[-1]]
+            tour.append(first if first != tour[-2] else second)
+        length = self._tour_length(tour)
+        if length < self.length:
+            (self.tour, self.length) = (tour, length)
+            if self._on_improvement is not None:
+                self._on_improvement(list(tour))
+
+    def _tour_length(self, tour):
+        """ Private: the length of a closed tour"""
+        tour = np.asarray(tour, dtype=int)
+        return float(self._matrix[tour[:-1], tour[1:]].sum())
+
+
+def _constrained_costs(matrix, fixed):
+    """ Private: the edge costs of a subproblem and the constant that is
+        added to the length of its 1-trees. Forbidden edges are infinite,
+        forced edges are shorter than every free edge by a margin that
+        penalties can't outweigh"""
+    cost = np.where(fixed == FORBIDDEN, np.inf, matrix)
+    forced = fixed == FORCED
+    margin = 4 * float(matrix.max()) * len(matrix) + 1
+    cost[forced] -= margin
+    # every forced edge is counted in both directions
+    return (cost, margin * forced.sum() / 2)
+
+
+def _one_tree(cost):
+    """ Private: the length and the edges of the shortest 1-tree (Prim's
+        algorithm on all nodes but 0, joined with the two shortest edges of
+        node 0)"""
+    size = len(cost)
+    outside = np.ones(size, dtype=bool)
+    outside[:2] = False
+    keys = cost[1].copy()
+    parents = np.ones(size, dtype=int)
+    edges = np.zeros((size, 2), dtype=int)
+    total = 0.0
+    for position in range(size - 2):
+        nid = int(np.argmin(np.where(outside, keys, np.inf)))
+        total += keys[nid]
+        edges[position] = (parents[nid], nid)
+        outside[nid] = False
+        closer = outside & (cost[nid] < keys)
+        keys[closer] = cost[nid][closer]
+        parents[closer] = nid
+    row = cost[0].copy()
+    row[0] = np.inf
+    closest = np.argpartition(row, 1)[:2]
+    total += row[closest].sum()
+    edges[size - 2:] = [(0, closest[0]), (0, closest[1])]
+    return (float(total), edges)
+
+
+def _with(fixed, changes):
+    """ Private: a copy of the edge states with the given (start, end,
+        state) changes"""
+    fixed = fixed.copy()
+    for (start, end, state) in changes:
+        fixed[start, end] = fixed[end, start] = state
+    return fixed
+
+
+def _propagate(fixed):
+    """ Private: fixes the edges implied by the edge states and returns
+        false if no tour respects them. A node with two forced edges can't
+        have another one, a node with two allowed edges has to use both,
+        and an edge that closes a path of forced edges into a subtour is
+        forbidden"""
+    size = len(fixed)
+    changed = True
+    while changed:
+        changed = False
+        forced = np.sum(fixed == FORCED, axis=1)
+        allowed = np.sum(fixed != FORBIDDEN, axis=1)
+        if np.any(forced > 2) or np.any(allowed < 2):
+            return False
+        for nid in np.flatnonzero((forced == 2) & (allowed > 2)).tolist():
+            free = fixed[nid] == FREE
+            fixed[nid, free] = FORBIDDEN
+            fixed[free, nid] = FORBIDDEN
+            changed = True
+        for nid in np.flatnonzero((allowed == 2) & (forced < 2)).tolist():
+            free = fixed[nid] == FREE
+            fixed[nid, free] = FORCED
+            fixed[free, nid] = FORCED
+            changed = True
+        if changed:
+            continue
+        for (start, end, length) in _forced_paths(fixed):
+            if start == end:
+                # only a cycle through all nodes is a tour
+                return length == size
+            if length < size - 1 and fixed[start, end] == FREE:
+                fixed[start, end] = fixed[end, start] = FORBIDDEN
+                changed = True
+    return True
+
+
+def _forced_paths(fixed):
+    """ Private: the (start, end, number of edges) of the paths of forced
+        edges. A cycle is returned with its number of edges as length and
+        ends at its start"""
+    neighbors = [np.flatnonzero(row == FORCED).tolist() for row in fixed]
+    visited = [False] * len(fixed)
+    paths = []
+    for nid in range(len(fixed)):
+        if visited[nid] or len(neighbors[nid]) != 1:
+            continue
+        (previous, current, length) = (nid, neighbors[nid][0], 1)
+        visited[nid] = True
+        while len(neighbors[current]) == 2:
+            visited[current] = True
+            (first, second) = neighbors[current]
+            (previous, current) = (current, first if first != previous
+                                   else second)
+            length += 1
+        visited[current] = True
+        paths.append((nid, current, length))
+    # the nodes left with forced edges lie on cycles
+    for nid in range(len(fixed)):
+        if visited[nid] or not neighbors[nid]:
+            continue
+        (previous, current, length) = (nid, neighbors[nid][0], 1)
+        visited[nid] = True
+        while current != nid:
+            visited[current] = True
+            (first, second) = neighbors[current]
+            (previous, current) = (current, first if first != previous
+                                   else second)
+            length += 1
+        paths.append((nid, nid, length))
+    return paths
@@ -0,0 +1,285 @@
+"""
+    CandidateGraph.py
+    See class description
+"""
+import numpy as np
+import tsputil
+from SpatialIndex import KDTree
+
+# Number of nearest neighbors of every node
+NEIGHBORS = 10
+# Number of nearest neighbors of every node in each of its four quadrants
+QUADRANT_NEIGHBORS = 2
+
+
+class CandidateGraph(object):
+
+    """ The CandidateGraph holds for every node of the current problem its
+        nearest neighbors and its nearest neighbors in each of the four
+        quadrants around it. Solvers only consider moves along these
+        candidate edges instead of scanning all nodes. The quadrant
+        neighbors connect nodes of different clusters, which have no
+        nearest neighbors in common.
+        Lists are sorted by distance, ties are decided in favour of the
+        lower node id. The quadrants are closed, so a node on an axis
+        belongs to both adjacent quadrants.
+        The graph observes the 'nodes' of the given datacontroller and is
+        built when it is requested first, with a spatial index for the
+        euclidean metric and from the rows of the distance cache for every
+        other metric, whose distances need not follow the coordinates.
+        Adding or deleting a single node patches the lists of the affected
+        nodes, every other change drops the graph."""
+
+    def __init__(self, datacontroller, neighbors=NEIGHBORS,
+                 quadrant_neighbors=QUADRANT_NEIGHBORS):
+        self._datacontroller = datacontroller
+        self._k = neighbors
+        self._q = quadrant_neighbors
+        self._coords = tsputil.node_coords(datacontroller.get_data('nodes'))
+        self._euclidean = datacontroller.get_data('metric').is_euclidean()
+        # (n, k) nearest neighbor ids and squared distances, padded with -1.
+        # Other metrics than the euclidean one store their distances.
+        self._nearest = None
+        self._nearest_d2 = None
+        # (n, 4, q) quadrant neighbor ids and squared distances
+        self._quadrants = None
+        self._quadrants_d2 = None
+
+        self._datacontroller.register_observer(self, ['nodes', 'scale',
+                                                      'metric'])
+
+    def __len__(self):
+        return len(self._coords)
+
+    def k_nearest(self, nid, k=None):
+        """ Returns the ids of the k nearest neighbors of a node sorted by
+            distance. At most the number of neighbors of the graph are
+            returned"""
+        self._build()
+        row = self._nearest[nid][:k]
+        return row[row >= 0].tolist()
+
+    def quadrant_neighbors(self, nid):
+        """ Returns the ids of the nearest neighbors of a node in each
+            quadrant as four lists"""
+        self._build()
+        return [row[row >= 0].tolist() for row in self._quadrants[nid]]
+
+    def neighbors(self, nid):
+        """ Returns the ids of all candidate neighbors of a node sorted by
+            distance"""
+        self._build()
+        ids = np.concatenate((self._nearest[nid],
+                              self._quadrants[nid].ravel()))
+        d2 = np.concatenate((self._nearest_d2[nid],
+                             self._quadrants_d2[nid].ravel()))
+        valid = ids >= 0
+        (ids, d2) = (ids[valid], d2[valid])
+        (ids, first) = np.unique(ids, return_index=True)
+        return ids[np.lexsort((ids, d2[first]))].tolist()
+
+    def edges(self):
+        """ Returns all candidate edges as an array of (smaller id, larger
+            id) rows without duplicates"""
+        self._build()
+        size = len(self._coords)
+        if not size:
+            return np.zeros((0, 2), dtype=int)
+        others = np.concatenate((self._nearest,
+                                 self._quadrants.reshape(size, -1)), axis=1)
+        starts = np.repeat(np.arange(size), others.shape[1])
+        others = others.ravel()
+        valid = others >= 0
+        pairs = np.column_stack((np.minimum(starts, others)[valid],
+                                 np.maximum(starts, others)[valid]))
+        return np.unique(pairs, axis=0).reshape(-1, 2)
+
+    def _build(self):
+        """ Private: computes all lists with a spatial index unless the
+            graph is up to date. The quadrant neighbors are taken from a
+            longer list of nearest neighbors, only quadrants that have too
+            few nodes in it are searched separately"""
+        if self._nearest is not None:
+            return
+        size = len(self._coords)
+        self._allocate(size)
+        if not self._euclidean:
+            for nid in range(size):
+                self._recompute(nid)
+            return
+        index = KDTree(self._coords)
+        fetch = self._k + 4 * self._q
+        found = np.full((size, fetch), -1, dtype=int)
+        for (nid, (x_value, y_value)) in enumerate(self._coords.tolist()):
+            others = [other for other in
+                      index.k_nearest(x_value, y_value, fetch + 1)
+                      if other != nid][:fetch]
+            found[nid, :len(others)] = others
+        self._nearest[:] = found[:, :self._k]
+        delta = self._coords[found] - self._coords[:, np.newaxis]
+        (columns, padding) = (np.arange(fetch), found < 0)
+        for (quadrant, inside) in enumerate(_quadrant_masks(delta)):
+            inside &= ~padding
+            rank = np.cumsum(inside, axis=1)
+            # the first q members of the quadrant in each row, in order
+            key = np.where(inside & (rank <= self._q), columns, fetch)
+            order = np.argsort(key, axis=1, kind='stable')[:, :self._q]
+            picked = np.take_along_axis(found, order, axis=1)
+            picked[np.take_along_axis(key, order, axis=1) == fetch] = -1
+            self._quadrants[:, quadrant] = picked
+            # quadrants with too few members in a full list are searched
+            for nid in np.flatnonzero((rank[:, -1] < self._q) &
+                                      ~padding[:, -1]).tolist():
+                (x_value, y_value) = self._coords[nid].tolist()
+                region = _quadrant_regions(x_value, y_value)[quadrant]
+                members = [other for other in index.k_nearest(
+                    x_value, y_value, self._q + 1, region)
+                           if other != nid][:self._q]
+                self._quadrants[nid, quadrant] = -1
+                self._quadrants[nid, quadrant, :len(members)] = members
+        self._nearest_d2 = self._squared_distances(self._nearest)
+        self._quadrants_d2 = self._squared_distances(self._quadrants)
+
+    def _squared_distances(self, ids):
+        """ Private: the squared distances of the nodes to the neighbors in
+            the given array of ids, inf for padding"""
+        rows = np.arange(len(ids)).reshape((-1,) + (1,) * (ids.ndim - 1))
+        delta = self._coords[ids] - self._coords[rows]
+        d2 = delta[..., 0] * delta[..., 0] + delta[..., 1] * delta[..., 1]
+        d2[ids < 0] = np.inf
+        return d2
+
+    def _allocate(self, size):
+        """ Private: creates empty lists for the given number of nodes"""
+        self._nearest = np.full((size, self._k), -1, dtype=int)
+        self._nearest_d2 = np.full((size, self._k), np.inf)
+        self._quadrants = np.full((size, 4, self._q), -1, dtype=int)
+        self._quadrants_d2 = np.full((size, 4, self._q), np.inf)
+
+    def _keys(self, nid):
+        """ Private: the squared distances of a node to all nodes, the
+            distances of the metric unless it is euclidean"""
+        if not self._euclidean:
+            return self._datacontroller.get_distances().row(nid)
+        delta = self._coords - self._coords[nid]
+        return delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1]
+
+    def _set_row(self, ids, d2, nid, others, keys):
+        """ Private: stores the given neighbors of a node with their keys"""
+        ids[nid] = -1
+        d2[nid] = np.inf
+        if others:
+            ids[nid, :len(others)] = others
+            d2[nid, :len(others)] = keys[others]
+
+    def _recompute(self, nid):
+        """ Private: computes the lists of a node by comparing it with all
+            nodes"""
+        delta = self._coords - self._coords[nid]
+        d2 = self._keys(nid)
+        others = np.arange(len(self._coords))
+        not_self = others != nid
+        self._set_row(self._nearest, self._nearest_d2, nid,
+                      _closest(others[not_self], d2[not_self], self._k), d2)
+        for (quadrant, mask) in enumerate(_quadrant_masks(delta)):
+            mask &= not_self
+            self._set_row(self._quadrants[:, quadrant],
+                          self._quadrants_d2[:, quadrant], nid,
+                          _closest(others[mask], d2[mask], self._q), d2)
+
+    def _add_node(self):
+        """ Private: patches the lists for the node appended last"""
+        nid = len(self._coords) - 1
+        self._nearest = np.vstack((self._nearest,
+                                   np.full((1, self._k), -1, dtype=int)))
+        self._nearest_d2 = np.vstack((self._nearest_d2,
+                                      np.full((1, self._k), np.inf)))
+        self._quadrants = np.concatenate(
+            (self._quadrants, np.full((1, 4, self._q), -1, dtype=int)))
+        self._quadrants_d2 = np.concatenate(
+            (self._quadrants_d2, np.full((1, 4, self._q), np.inf)))
+        self._recompute(nid)
+        # every node the new node is closer to than one of its neighbors
+        # gets its lists recomputed
+        delta = self._coords[nid] - self._coords[:nid]
+        d2 = self._keys(nid)[:nid]
+        affected = d2 < self._nearest_d2[:nid, -1]
+        for (quadrant, inside) in enumerate(_quadrant_masks(delta)):
+            affected |= inside & (d2 < self._quadrants_d2[:nid, quadrant, -1])
+        for other in np.flatnonzero(affected).tolist():
+            self._recompute(other)
+
+    def _delete_node(self, nid):
+        """ Private: patches the lists for the deletion of the node with the
+            given id. The ids of the following nodes are decremented"""
+        keep = np.arange(len(self._coords) + 1) != nid
+        affected = np.any(self._nearest == nid, axis=1) | \
+            np.any(self._quadrants.reshape(len(keep), -1) == nid, axis=1)
+        self._nearest = self._nearest[keep]
+        self._nearest_d2 = self._nearest_d2[keep]
+        self._quadrants = self._quadrants[keep]
+        self._quadrants_d2 = self._quadrants_d2[keep]
+        for ids in (self._nearest, self._quadrants):
+            ids[ids > nid] -= 1
+        for other in np.flatnonzero(affected[keep]).tolist():
+            self._recompute(other)
+
+    def _patch(self, coords):
+        """ Private: updates the graph to the given coordinates"""
+        old = self._coords
+        self._coords = coords
+        if self._nearest is None:
+            return
+        if len(coords) == len(old):
+            if not np.array_equal(coords, old):
+                self._nearest = None
+        elif len(coords) == len(old) + 1 and np.array_equal(coords[:-1], old):
+            self._add_node()
+        elif len(coords) == len(old) - 1:
+            mismatch = np.flatnonzero(np.any(coords != old[:-1], axis=1))
+            nid = mismatch[0] if len(mismatch) else len(coords)
+            if np.array_equal(coords[nid:], old[nid + 1:]):
+                self._delete_node(nid)
+            else:
+                self._nearest = None
+        else:
+            self._nearest = None
+
+    def data_update(self, key, data):
+        """ Handles updates in the observed data"""
+        if key == 'nodes':
+            self._patch(tsputil.node_coords(data))
+        elif key == 'metric':
+            self._euclidean = data.is_euclidean()
+            self._nearest = None
+        elif key == 'scale' and not self._euclidean:
+            # rounded distances don't scale with the coordinates
+            self._nearest = None
+
+
+def _quadrant_regions(x_value, y_value):
+    """ Private: the four closed quadrants around x,y as regions of the
+        spatial index"""
+    inf = float('inf')
+    return [(x_value, y_value, inf, inf), (-inf, y_value, x_value, inf),
+            (-inf, -inf, x_value, y_value), (x_value, -inf, inf, y_value)]
+
+
+def _quadrant_masks(delta):
+    """ Private: the masks of the offsets (..., 2) lying in each of the
+        four closed quadrants"""
+    (delta_x, delta_y) = (delta[..., 0], delta[..., 1])
+    return [(delta_x >= 0) & (delta_y >= 0), (delta_x <= 0) & (delta_y >= 0),
+            (delta_x <= 0) & (delta_y <= 0), (delta_x >= 0) & (delta_y <= 0)]
+
+
+def _closest(ids, d2, count):
+    """ Private: the count ids with the smallest squared distances, ties
+        are decided by the lower id"""
+    if len(ids) > count:
+        candidates = np.argpartition(d2, count - 1)[:count]
+        # all ids at the distance of the last candidate take part in the
+        # tie break
+        candidates = np.flatnonzero(d2 <= d2[candidates].max())
+        (ids, d2) = (ids[candidates], d2[candidates])
+    return ids[np.lexsort((ids, d2))][:count].tolist()
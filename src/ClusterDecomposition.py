@@ -0,0 +1,157 @@
+"""
+    ClusterDecomposition.py
+    See class description
+"""
+import itertools
+from collections import OrderedDict
+import numpy as np
+from LocalSearch import LocalSearch
+from SpatialIndex import KDTree
+
+# Clusters up to this size get their optimal path by trying all orders
+EXHAUSTIVE_LIMIT = 7
+
+
+class ClusterDecomposition(object):
+
+    """ Splits a problem into the groups of nodes with the same color for
+        the clustered TSP, whose tours visit every group contiguously.
+        The distance of two clusters is the shortest candidate edge between
+        them, or the distance of their centers if no candidate edge joins
+        them. Once the order of the clusters is chosen, consecutive clusters
+        are connected by their closest pair of nodes, and every cluster
+        becomes the subproblem of the shortest path from the node its
+        predecessor connects to (entry) to the node connected to its
+        successor (exit). Entry and exit differ unless a cluster has a
+        single node. The subproblems are independent of each other."""
+
+    def __init__(self, distances, candidates, nodes):
+        self._distances = distances
+        self._coords = distances.coords()
+        groups = OrderedDict()
+        for node in nodes:
+            groups.setdefault(node.color, []).append(node.nid)
+        self.clusters = [np.array(nids, dtype=int) for nids in groups.values()]
+        self.gaps = self._gaps(candidates)
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def connect(self, order):
+        """ Returns the subproblems (nids, entry, exit) of the clusters in
+            the given order"""
+        clusters = [self.clusters[index] for index in order]
+        count = len(clusters)
+        if count == 1:
+            # a single cluster is a tour closed by the edge to the nearest
+            # neighbor of its first node
+            nids = clusters[0]
+            (_, entry, exit_) = self._closest_pair(nids[:1], nids[1:])
+            return [(nids.tolist(), entry, exit_)]
+        # links[i] joins the exit of cluster i with the entry of cluster i+1
+        links = [self._closest_pair(clusters[index],
+                                    clusters[(index + 1) % count])[1:]
+                 for index in range(count)]
+        for index in range(count):
+            entry = links[index - 1][1]
+            if links[index][0] == entry and len(clusters[index]) > 1:
+                following = clusters[(index + 1) % count]
+                if index == count - 1:
+                    # the entry of the first cluster is fixed already
+                    following = following[following != links[0][0]] \
+                        if len(following) > 1 else following
+                links[index] = self._closest_pair(
+                    clusters[index][clusters[index] != entry], following)[1:]
+        return [(clusters[index].tolist(), links[index - 1][1],
+                 links[index][0]) for index in range(count)]
+
+    def join(self, paths):
+        """ Returns the closed tour through the paths of the subproblems"""
+        tour = [nid for path in paths for nid in path]
+        return tour + tour[:1]
+
+    def _gaps(self, candidates):
+        """ Private: the matrix of the distances between the clusters"""
+        count = len(self.clusters)
+        labels = np.zeros(len(self._coords), dtype=int)
+        centers = np.zeros((count, 2))
+        for (index, nids) in enumerate(self.clusters):
+            labels[nids] = index
+            centers[index] = self._coords[nids].mean(axis=0)
+        delta = centers[:, np.newaxis] - centers
+        gaps = np.sqrt((delta ** 2).sum(axis=2))
+        edges = candidates.edges()
+        (first, second) = (labels[edges[:, 0]], labels[edges[:, 1]])
+        crossing = first != second
+        if np.any(crossing):
+            lengths = self._distances.edge_lengths(edges[crossing, 0],
+                                                   edges[crossing, 1])
+            shortest = np.full((count, count), np.inf)
+            np.minimum.at(shortest, (first[crossing], second[crossing]),
+                          lengths)
+            shortest = np.minimum(shortest, shortest.T)
+            gaps = np.where(np.isfinite(shortest), shortest, gaps)
+        return gaps
+
+    def _closest_pair(self, first, second):
+        """ Private: the (distance, node of first, node of second) of the
+            closest pair of nodes of two groups. The nodes of the smaller
+            group are searched in a spatial index of the larger one, or in
+            the distances for other metrics than the euclidean one"""
+        swapped = len(first) > len(second)
+        if swapped:
+            (first, second) = (second, first)
+        euclidean = self._distances.metric().is_euclidean()
+        index = KDTree(self._coords[second])
+        best = None
+        for nid in first.tolist():
+            if euclidean:
+                other = int(second[index.nearest(*self._coords[nid])])
+            else:
+                other = int(second[self._distances.nearest(nid, second)[0]])
+            length = self._distances.distance(nid, other)
+            if best is None or length < best[0]:
+                best = (length, nid, other)
+        if swapped:
+            return (best[0], best[2], best[1])
+        return best
+
+
+def cluster_path(distances, nids, entry, exit_, candidates=None):
+    """ Returns a short path from entry to exit through the given nodes.
+        Small clusters are solved by trying all orders, larger ones start
+        from a nearest neighbor path that is improved by 2-opt and Or-opt
+        moves that keep the edge from exit back to entry. The candidate
+        graph is used if the nodes are the complete problem."""
+    inner = [nid for nid in nids if nid not in (entry, exit_)]
+    if entry == exit_:
+        return [entry]
+    if len(inner) <= EXHAUSTIVE_LIMIT - 2:
+        return min(([entry] + list(order) + [exit_]
+                    for order in itertools.permutations(inner)),
+                   key=distances.path_length)
+    coords = distances.coords()
+    euclidean = distances.metric().is_euclidean()
+    index = KDTree(coords[inner])
+    # other metrics than the euclidean one scan the distances with the
+    # visited nodes masked
+    visited = np.zeros(len(inner))
+    path = [entry]
+    while len(index):
+        if euclidean:
+            nearest = index.nearest(*coords[path[-1]])
+        else:
+            nearest = int(np.argmin(distances.row(path[-1])[inner] + visited))
+        index.remove(nearest)
+        visited[nearest] = np.inf
+        path.append(inner[nearest])
+    search = LocalSearch(distances, path + [exit_], candidates=candidates,
+                         fixed=(exit_, entry))
+    while search.two_opt() or search.or_opt():
+        pass
+    tour = search.tour()[:-1]
+    start = tour.index(entry)
+    tour = tour[start:] + tour[:start]
+    if tour[1] == exit_:
+        tour = tour[:1] + tour[:0:-1]
+    return tour
@@ -0,0 +1,48 @@
+"""
+    CoordinateIndex.py
+    See class description
+"""
+import numpy as np
+import tsputil
+
+
+class CoordinateIndex(object):
+
+    """ The CoordinateIndex maps coordinates to the position of the first
+        node at these coordinates, so a node is found in constant time.
+        The index observes the 'nodes' of the given datacontroller.
+        An added node is patched into the index, every other change
+        rebuilds it."""
+
+    def __init__(self, datacontroller):
+        self._datacontroller = datacontroller
+        self._coords = np.zeros((0, 2))
+        self._positions = {}
+
+        self._datacontroller.register_observer(self, ['nodes'])
+
+    def find(self, coords):
+        """ Returns the position of the first node with the given
+            coordinates or None"""
+        return self._positions.get(tuple(coords))
+
+    def find_node(self, coords):
+        """ Returns the first node with the given coordinates or None"""
+        position = self.find(coords)
+        if position is None:
+            return None
+        return self._datacontroller.get_data('nodes')[position]
+
+    def _patch(self, coords):
+        """ Private: updates the index to the given coordinates"""
+        old = self._coords
+        self._coords = coords
+        if len(coords) == len(old) + 1 and np.array_equal(coords[:-1], old):
+            self._positions.setdefault(tuple(coords[-1].tolist()), len(old))
+        elif len(coords) != len(old) or not np.array_equal(coords, old):
+            self._positions = tsputil.coordinate_positions(coords)
+
+    def data_update(self, key, data):
+        """ Handles updates in the observed data"""
+        if key == 'nodes':
+            self._patch(tsputil.node_coords(data))
@@ -0,0 +1,116 @@
+"""
+    DataController.py
+    See class description
+"""
+import copy
+import tsputil
+from CandidateGraph import CandidateGraph
+from CoordinateIndex import CoordinateIndex
+from DistanceCache import DistanceCache
+from Metric import Metric
+from NodeStore import NodeStore
+
+
+class DataController(object):
+
+    """ The DataController holds all atomic data of a problem and notifies
+    registered observers about changes. It doesn't depend on Tk, so solvers
+    can be used without the GUI. The MainApplication is the data controller
+    of the GUI."""
+
+    def __init__(self):
+        """The data dictionary holding all global application data
+           self._data = {'key1' : data1, 'key2' : data2}"""
+        self._data = {}
+        """ The _nullvalues dictionary holds all default values for the
+        registered data. It is used when the program data is reset."""
+        self._nullvalues = {}
+        """The observer dictionary describing bindings of observers to data
+           self._observers = {'key1' : [observer1,observer2],
+                             'key2' : [observer3]}"""
+        self._observers = {}
+
+        self._setup_data()
+
+    def register_data(self, key, value):
+        """Adds a new entry to the data dictionary """
+        if key not in self._data:
+            self._nullvalues.update({key: copy.deepcopy(value)})
+            self._data.update({key: copy.deepcopy(value)})
+            self._observers.update({key: []})
+
+    def unregister_data(self, key):
+        """Removes a data entry from the data dictionary """
+        del self._data[key]
+
+    def register_observer(self, observer, keys):
+        """Adds an object to the observers array for a given set of keys."""
+        for key in keys:
+            if key not in self._data:
+                self.register_data(key, None)
+            self._observers[key].append(observer)
+
+    def unregister_observer(self, observer):
+        """ Removes an observer from all observer lists"""
+        for key in self._observers:
+            if observer in self._observers[key]:
+                self._observers[key].remove(observer)
+
+    def commit_change(self, key, value):
+        """ Observers call this method to commit changes in a data set
+        registered under the given key. No type or validity checking
+        for the value is done! Calling instances are responsible
+        for validity"""
+        self._data[key] = value
+        self.notify(key)
+
+    def notify(self, key):
+        """ The method is called when the dataset of a given key has changed.
+        All observers registered for that key are notified about the change."""
+        ndata = self._data[key]
+        for observer in self._observers[key]:
+            observer.data_update(key, ndata)
+
+    def clear(self):
+        """ Clears all problem data from the program and resets the UI """
+        self._nullvalues['nodes'] = NodeStore()
+        for key in self._data:
+            self.commit_change(key, self._nullvalues[key])
+
+    def get_data(self, key):
+        """ Returns the dataset for a given key """
+        return self._data[key]
+
+    def delete_node(self, index):
+        """ Deletes the node at the given position and renumbers the
+            following nodes. The metric is committed without the node
+            before the nodes, so explicit weights keep matching the ids"""
+        nodes = self.get_data('nodes')
+        del nodes[index]
+        tsputil.reindex_nodes(nodes)
+        self.commit_change('metric', self.get_data('metric').without(index))
+        self.commit_change('nodes', nodes)
+
+    def get_distances(self):
+        """ Returns the distance cache of the current nodes """
+        return self._distances
+
+    def get_node_index(self):
+        """ Returns the coordinate index of the current nodes """
+        return self._node_index
+
+    def get_candidates(self):
+        """ Returns the candidate neighbor graph of the current nodes """
+        return self._candidates
+
+    def _setup_data(self):
+        """ Private: sets up globally used data """
+        self.register_data('scale', tsputil.GRID_SCALE)
+        self.register_data('nodes', NodeStore())
+        self.register_data('metric', Metric())
+        # the distance cache, the coordinate index and the candidate graph
+        # observe 'nodes' and are not part of the data dictionary, so they
+        # survive resets
+        self._distances = DistanceCache(self)
+        self._node_index = CoordinateIndex(self)
+        self._candidates = CandidateGraph(self)
@@ -0,0 +1,187 @@
+"""
+    DistanceCache.py
+    See class description
+"""
+from collections import OrderedDict
+import math
+import numpy as np
+import tsputil
+
+# Problems up to this size keep the complete distance matrix in memory
+# (MATRIX_LIMIT ** 2 * 8 bytes). Larger problems compute rows on demand.
+MATRIX_LIMIT = 2000
+# Number of rows the matrix is built with at once
+BLOCK_SIZE = 256
+# Number of on demand rows kept for large problems
+ROW_CACHE_SIZE = 256
+
+
+class DistanceCache(object):
+
+    """ The DistanceCache holds the distances between the nodes of the
+        current problem, which are computed by the metric of the problem.
+        For moderate problem sizes the complete matrix is computed at once,
+        for large problems single rows are computed on demand and the most
+        recently used rows are kept.
+        The cache observes the 'nodes' of the given datacontroller. Adding
+        or deleting a single node patches the matrix, every other change
+        invalidates it. Nothing is computed before it is requested."""
+
+    def __init__(self, datacontroller):
+        self._datacontroller = datacontroller
+        self._coords = np.zeros((0, 2))
+        # the coordinates as lists of floats for single distances, which
+        # are faster to compute without NumPy
+        self._points = None
+        self._scale = datacontroller.get_data('scale')
+        self._metric = datacontroller.get_data('metric')
+        # single euclidean distances are computed inline
+        self._euclidean = self._metric.is_euclidean()
+        self._matrix = None
+        self._rows = OrderedDict()
+
+        self._datacontroller.register_observer(self, ['nodes', 'scale',
+                                                      'metric'])
+
+    def __len__(self):
+        return len(self._coords)
+
+    def coords(self):
+        """ Returns the scaled node coordinates as a (n, 2) array"""
+        return self._coords * self._scale
+
+    def scale(self):
+        """ Returns the scale the distances are computed with"""
+        return self._scale
+
+    def metric(self):
+        """ Returns the metric the distances are computed with"""
+        return self._metric
+
+    def distance(self, start, end):
+        """ Returns the distance between the nodes with the given ids"""
+        if self._matrix is not None:
+            return float(self._matrix[start, end])
+        if start in self._rows:
+            return float(self._rows[start][end])
+        if self._points is None:
+            self._points = self._coords.tolist()
+        if not self._euclidean:
+            return self._metric.distance(self._points[start],
+                                         self._points[end], self._scale,
+                                         (start, end))
+        (x_start, y_start) = self._points[start]
+        (x_end, y_end) = self._points[end]
+        return math.sqrt(((x_start - x_end) * self._scale) ** 2 +
+                         ((y_start - y_end) * self._scale) ** 2)
+
+    def row(self, nid):
+        """ Returns the distances of the node with the given id to all
+            nodes as an array"""
+        matrix = self.matrix()
+        if matrix is not None:
+            return matrix[nid]
+        if nid in self._rows:
+            self._rows.move_to_end(nid)
+            return self._rows[nid]
+        result = self._block(nid, nid + 1)[0]
+        self._rows[nid] = result
+        if len(self._rows) > ROW_CACHE_SIZE:
+            self._rows.popitem(last=False)
+        return result
+
+    def nearest(self, nid, others, count=1):
+        """ Returns the positions in others of the count nodes with the
+            smallest distances to the node with the given id, sorted by
+            distance. Ties are decided in favour of the lower position"""
+        others = np.asarray(others, dtype=int)
+        lengths = self.row(nid)[others]
+        positions = np.arange(len(others))
+        if len(others) > count:
+            positions = np.argpartition(lengths, count - 1)[:count]
+            # all positions at the distance of the last one take part in
+            # the tie break
+            positions = np.flatnonzero(lengths <= lengths[positions].max())
+        order = np.lexsort((positions, lengths[positions]))
+        return positions[order][:count].tolist()
+
+    def matrix(self):
+        """ Returns the complete distance matrix or None if the problem is
+            too large to keep it in memory"""
+        if self._matrix is None and 0 < len(self._coords) <= MATRIX_LIMIT:
+            size = len(self._coords)
+            self._matrix = np.empty((size, size))
+            for first in range(0, size, BLOCK_SIZE):
+                last = min(first + BLOCK_SIZE, size)
+                self._matrix[first:last] = self._block(first, last)
+        return self._matrix
+
+    def path_length(self, path):
+        """ Calculates the pathlength. The edges are accumulated in path
+            order, so the result equals tsputil.get_path_length"""
+        if len(path) < 2:
+            return 0
+        path = np.asarray(path, dtype=int)
+        return float(np.cumsum(self.edge_lengths(path[:-1], path[1:]))[-1])
+
+    def edge_lengths(self, starts, ends):
+        """ Returns the lengths of the edges between the nodes in starts and
+            the nodes in ends"""
+        return self._metric.lengths(self._coords, self._scale, starts, ends)
+
+    def _block(self, first, last):
+        """ Private: computes the rows first to last-1 of the matrix"""
+        return self._metric.lengths(self._coords, self._scale,
+                                    np.arange(first, last)[:, np.newaxis],
+                                    np.arange(len(self._coords)))
+
+    def _invalidate(self):
+        """ Private: drops all computed distances"""
+        self._matrix = None
+        self._rows.clear()
+
+    def _patch(self, coords):
+        """ Private: updates the cache to the given coordinates. A single
+            added or removed node is patched into an existing matrix,
+            other changes invalidate the cache."""
+        old = self._coords
+        self._coords = coords
+        self._points = None
+        self._rows.clear()
+        if self._matrix is None:
+            return
+        if len(coords) == len(old):
+            if not np.array_equal(coords, old):
+                self._invalidate()
+        elif (len(coords) == len(old) + 1 and len(coords) <= MATRIX_LIMIT
+              and np.array_equal(coords[:-1], old)):
+            row = self._block(len(old), len(coords))[0]
+            matrix = np.empty((len(coords), len(coords)))
+            matrix[:-1, :-1] = self._matrix
+            matrix[-1] = row
+            matrix[:, -1] = row
+            self._matrix = matrix
+        elif len(coords) == len(old) - 1:
+            mismatch = np.flatnonzero(np.any(coords != old[:-1], axis=1))
+            index = mismatch[0] if len(mismatch) else len(coords)
+            if np.array_equal(coords[index:], old[index + 1:]):
+                self._matrix = np.delete(
+                    np.delete(self._matrix, index, axis=0), index, axis=1)
+            else:
+                self._invalidate()
+        else:
+            self._invalidate()
+
+    def data_update(self, key, data):
+        """ Handles updates in the observed data"""
+        if key == 'nodes':
+            self._patch(tsputil.node_coords(data))
+        elif key == 'scale':
+            if data and data != self._scale:
+                self._scale = data
+                self._invalidate()
+        elif key == 'metric':
+            if data is not self._metric:
+                self._metric = data
+                self._euclidean = data.is_euclidean()
+                self._invalidate()
@@ -116,9 +116,7 @@ class EditWidget(SidebarWidget):
         if len(selection):
             # remove node from nodes array
             index = int(selection[0])
-            del nodes[index]
-            tsputil.reindex_nodes(nodes)
-            self._datacontroller.commit_change('nodes', nodes)
+            self._datacontroller.delete_node(index)
             # reset selection
             listlen = self._node_listbox.size()
             if listlen:
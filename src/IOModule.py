@@ -3,6 +3,9 @@
     See class description
 """
 import tspio
+import tsputil
+from NodeStore import NodeStore
+from StepLog import StepLog
 
 
 class IOModule:
@@ -17,32 +20,116 @@ class IOModule:
         self._datacontroller = datacontroller
 
     def import_tsp(self):
-        """ Load data from a .tsp file via the IO module """
+        """ Load data from a .tsp file via the IO module. A fresh .tspb cache
+            of the file is loaded instead of parsing it again"""
 
-        data = tspio.import_tsp(self._datacontroller.get_data('scale'))
+        try:
+            data = tspio.import_tsp(tsputil.GRID_SCALE)
+        except ValueError as error:
+            self._datacontroller.commit_change('info', "Import failed: " + str(error))
+            return
         if data:
-            # commit new file data
-            self._datacontroller.commit_change(
-                'fileinfo', {'filename': data['name'], 'comment': data['comment']})
-            # clear existing nodes data
-            self._datacontroller.commit_change('nodes', [])
-            # commit new nodes data
-            self._datacontroller.commit_change('nodes', data['nodes'])
-            # commit new startnode data
-            self._datacontroller.commit_change('startnode', data['nodes'])
+            self._commit_problem(data)
+
+    def import_tspb(self):
+        """ Load a problem with its path and pathsteps from a .tspb file via
+            the IO module """
+
+        try:
+            data = tspio.import_tspb()
+        except ValueError as error:
+            self._datacontroller.commit_change('info', "Import failed: " + str(error))
+            return
+        if data:
+            self._commit_problem(data)
+            if data['pathsteps'] is not None:
+                self._datacontroller.commit_change(
+                    'pathsteps', StepLog.from_state(
+                        self._datacontroller.get_distances(), data['pathsteps']))
+            if data['path'] is not None:
+                self._datacontroller.commit_change('path', data['path'])
+
+    def _commit_problem(self, data):
+        """ Private: commits the problem of imported data"""
+        # commit new file data
+        self._datacontroller.commit_change(
+            'fileinfo', {'filename': data['name'], 'comment': data['comment']})
+        # clear existing nodes data
+        self._datacontroller.commit_change('nodes', NodeStore())
+        # the metric and the scale of the new nodes
+        self._datacontroller.commit_change('scale', data['scale'])
+        self._datacontroller.commit_change('metric', data['metric'])
+        # commit new nodes data
+        self._datacontroller.commit_change('nodes', data['nodes'])
+        # commit new startnode data
+        self._datacontroller.commit_change('startnode', data['nodes'])
 
     def export_tsp(self):
         """ Export the loaded problem via the IO module in .tsp format"""
         nodes = self._datacontroller.get_data('nodes')
         scale = self._datacontroller.get_data('scale')
         info = self._datacontroller.get_data('fileinfo')
+        metric = self._datacontroller.get_data('metric')
         comment = None
         if info:
             comment = info['comment']
-        filename = tspio.export_tsp(nodes, scale, comment)
+        filename = tspio.export_tsp(nodes, scale, comment, metric=metric)
         self._datacontroller.commit_change(
             'fileinfo', {'filename': filename, 'comment': comment})
 
+    def export_tspb(self):
+        """ Export the loaded problem with the current path and pathsteps via
+            the IO module in the binary .tspb format"""
+        nodes = self._datacontroller.get_data('nodes')
+        scale = self._datacontroller.get_data('scale')
+        info = self._datacontroller.get_data('fileinfo')
+        metric = self._datacontroller.get_data('metric')
+        comment = None
+        if info:
+            comment = info['comment']
+        filename = tspio.export_tspb(
+            nodes, scale, comment, metric,
+            self._datacontroller.get_data('path'),
+            self._datacontroller.get_data('pathsteps'))
+        self._datacontroller.commit_change(
+            'fileinfo', {'filename': filename, 'comment': comment})
+
+    def import_tour(self):
+        """ Load a tour of the loaded problem from a .tour file via the IO
+            module and show it as the path. The tour replaces the pathsteps
+            as a single step, its length is computed once from the
+            distances of the problem"""
+
+        nodes = self._datacontroller.get_data('nodes')
+        try:
+            data = tspio.import_tour(len(nodes))
+        except ValueError as error:
+            self._datacontroller.commit_change('info', "Import failed: " + str(error))
+            return
+        if data:
+            steps = StepLog(self._datacontroller.get_distances())
+            steps.describe('Unknown', 'Unknown')
+            steps.add_tour(data['tour'].tolist())
+            self._datacontroller.commit_change('pathsteps', steps)
+            self._datacontroller.commit_change('path', steps[-1])
+
+    def export_tour(self):
+        """ Export the current path via the IO module in .tour format"""
+        path = self._datacontroller.get_data('path')
+        if not path or not path.get('Tour'):
+            self._datacontroller.commit_change('info', "There is no path to save")
+            return
+        nodes = self._datacontroller.get_data('nodes')
+        if len(set(path['Tour'])) != len(nodes):
+            self._datacontroller.commit_change(
+                'info', "The path doesn't visit every node, it isn't saved as a tour")
+            return
+        info = self._datacontroller.get_data('fileinfo')
+        comment = None
+        if info and info['filename']:
+            comment = "Tour of " + info['filename']
+        tspio.export_tour(path, len(nodes), comment)
+
     def export_tikz(self):
         """ Export the loaded problem via the IO module as a tikz graphic in a .tex file"""
         nodes = self._datacontroller.get_data('nodes')
@@ -0,0 +1,135 @@
+"""
+    InsertionEngine.py
+    See class description
+"""
+import numpy as np
+
+# Candidates whose insertion costs differ by less than TIE_TOLERANCE times
+# the tour length are compared by their complete tour lengths
+TIE_TOLERANCE = 1e-9
+
+
+class InsertionEngine(object):
+
+    """ The InsertionEngine maintains a closed tour (first node == last node)
+        that nodes are inserted into one by one. Candidates are scored by
+        the insertion cost d(a,p) + d(p,b) - d(a,b) instead of the length
+        of the complete tour. For every arc the best interior candidate is
+        kept in a table that is only updated when the arc or the candidate
+        change. Costs that are (almost) equal are compared by the complete
+        tour length, so ties are decided exactly like the full evaluation
+        of every candidate tour does."""
+
+    def __init__(self, distances, tour):
+        self._distances = distances
+        self.tour = list(tour)
+        self._order = np.asarray(self.tour, dtype=int)
+        self._arc_lengths = distances.edge_lengths(self._order[:-1],
+                                                   self._order[1:])
+        self._length = distances.path_length(self.tour)
+        self._inserted = np.zeros(len(distances), dtype=bool)
+        self._inserted[self._order] = True
+        # arc -> (best, best cost, second, second cost)
+        self._arc_table = {}
+        # candidate -> arcs the candidate is stored for
+        self._candidate_arcs = {}
+
+    def is_inserted(self, nid):
+        """ Returns true if the node with the given id is part of the tour"""
+        return bool(self._inserted[nid])
+
+    def length(self):
+        """ Returns the length of the current tour"""
+        return self._length
+
+    def insert(self, index, nid):
+        """ Inserts the node at the given index of the tour"""
+        start = self.tour[index - 1]
+        end = self.tour[index]
+        self.tour.insert(index, nid)
+        self._order = np.insert(self._order, index, nid)
+        costs = self._distances.edge_lengths(
+            np.array([start, nid]), np.array([nid, end]))
+        self._length += costs[0] + costs[1] - self._arc_lengths[index - 1]
+        self._arc_lengths = np.insert(self._arc_lengths, index, costs[1])
+        self._arc_lengths[index - 1] = costs[0]
+        self._inserted[nid] = True
+        # the split arc and all arcs storing the new node are outdated
+        self._drop_entry((start, end))
+        for arc in list(self._candidate_arcs.pop(nid, ())):
+            self._drop_entry(arc)
+
+    def closest_arc(self, point):
+        """ Finds the arc to a point, so that when the point is included into
+            that arc, the resulting tour is shorter than any other tour
+            formed by inserting the point into an other arc"""
+        if len(self.tour) < 2:
+            return (self.tour[0], self.tour[0])
+        row = self._distances.row(point)
+        costs = row[self._order[:-1]] + row[self._order[1:]] - \
+            self._arc_lengths
+        best = int(np.argmin(costs))
+        ties = np.flatnonzero(costs <= costs[best] + self._tolerance())
+        if len(ties) > 1:
+            lengths = [self._exact_length(index + 1, point) for index in ties]
+            best = int(ties[lengths.index(min(lengths))])
+        return (self.tour[best], self.tour[best + 1])
+
+    def closest_interior_node(self, arc):
+        """ Returns the node that forms the shortest tour, when inserted
+            in front of the end node of the given arc"""
+        index = self.tour.index(arc[1])
+        key = (self.tour[index - 1] if index else None, arc[1])
+        if key not in self._arc_table:
+            self._fill_entry(key)
+        (best, best_cost, _, second_cost) = self._arc_table[key]
+        if second_cost - best_cost > self._tolerance():
+            return best
+        # compare (almost) equal candidates by their complete tour length
+        (candidates, costs) = self._candidate_costs(key)
+        ties = candidates[costs <= costs.min() + self._tolerance()]
+        lengths = [self._exact_length(index, nid) for nid in ties]
+        return int(ties[lengths.index(min(lengths))])
+
+    def _candidate_costs(self, key):
+        """ Private: returns all nodes that are not in the tour and their
+            insertion costs for the given arc. Inserting in front of the
+            first node of the tour only adds the edge to the first node."""
+        candidates = np.flatnonzero(~self._inserted)
+        (start, end) = key
+        costs = self._distances.row(end)[candidates]
+        if start is not None:
+            costs = costs + self._distances.row(start)[candidates] - \
+                self._distances.distance(start, end)
+        return (candidates, costs)
+
+    def _fill_entry(self, key):
+        """ Private: computes the best and second best candidate of an arc"""
+        (candidates, costs) = self._candidate_costs(key)
+        order = np.argsort(costs, kind='stable')[:2]
+        best = int(candidates[order[0]])
+        entry = (best, costs[order[0]], None, float("inf"))
+        if len(order) > 1:
+            entry = entry[:2] + (int(candidates[order[1]]), costs[order[1]])
+        self._arc_table[key] = entry
+        for nid in (entry[0], entry[2]):
+            if nid is not None:
+                self._candidate_arcs.setdefault(nid, set()).add(key)
+
+    def _drop_entry(self, key):
+        """ Private: removes an arc from the best candidate table"""
+        entry = self._arc_table.pop(key, None)
+        if entry:
+            for nid in (entry[0], entry[2]):
+                if nid in self._candidate_arcs:
+                    self._candidate_arcs[nid].discard(key)
+
+    def _tolerance(self):
+        """ Private: the cost difference below which candidates tie"""
+        return TIE_TOLERANCE * (self._length + 1)
+
+    def _exact_length(self, index, nid):
+        """ Private: the length of the tour with the node inserted at the
+            given index, accumulated in tour order"""
+        return self._distances.path_length(
+            self.tour[:index] + [nid] + self.tour[index:])
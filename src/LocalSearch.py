@@ -0,0 +1,212 @@
+"""
+    LocalSearch.py
+    See class description
+"""
+from collections import deque
+import numpy as np
+from SpatialIndex import KDTree
+
+# Number of nearest neighbors every node considers for a move
+NEIGHBORS = 8
+# Longest segment moved by an Or-opt move
+SEGMENT_LENGTH = 3
+# Minimal gain for a move to count as an improvement
+EPSILON = 1e-7
+
+
+class LocalSearch(object):
+
+    """ Improves a closed tour with 2-opt and Or-opt moves. The tour is kept
+        in an array together with the position of every node, so a move
+        costs the reversal of the shorter side of the tour.
+        Moves are only searched between a node and its nearest neighbors,
+        which are read from the candidate graph of the problem if the tour
+        visits all of its nodes, and a queue of active nodes (don't-look
+        bits) makes every pass only revisit the surroundings of the last
+        improvements.
+        A fixed edge is never removed, so a path between its end nodes is
+        improved as the tour closed by the fixed edge."""
+
+    def __init__(self, distances, tour, neighbors=NEIGHBORS, candidates=None,
+                 fixed=None):
+        if len(tour) > 1 and tour[0] == tour[-1]:
+            tour = tour[:-1]
+        self._distances = distances
+        self._tour = np.asarray(tour, dtype=int)
+        self._pos = dict((nid, index) for (index, nid) in
+                         enumerate(self._tour.tolist()))
+        if candidates is not None and len(candidates) == len(self._tour):
+            self._neighbors = dict((nid, candidates.k_nearest(nid, neighbors))
+                                   for nid in self._tour.tolist())
+        else:
+            self._neighbors = self._neighbor_lists(neighbors)
+        self._active = deque(self._tour.tolist())
+        self._queued = set(self._active)
+        self._fixed = set()
+        if fixed is not None:
+            self._fixed = set([tuple(fixed), tuple(fixed[::-1])])
+
+    def tour(self):
+        """ Returns the current tour closed by its start node"""
+        result = self._tour.tolist()
+        return result + result[:1]
+
+    def two_opt(self):
+        """ Applies improving 2-opt moves until no active node is left.
+            Returns true if the tour was improved"""
+        return self._run(self._improve_two_opt)
+
+    def or_opt(self):
+        """ Applies improving Or-opt moves until no active node is left.
+            Returns true if the tour was improved"""
+        return self._run(self._improve_or_opt)
+
+    def _run(self, improve):
+        """ Private: processes the queue of active nodes with the given
+            improvement function"""
+        if len(self._tour) < 5:
+            return False
+        improved = False
+        if not self._active:
+            self._activate(self._tour.tolist())
+        while self._active:
+            nid = self._active.popleft()
+            self._queued.discard(nid)
+            if improve(nid):
+                improved = True
+        # all nodes are active again for the next kind of move
+        self._activate(self._tour.tolist())
+        return improved
+
+    def _improve_two_opt(self, node_a):
+        """ Private: searches an improving 2-opt move that removes an edge
+            at node a and applies the first one found"""
+        dist = self._distances.distance
+        for successor in (True, False):
+            node_b = self._next(node_a, successor)
+            if (node_a, node_b) in self._fixed:
+                continue
+            d_ab = dist(node_a, node_b)
+            for node_c in self._neighbors[node_a]:
+                d_ac = dist(node_a, node_c)
+                # the neighbors are sorted by the distances of the metric
+                if d_ac >= d_ab:
+                    break
+                node_d = self._next(node_c, successor)
+                if node_c == node_b or node_d == node_a or \
+                        (node_c, node_d) in self._fixed:
+                    continue
+                delta = d_ac + dist(node_b, node_d) - d_ab - \
+                    dist(node_c, node_d)
+                if delta < -EPSILON:
+                    self._exchange(node_a, node_b, node_c, node_d)
+                    self._activate((node_a, node_b, node_c, node_d))
+                    return True
+        return False
+
+    def _improve_or_opt(self, first):
+        """ Private: searches an improving move of a segment starting at the
+            given node to an edge next to a neighbor of its end nodes"""
+        dist = self._distances.distance
+        segment = [first]
+        for _ in range(SEGMENT_LENGTH):
+            last = segment[-1]
+            before = self._next(first, False)
+            after = self._next(last, True)
+            if after == before:
+                break
+            gain = dist(before, first) + dist(last, after) - \
+                dist(before, after)
+            if (before, first) in self._fixed or (last, after) in self._fixed:
+                gain = 0
+            if gain > EPSILON:
+                for node_c in self._targets(segment):
+                    node_e = self._next(node_c, True)
+                    if node_e in segment or node_c == before or \
+                            (node_c, node_e) in self._fixed:
+                        continue
+                    d_ce = dist(node_c, node_e)
+                    keep = dist(node_c, first) + dist(last, node_e) - d_ce
+                    turn = dist(node_c, last) + dist(first, node_e) - d_ce
+                    if min(keep, turn) < gain - EPSILON:
+                        self._move_segment(before, first, last, after,
+                                           node_c, node_e, keep <= turn)
+                        self._activate((before, first, last, after,
+                                        node_c, node_e))
+                        return True
+            segment.append(after)
+        return False
+
+    def _targets(self, segment):
+        """ Private: neighbors of the segment ends that are not part of it"""
+        result = []
+        for node in (segment[0], segment[-1]):
+            for neighbor in self._neighbors[node]:
+                if neighbor not in segment and neighbor not in result:
+                    result.append(neighbor)
+        return result
+
+    def _move_segment(self, before, first, last, after, node_c, node_e,
+                      keep_orientation):
+        """ Private: moves the segment first..last between node c and its
+            successor e as a sequence of 2-opt exchanges"""
+        self._exchange(before, first, node_c, node_e)
+        self._exchange(before, node_c, after, last)
+        if keep_orientation:
+            self._exchange(node_c, last, first, node_e)
+
+    def _next(self, nid, successor):
+        """ Private: returns the successor or predecessor of a node"""
+        step = 1 if successor else -1
+        return int(self._tour[(self._pos[nid] + step) % len(self._tour)])
+
+    def _exchange(self, node_a, node_b, node_c, node_d):
+        """ Private: replaces the edges a-b and c-d by a-c and b-d. The
+            edges have to be in the same orientation in the tour"""
+        if self._next(node_a, True) == node_b:
+            self._reverse(node_b, node_c)
+        else:
+            self._reverse(node_a, node_d)
+
+    def _reverse(self, first, last):
+        """ Private: reverses the path from first to last in tour direction.
+            If the path is longer than half of the tour, the rest of the tour
+            is reversed instead, which results in the same cycle"""
+        size = len(self._tour)
+        start = self._pos[first]
+        end = self._pos[last]
+        length = (end - start) % size + 1
+        if 2 * length > size:
+            (start, end) = ((end + 1) % size, (start - 1) % size)
+            length = size - length
+        indices = (start + np.arange(length)) % size
+        self._tour[indices] = self._tour[indices[::-1]]
+        for (index, nid) in zip(indices.tolist(),
+                                self._tour[indices].tolist()):
+            self._pos[nid] = index
+
+    def _activate(self, nids):
+        """ Private: clears the don't-look bits of the given nodes"""
+        for nid in nids:
+            if nid not in self._queued:
+                self._queued.add(nid)
+                self._active.append(nid)
+
+    def _neighbor_lists(self, neighbors):
+        """ Private: the nearest neighbors of every tour node among the
+            tour nodes, sorted by distance. Other metrics than the
+            euclidean one are searched in the rows of the distances"""
+        coords = self._distances.coords()[self._tour]
+        euclidean = self._distances.metric().is_euclidean()
+        index = KDTree(coords)
+        count = min(neighbors + 1, len(self._tour))
+        result = {}
+        for (local, nid) in enumerate(self._tour.tolist()):
+            if euclidean:
+                nearest = index.k_nearest(coords[local][0], coords[local][1],
+                                          count)
+            else:
+                nearest = self._distances.nearest(nid, self._tour, count)
+            result[nid] = [int(self._tour[other]) for other in nearest
+                           if other != local]
+        return result
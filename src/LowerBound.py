@@ -0,0 +1,131 @@
+"""
+    LowerBound.py
+    See class description
+"""
+import numpy as np
+from SpanningTree import SpanningTree, spanning_forest
+
+# Maximum number of subgradient iterations
+ITERATIONS = 200
+# Number of iterations without a better bound after which the step size is
+# halved
+PATIENCE = 10
+# The optimization stops when the step size factor falls below this value
+MIN_STEP = 0.001
+# The bound of problems up to this size is evaluated on the complete graph
+EXACT_LIMIT = 20000
+
+
+class LowerBound(object):
+
+    """ Computes the Held-Karp lower bound of the optimal tour length.
+        A 1-tree is a spanning tree of all nodes but the first one, joined
+        with the two shortest edges of the first node. Every tour is a
+        1-tree, so the shortest 1-tree is a lower bound. Penalties of the
+        nodes that are added to the lengths of their edges change the
+        shortest 1-tree but not the optimal tour, they are optimized with
+        subgradient steps that push the degrees in the 1-tree towards two.
+        The step sizes are derived from the length of a double tree tour.
+        The 1-trees are computed on the edges of the CandidateGraph. The
+        final bound of problems up to EXACT_LIMIT nodes is evaluated on the
+        complete graph, so it is a guaranteed bound. For larger problems it
+        holds as long as the candidate graph contains the shortest 1-tree,
+        which it does in practice."""
+
+    def __init__(self, distances, candidates):
+        self._distances = distances
+        self._size = len(distances)
+        self.penalties = np.zeros(self._size)
+        if self._size < 3:
+            return
+        edges = candidates.edges()
+        lengths = distances.edge_lengths(edges[:, 0], edges[:, 1])
+        # edges are sorted pairs, so the edges of the first node start at 0
+        first = edges[:, 0] == 0
+        self._tree_edges = edges[~first]
+        self._tree_lengths = lengths[~first]
+        self._first_ends = edges[first, 1]
+        self._first_lengths = lengths[first]
+        tour = SpanningTree(distances, candidates).double_tree()
+        self._upper = distances.path_length(tour)
+
+    def compute(self, iterations=ITERATIONS, context=None):
+        """ Optimizes the penalties and returns the bound. Returns None for
+            problems with less than three nodes or if the task of the given
+            context was cancelled"""
+        if self._size < 3:
+            return None
+        penalties = np.zeros(self._size)
+        (best, factor, stale) = (-np.inf, 2.0, 0)
+        for _ in range(iterations):
+            if context is not None and context.cancelled():
+                return None
+            (value, degrees) = self._one_tree(penalties)
+            if value > best:
+                (best, stale) = (value, 0)
+                self.penalties = penalties.copy()
+            else:
+                stale += 1
+                if stale >= PATIENCE:
+                    (factor, stale) = (factor / 2, 0)
+                    if factor < MIN_STEP:
+                        break
+            subgradient = degrees - 2
+            norm = float(np.dot(subgradient, subgradient))
+            if not norm:
+                # the 1-tree is a tour, so it is optimal
+                break
+            step = factor * max(self._upper - value, 0) / norm
+            penalties = penalties + step * subgradient
+        if self._size <= EXACT_LIMIT:
+            return self._exact_one_tree(self.penalties)
+        return best
+
+    def _one_tree(self, penalties):
+        """ Private: the penalized length of the shortest 1-tree on the
+            candidate edges and the degrees of the nodes in it"""
+        starts = self._tree_edges[:, 0]
+        ends = self._tree_edges[:, 1]
+        lengths = self._tree_lengths + penalties[starts] + penalties[ends]
+        # the first node stays a component of its own
+        (positions, _) = spanning_forest(self._size, self._tree_edges,
+                                         lengths, components=2)
+        first = self._first_lengths + penalties[0] + \
+            penalties[self._first_ends]
+        closest = np.argsort(first, kind='mergesort')[:2]
+        value = lengths[positions].sum() + first[closest].sum() - \
+            2 * penalties.sum()
+        degrees = np.bincount(np.concatenate(
+            (starts[positions], ends[positions], self._first_ends[closest])),
+                              minlength=self._size)
+        degrees[0] += 2
+        return (float(value), degrees)
+
+    def _exact_one_tree(self, penalties):
+        """ Private: the penalized length of the shortest 1-tree on the
+            complete graph (Prim's algorithm)"""
+        outside = np.ones(self._size, dtype=bool)
+        outside[:2] = False
+        keys = self._penalized_row(1, penalties)
+        total = 0.0
+        for _ in range(self._size - 2):
+            keys[~outside] = np.inf
+            nid = int(np.argmin(keys))
+            total += keys[nid]
+            outside[nid] = False
+            keys = np.minimum(keys, self._penalized_row(nid, penalties))
+        first = self._penalized_row(0, penalties)[1:]
+        return float(total + np.partition(first, 1)[:2].sum() -
+                     2 * penalties.sum())
+
+    def _penalized_row(self, nid, penalties):
+        """ Private: the penalized lengths of the edges of a node"""
+        return self._distances.row(nid) + penalties[nid] + penalties
+
+
+def gap(length, bound):
+    """ Returns the relative excess of a tour length over a lower bound in
+        percent or None if there is no bound"""
+    if not bound:
+        return None
+    return 100.0 * (length - bound) / bound
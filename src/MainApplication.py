@@ -8,13 +8,13 @@ try:
 except ImportError:
     # for Python3
     import tkinter as tk
-import copy
 from SidebarFrame import SidebarFrame
 from CanvasFrame import CanvasFrame
 from IOModule import IOModule
+from DataController import DataController
 
 
-class MainApplication(tk.Frame):
+class MainApplication(tk.Frame, DataController):
 
     """ The MainApplication Module holds references to all frames drawn
     in the main window. It holds all atomic data and acts as an
@@ -24,77 +24,14 @@ class MainApplication(tk.Frame):
 
     def __init__(self, parent, *args, **kwargs):
         tk.Frame.__init__(self, parent, *args, **kwargs)
+        DataController.__init__(self)
 
         # Private vars
         self._parent = parent
-        """The data dictionary holding all global application data
-           self._data = {'key1' : data1, 'key2' : data2}"""
-        self._data = {}
-        """ The _nullvalues dictionary holds all default values for the
-        registered data. It is used when the program data is reset."""
-        self._nullvalues = {}
-        """The observer dictionary describing bindings of observers to data
-           self._observers = {'key1' : [observer1,observer2],
-                             'key2' : [observer3]}"""
-        self._observers = {}
 
-        self._setup_data()
         self._setup_gui()
         self._setup_menu()
 
-    def register_data(self, key, value):
-        """Adds a new entry to the data dictionary """
-        if key not in self._data:
-            self._nullvalues.update({key: copy.deepcopy(value)})
-            self._data.update({key: copy.deepcopy(value)})
-            self._observers.update({key: []})
-
-    def unregister_data(self, key):
-        """Removes a data entry from the data dictionary """
-        del self._data[key]
-
-    def register_observer(self, observer, keys):
-        """Adds an object to the observers array for a given set of keys."""
-        for key in keys:
-            if key not in self._data:
-                self.register_data(key, None)
-            self._observers[key].append(observer)
-
-    def unregister_observer(self, observer):
-        """ Removes an observer from all observer lists"""
-        for key in self.keys:
-            self._observers[key].remove(observer)
-
-    def commit_change(self, key, value):
-        """ Observers call this method to commit changes in a data set
-        registered under the given key. No type or validity checking
-        for the value is done! Calling instances are responsible
-        for validity"""
-        self._data[key] = value
-        self.notify(key)
-
-    def notify(self, key):
-        """ The method is called when the dataset of a given key has changed.
-        All observers registered for that key are notified about the change."""
-        ndata = self._data[key]
-        for observer in self._observers[key]:
-            observer.data_update(key, ndata)
-
-    def clear(self):
-        """ Clears all problem data from the program and resets the UI """
-        self._nullvalues['nodes'] = []
-        for key in self._data:
-            self.commit_change(key, self._nullvalues[key])
-
-    def get_data(self, key):
-        """ Returns the dataset for a given key """
-        return self._data[key]
-
-    def _setup_data(self):
-        """ Private: sets up globally used data """
-        self.register_data('scale', 100)
-        self.register_data('nodes', [])
-
     def _setup_gui(self):
         """ Private: Sets up the main components of the program:
         sidebar fame, canvas frame"""
@@ -127,6 +64,14 @@ class MainApplication(tk.Frame):
                              command=self.iomodule.export_tsp,
                              accelerator="Ctrl+S")
         self.bind_all("<Control-s>", lambda e: self.iomodule.export_tsp())
+        filemenu.add_command(label="Import .tspb file",
+                             command=self.iomodule.import_tspb)
+        filemenu.add_command(label="Save .tspb file",
+                             command=self.iomodule.export_tspb)
+        filemenu.add_command(label="Import .tour file",
+                             command=self.iomodule.import_tour)
+        filemenu.add_command(label="Save .tour file",
+                             command=self.iomodule.export_tour)
         filemenu.add_command(label="Export TIKZ Figure",
                              command=self.iomodule.export_tikz)
         menubar.add_cascade(label="File", menu=filemenu)
@@ -0,0 +1,160 @@
+"""
+    Metric.py
+    See class description
+"""
+import hashlib
+import math
+import numpy as np
+
+# The supported TSPLIB EDGE_WEIGHT_TYPEs. EUC_2D is the unrounded euclidean
+# distance the editor has always used, the other types are rounded to
+# integers as defined by TSPLIB
+EDGE_WEIGHT_TYPES = ['EUC_2D', 'ATT', 'CEIL_2D', 'GEO', 'MAN_2D', 'MAX_2D',
+                     'EXPLICIT']
+# Value of pi and radius of the earth in km of the GEO distance as defined
+# by TSPLIB
+GEO_PI = 3.141592
+GEO_RADIUS = 6378.388
+
+
+class Metric(object):
+
+    """ The Metric computes the lengths of edges according to the
+        EDGE_WEIGHT_TYPE of a problem. It holds no distances itself, the
+        lengths of the coordinate types are evaluated from the coordinates
+        multiplied by the scale when they are requested, explicit weights
+        are read from a WeightMatrix by node id. Edges of nodes that were
+        added after the matrix are measured like EUC_2D.
+        A single distance equals the element of the vectorized lengths of
+        the same edge. GEO coordinates are DDD.MM latitudes (x) and
+        longitudes (y), the degrees are truncated like in the reference
+        implementation of TSPLIB."""
+
+    def __init__(self, edge_weight_type='EUC_2D', weights=None):
+        if edge_weight_type not in EDGE_WEIGHT_TYPES:
+            raise ValueError("unsupported edge weight type: " +
+                             str(edge_weight_type))
+        if edge_weight_type == 'EXPLICIT' and weights is None:
+            raise ValueError("explicit edge weights need a weight matrix")
+        self.edge_weight_type = edge_weight_type
+        self.weights = weights
+        self._fingerprint = None
+
+    def __repr__(self):
+        return "Metric(" + self.edge_weight_type + ")"
+
+    def is_euclidean(self):
+        """ Returns true for the unrounded euclidean distance"""
+        return self.edge_weight_type == 'EUC_2D'
+
+    def fingerprint(self):
+        """ Returns a digest that identifies the metric, for explicit
+            weights it covers the complete matrix"""
+        if self._fingerprint is None:
+            digest = hashlib.sha1(self.edge_weight_type.encode())
+            if self.weights is not None:
+                packed = np.ascontiguousarray(self.weights.packed())
+                digest.update(packed.tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def without(self, nid):
+        """ Returns the metric of the problem without the node with the
+            given id. The following ids move up by one, so explicit weights
+            are returned in a new matrix without the row of the node"""
+        if self.weights is None or nid >= len(self.weights):
+            return self
+        return Metric(self.edge_weight_type, self.weights.without(nid))
+
+    def distance(self, start, end, scale, nids=None):
+        """ Returns the length of the edge between the (x, y) coordinates
+            start and end. Explicit weights are looked up by the pair of
+            node ids nids"""
+        kind = self.edge_weight_type
+        if kind == 'EXPLICIT' and nids is not None and \
+                max(nids) < len(self.weights):
+            return self.weights.weight(nids[0], nids[1])
+        if kind == 'GEO':
+            if nids is not None and nids[0] == nids[1]:
+                return 0.0
+            return float(self.lengths(np.array([start, end], dtype=float),
+                                      scale, 0, 1))
+        delta_x = (start[0] - end[0]) * scale
+        delta_y = (start[1] - end[1]) * scale
+        if kind == 'ATT':
+            distance = math.sqrt((delta_x * delta_x + delta_y * delta_y) /
+                                 10.0)
+            rounded = math.floor(distance + 0.5)
+            return float(rounded + 1 if rounded < distance else rounded)
+        elif kind == 'CEIL_2D':
+            return float(math.ceil(math.sqrt(delta_x * delta_x +
+                                             delta_y * delta_y)))
+        elif kind == 'MAN_2D':
+            return float(math.floor(abs(delta_x) + abs(delta_y) + 0.5))
+        elif kind == 'MAX_2D':
+            return float(max(math.floor(abs(delta_x) + 0.5),
+                             math.floor(abs(delta_y) + 0.5)))
+        return math.sqrt(delta_x ** 2 + delta_y ** 2)
+
+    def lengths(self, coords, scale, starts, ends):
+        """ Returns the lengths of the edges between the nodes with the ids
+            in starts and ends, which are broadcast against each other, as
+            a float array. The coordinates are the (n, 2) array of all
+            nodes"""
+        kind = self.edge_weight_type
+        if kind == 'EXPLICIT':
+            (starts, ends) = np.broadcast_arrays(np.asarray(starts),
+                                                 np.asarray(ends))
+            known = (starts < len(self.weights)) & (ends < len(self.weights))
+            if np.all(known):
+                return self.weights.weights(starts, ends)
+            result = _euclidean(coords[starts] - coords[ends], scale)
+            result[known] = self.weights.weights(starts[known], ends[known])
+            return result
+        if kind == 'GEO':
+            return _geo(_geo_radians(coords * scale), starts, ends)
+        delta = coords[starts] - coords[ends]
+        if kind == 'EUC_2D':
+            return _euclidean(delta, scale)
+        delta_x = delta[..., 0] * scale
+        delta_y = delta[..., 1] * scale
+        if kind == 'ATT':
+            distance = np.sqrt((delta_x * delta_x + delta_y * delta_y) / 10.0)
+            rounded = np.floor(distance + 0.5)
+            return np.where(rounded < distance, rounded + 1, rounded)
+        elif kind == 'CEIL_2D':
+            return np.ceil(np.sqrt(delta_x * delta_x + delta_y * delta_y))
+        elif kind == 'MAN_2D':
+            return np.floor(np.abs(delta_x) + np.abs(delta_y) + 0.5)
+        return np.maximum(np.floor(np.abs(delta_x) + 0.5),
+                          np.floor(np.abs(delta_y) + 0.5))
+
+
+def _euclidean(delta, scale):
+    """ Private: the unrounded euclidean lengths of the coordinate
+        differences"""
+    return np.sqrt((delta[..., 0] * scale) ** 2 + (delta[..., 1] * scale) ** 2)
+
+
+def _geo_radians(coords):
+    """ Private: converts DDD.MM coordinates to radians"""
+    degrees = np.trunc(coords)
+    return GEO_PI * (degrees + 5.0 * (coords - degrees) / 3.0) / 180.0
+
+
+def _geo(radians, starts, ends):
+    """ Private: the TSPLIB distances on the idealized sphere between the
+        nodes with the given radians. The TSPLIB formula measures 1 between
+        equal coordinates, the distance of a node to itself is 0"""
+    (latitude, longitude) = (radians[:, 0], radians[:, 1])
+    first = np.cos(longitude[starts] - longitude[ends])
+    second = np.cos(latitude[starts] - latitude[ends])
+    third = np.cos(latitude[starts] + latitude[ends])
+    cosine = np.clip(0.5 * ((1.0 + first) * second - (1.0 - first) * third),
+                     -1.0, 1.0)
+    result = np.floor(GEO_RADIUS * np.arccos(cosine) + 1.0)
+    return np.where(np.asarray(starts) == np.asarray(ends), 0.0, result)
+
+
+# The metric of problems without an edge weight type
+EUCLIDEAN = Metric()
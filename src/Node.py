@@ -8,14 +8,114 @@ class Node(object):
 
     """ Represents a node in a 2D cell array
         at position x,y. The node has an id and a color
-        represented by an integer value """
-
-    def __init__(self, nid, x, y, color):
-        self.nid = nid
-        self.x_coord = x
-        self.y_coord = y
-        self.color = color
-        self.start = False
+        represented by an integer value.
+        A node that is part of a NodeStore is a view on a row of the store,
+        its attributes are read from and written to the arrays of the store.
+        A node removed from its store keeps its last values."""
+
+    __slots__ = ('_store', '_index', '_nid', '_x', '_y', '_color', '_start')
+
+    def __init__(self, nid, x, y, color, start=False):
+        self._store = None
+        self._index = None
+        self._nid = nid
+        self._x = x
+        self._y = y
+        self._color = color
+        self._start = start
+
+    def __reduce__(self):
+        # nodes are always copied and pickled without their store
+        return (Node, (self.nid, self.x_coord, self.y_coord, self.color,
+                       self.start))
+
+    @property
+    def nid(self):
+        """ The id of the node"""
+        if self._store is None:
+            return self._nid
+        return self._store.get_value('nid', self._index)
+
+    @nid.setter
+    def nid(self, value):
+        if self._store is None:
+            self._nid = value
+        else:
+            self._store.set_value('nid', self._index, value)
+
+    @property
+    def x_coord(self):
+        """ The x coordinate of the node"""
+        if self._store is None:
+            return self._x
+        return self._store.get_value('x', self._index)
+
+    @x_coord.setter
+    def x_coord(self, value):
+        if self._store is None:
+            self._x = value
+        else:
+            self._store.set_value('x', self._index, value)
+
+    @property
+    def y_coord(self):
+        """ The y coordinate of the node"""
+        if self._store is None:
+            return self._y
+        return self._store.get_value('y', self._index)
+
+    @y_coord.setter
+    def y_coord(self, value):
+        if self._store is None:
+            self._y = value
+        else:
+            self._store.set_value('y', self._index, value)
+
+    @property
+    def color(self):
+        """ The color of the node"""
+        if self._store is None:
+            return self._color
+        return self._store.get_value('color', self._index)
+
+    @color.setter
+    def color(self, value):
+        if self._store is None:
+            self._color = value
+        else:
+            self._store.set_value('color', self._index, value)
+
+    @property
+    def start(self):
+        """ True if the node is a start node"""
+        if self._store is None:
+            return self._start
+        return self._store.get_value('start', self._index)
+
+    @start.setter
+    def start(self, value):
+        if self._store is None:
+            self._start = value
+        else:
+            self._store.set_value('start', self._index, value)
+
+    def is_view(self):
+        """ Returns true if the node is a view on a row of a store"""
+        return self._store is not None
+
+    def bind(self, store, index):
+        """ Makes the node a view on the given row of a store"""
+        self._store = store
+        self._index = index
+
+    def detach(self):
+        """ Copies the values of the row into the node and releases it from
+            its store"""
+        if self._store is not None:
+            (self._nid, self._x, self._y, self._color, self._start) = \
+                (self.nid, self.x_coord, self.y_coord, self.color, self.start)
+            self._store = None
+            self._index = None
 
     def to_string(self):
         """ Construct a string with the node informations """
@@ -0,0 +1,198 @@
+"""
+    NodeStore.py
+    See class description
+"""
+import numbers
+import numpy as np
+from Node import Node
+
+# Number of rows the arrays are allocated with at first
+INITIAL_CAPACITY = 64
+
+
+class NodeStore(object):
+
+    """ The NodeStore holds the nodes of a problem as a struct of arrays:
+        the coordinates, ids, color indices and start flags are kept in
+        NumPy buffers, so vectorized code can read them without touching
+        single nodes.
+        To the rest of the program the store behaves like a list of nodes.
+        Indexing returns a Node view on the row, that is created on first
+        access and keeps its identity as long as the row exists. Appending
+        a standalone node copies its values and makes it the view of the
+        new row. Deleting a row detaches its view, which keeps its values.
+        Coordinates are stored as integers until a non integral value is
+        set, so the views return the values they were created with."""
+
+    def __init__(self, nodes=()):
+        self._size = 0
+        self._coords = np.zeros((INITIAL_CAPACITY, 2), dtype=np.int64)
+        self._nids = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self._colors = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self._starts = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        # the colors are stored as indices into the palette
+        self._palette = []
+        self._palette_index = {}
+        self._views = []
+        for node in nodes:
+            self.append(node)
+
+    def __reduce__(self):
+        return (NodeStore, (list(self),))
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("node index out of range")
+        view = self._views[index]
+        if view is None:
+            view = Node(None, None, None, None)
+            view.bind(self, index)
+            self._views[index] = view
+        return view
+
+    def __delitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("node index out of range")
+        if self._views[index] is not None:
+            self._views[index].detach()
+        del self._views[index]
+        for (offset, view) in enumerate(self._views[index:]):
+            if view is not None:
+                view.bind(self, index + offset)
+        last = self._size - 1
+        for array in (self._coords, self._nids, self._colors, self._starts):
+            array[index:last] = array[index + 1:self._size]
+        self._size = last
+
+    def append(self, node):
+        """ Appends a node. A standalone node becomes the view of the new
+            row, the values of a node of another store are copied"""
+        self.add(node.x_coord, node.y_coord, node.color, node.start, node.nid)
+        if not node.is_view():
+            node.bind(self, self._size - 1)
+            self._views[-1] = node
+
+    def add(self, x_value, y_value, color, start=False, nid=None):
+        """ Appends a row without creating a view. The id defaults to the
+            position of the row"""
+        if self._size == len(self._nids):
+            self._grow()
+        index = self._size
+        self._size += 1
+        self._views.append(None)
+        self.set_value('x', index, x_value)
+        self.set_value('y', index, y_value)
+        self.set_value('color', index, color)
+        self._starts[index] = bool(start)
+        self._nids[index] = index if nid is None else nid
+
+    def add_coords(self, coords, color):
+        """ Appends rows with the given (n, 2) coordinates and color
+            without creating views. The ids are the positions of the rows"""
+        coords = np.asarray(coords).reshape(-1, 2)
+        if not len(coords):
+            return
+        while self._size + len(coords) > len(self._nids):
+            self._grow()
+        if coords.dtype.kind not in 'iu':
+            self._coords = self._coords.astype(np.float64)
+        rows = slice(self._size, self._size + len(coords))
+        self.set_value('color', self._size, color)
+        self._coords[rows] = coords
+        self._colors[rows] = self._palette_index[color]
+        self._starts[rows] = False
+        self._nids[rows] = np.arange(rows.start, rows.stop)
+        self._views.extend([None] * len(coords))
+        self._size = rows.stop
+
+    def get_value(self, field, index):
+        """ Returns the value of a field of the given row"""
+        if field == 'x':
+            return self._coords[index, 0].item()
+        elif field == 'y':
+            return self._coords[index, 1].item()
+        elif field == 'nid':
+            return self._nids[index].item()
+        elif field == 'color':
+            return self._palette[self._colors[index]]
+        return bool(self._starts[index])
+
+    def set_value(self, field, index, value):
+        """ Sets the value of a field of the given row"""
+        if field in ('x', 'y'):
+            if not isinstance(value, numbers.Integral) and \
+                    self._coords.dtype != np.float64:
+                self._coords = self._coords.astype(np.float64)
+            self._coords[index, 0 if field == 'x' else 1] = value
+        elif field == 'nid':
+            self._nids[index] = value
+        elif field == 'color':
+            if value not in self._palette_index:
+                self._palette_index[value] = len(self._palette)
+                self._palette.append(value)
+            self._colors[index] = self._palette_index[value]
+        else:
+            self._starts[index] = bool(value)
+
+    def coords(self):
+        """ Returns the coordinates of all nodes as a (n, 2) float array"""
+        return self._coords[:self._size].astype(float)
+
+    def arrays(self):
+        """ Returns the coordinates, color indices and start flags of all
+            nodes as arrays without copying them, and the palette of the
+            color indices"""
+        return (self._coords[:self._size], self._colors[:self._size],
+                self._starts[:self._size], list(self._palette))
+
+    @staticmethod
+    def from_arrays(coords, colors, starts, palette):
+        """ Creates a store that uses the given arrays as returned by
+            arrays() as its buffers. Nothing is copied until the store
+            grows, so the arrays may be memory mapped. The ids are the
+            positions of the nodes"""
+        result = NodeStore()
+        size = len(coords)
+        if not size:
+            return result
+        result._size = size
+        result._coords = coords if coords.dtype in (np.int64, np.float64) \
+            else coords.astype(np.float64)
+        result._colors = colors
+        result._starts = starts
+        result._nids = np.arange(size, dtype=np.int64)
+        result._palette = list(palette)
+        result._palette_index = dict((color, index) for (index, color)
+                                     in enumerate(result._palette))
+        result._views = [None] * size
+        return result
+
+    def start_indices(self):
+        """ Returns the positions of all start nodes"""
+        return np.flatnonzero(self._starts[:self._size])
+
+    def reindex(self):
+        """ Assigns node ids according to the position of the nodes"""
+        self._nids[:self._size] = np.arange(self._size)
+
+    def _grow(self):
+        """ Private: doubles the capacity of the arrays"""
+        capacity = 2 * len(self._nids)
+        for name in ('_coords', '_nids', '_colors', '_starts'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
@@ -4,6 +4,7 @@
 """
 from SidebarWidget import SidebarWidget
 from SolverModule import SolverModule
+from LowerBound import gap
 from collections import OrderedDict
 try:
     # for Python2
@@ -17,7 +18,9 @@ class PathWidget(SidebarWidget):
 
     """ The Pathwidget provides a dropdown with different solving
         methods. If a method is slected, the corresponding algorithm is
-        executed and the path info is displayed in a information list box"""
+        executed and the path info is displayed in a information list box.
+        The gap of the length of a complete tour to the lower bound of the
+        problem is shown below the tour length once the bound is known."""
 
     def __init__(self, parent, datacontroller, **options):
         SidebarWidget.__init__(self, parent, text='Path', **options)
@@ -26,20 +29,35 @@ class PathWidget(SidebarWidget):
         self._datacontroller = datacontroller
         self._step = 0
         self._path_steps = []
+        self._bound = None
         self._solver_var = None
         solver_module = SolverModule(self, datacontroller)
+        self._solver_module = solver_module
         self._methods = OrderedDict([('None', solver_module.empty_solution),
                                      ('Optimal Tour', solver_module.concorde),
+                                     ('Branch and Bound',
+                                      solver_module.branch_and_bound),
                                      ('Convex Hull',
                                       solver_module.convex_hull),
                                      ('Convex Human Model',
                                       solver_module.convex_hull_model),
                                      ('Nearest Neighbor',
-                                      solver_module.nearest_neighbor)])
+                                      solver_module.nearest_neighbor),
+                                     ('Double Tree',
+                                      solver_module.double_tree),
+                                     ('Christofides',
+                                      solver_module.christofides),
+                                     ('Clustered', solver_module.clustered),
+                                     ('+ 2-opt', solver_module.two_opt)])
+        # stochastic methods can be run several times with different seeds
+        self._stochastic = {'Convex Human Model': 'convex_hull_model',
+                            'Nearest Neighbor': 'nearest_neighbor'}
+        self._runs_var = None
         # setup the ui
         self._setup_gui()
         # register as observer
-        self._datacontroller.register_observer(self, ['path', 'pathsteps'])
+        self._datacontroller.register_observer(
+            self, ['path', 'pathsteps', 'solverRunning', 'lowerBound'])
 
     def _setup_gui(self):
         """ UI """
@@ -56,6 +74,19 @@ class PathWidget(SidebarWidget):
         self._solver_var.trace("w", lambda a, b, c: self._on_dropdown_select())
         tk.OptionMenu(*((solvers_frame, self._solver_var) +
                         tuple(solvers))).pack(side=tk.RIGHT, anchor=tk.W)
+        # Number of runs of the stochastic solvers
+        runs_container = tk.Frame(self._sub_frame)
+        runs_container.pack(side=tk.TOP, anchor=tk.W)
+        tk.Label(runs_container, text="Runs: ").pack(side=tk.LEFT)
+        self._runs_var = tk.StringVar(runs_container)
+        self._runs_var.set("1")
+        tk.Spinbox(runs_container, from_=1, to=10000, width=6,
+                   textvariable=self._runs_var).pack(side=tk.LEFT)
+        # Cancel Button for solvers running in the background
+        self._cancel_button = tk.Button(
+            runs_container, text="Cancel", state=tk.DISABLED,
+            command=self._solver_module.cancel)
+        self._cancel_button.pack(side=tk.LEFT)
 
         # INFO FRAME
         info_labelframe = tk.LabelFrame(
@@ -96,7 +127,20 @@ class PathWidget(SidebarWidget):
         """Gets called when the user selects a method from the dropdown.
            Looks up the corresponding solving method and executes it"""
         method = str(self._solver_var.get())
-        self._methods[method]()
+        # a new selection replaces a solver running in the background
+        self._solver_module.cancel()
+        try:
+            runs = int(self._runs_var.get())
+        except ValueError:
+            runs = 1
+        # the run is measured until the solver has finished
+        if runs > 1 and method in self._stochastic:
+            self._solver_module.profile(
+                method + " (" + str(runs) + " runs)",
+                lambda: self._solver_module.monte_carlo(
+                    self._stochastic[method], runs))
+        else:
+            self._solver_module.profile(method, self._methods[method])
 
     def _do_step(self, key):
         """ Is called when the user clicks a control button.
@@ -129,18 +173,40 @@ class PathWidget(SidebarWidget):
         self._datacontroller.commit_change(
             'path', self._path_steps[self._step])
 
+    def _show_path(self, path):
+        """ Private: displays the info of the given path. The gap is only
+            shown for a complete tour, not for the steps that construct it"""
+        self._info_listbox.delete(0, tk.END)
+        for key in path:
+            self._info_listbox.insert(tk.END, str(key) + ": " + str(path[key]))
+            if key == 'Tourlength' and self._is_tour(path):
+                percent = gap(path[key], self._bound)
+                if percent is not None:
+                    self._info_listbox.insert(tk.END, "Gap: %.2f%%" % percent)
+
+    def _is_tour(self, path):
+        """ Private: returns true if the path is a closed tour through all
+            nodes"""
+        tour = path.get('Tour', [])
+        nodes = self._datacontroller.get_data('nodes')
+        return (len(tour) == len(nodes) + 1 and tour[0] == tour[-1] and
+                len(set(tour)) == len(nodes))
+
     def data_update(self, key, data):
         """handles updates in observed data"""
         if key is 'path':
-            self._info_listbox.delete(0, tk.END)
-            if data:
-                for (index, key) in enumerate(data):
-                    self._info_listbox.insert(
-                        index, str(key) + ": " + str(data[key]))
+            self._show_path(data or {})
+        elif key == 'lowerBound':
+            self._bound = data
+            self._show_path(self._datacontroller.get_data('path') or {})
+        elif key == 'solverRunning':
+            self._cancel_button.config(
+                state=tk.NORMAL if data else tk.DISABLED)
         elif key is 'pathsteps':
             self._path_steps = data
             self._step = len(data) - 1
             if data:
+                self._solver_module.lower_bound()
                 self._stepper_controls[0].config(state=tk.NORMAL)
                 self._stepper_controls[1].config(state=tk.NORMAL)
             else:
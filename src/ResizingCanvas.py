@@ -10,7 +10,7 @@ except ImportError:
     import tkinter as tk
 from Node import Node
 import math
-import copy
+import numpy as np
 import tsputil
 
 PADDING = 5
@@ -18,7 +18,12 @@ PADDING = 5
 
 class ResizingCanvas(tk.Canvas):
 
-    """ The Canvas Module. All drawable data is drawn here"""
+    """ The Canvas Module. All drawable data is drawn here.
+        Nodes are drawn in the cells of their coordinates. If a node doesn't
+        lie in a cell of the grid, e.g. the exact coordinates of a GEO or
+        ATT problem, all nodes are drawn through a display transform that
+        fits their bounding box into the grid. The nodes keep their
+        coordinates, the transform only changes where they are drawn."""
 
     def __init__(self, parent, datacontroller, **kwargs):
         tk.Canvas.__init__(self, parent, **kwargs)
@@ -33,8 +38,13 @@ class ResizingCanvas(tk.Canvas):
         self._selected_node = None
         self._rows = math.floor(self._geom['height'] / self._geom['fieldsize'])
         self._cols = math.floor(self._geom['width'] / self._geom['fieldsize'])
-        self._points = [None for i in range(0, int(self._rows * self._cols))]
-        self._nodes = copy.copy(self._datacontroller.get_data('nodes'))
+        # the drawn point of every node
+        self._points = {}
+        self._nodes = list(self._datacontroller.get_data('nodes'))
+        # the (x offset, y offset, factor) of the display transform, None if
+        # the nodes are drawn in the cells of their coordinates
+        self._transform = None
+        self._path = {}
 
         # Used Tags:
         # ["selector", "node", "startnode", "path_line", "cog", "com"]
@@ -115,59 +125,80 @@ class ResizingCanvas(tk.Canvas):
         and the event passed to the other modules."""
         # get relative field coordinates
         (x_value, y_value) = self.get_selected_cell(event)
-        # only do something if the clicked position is within bounds
+        # only do something if the clicked position is within bounds and
+        # not on a drawn node
         if (x_value < self._cols and y_value < self._rows
-                and x_value >= 0 and y_value >= 0):
-            point = self._points[int(y_value * self._cols + x_value)]
+                and x_value >= 0 and y_value >= 0
+                and "node" not in self.gettags("current")):
+            (x_value, y_value) = self.node_position(x_value, y_value)
             # if there is no node yet, add one
-            if point is None:
+            if self._datacontroller.get_node_index().find_node(
+                    (x_value, y_value)) is None:
                 new_nodes = self._datacontroller.get_data('nodes')
                 color = self._datacontroller.get_data('nodecolor')
                 new_nodes.append(Node(len(new_nodes), x_value, y_value, color))
                 self._datacontroller.commit_change('nodes', new_nodes)
 
     def add_node(self, node):
-        """ draws a point on the specified position on the canvas and adds
-        the data to the nodes and points arrays"""
-        index = int(node.y_coord * self._cols + node.x_coord)
-        point = self.circle(node.x_coord, node.y_coord, 0.5, fill=node.color,
+        """ draws a point for the node on the canvas and registers it for
+        the click event"""
+        (x_value, y_value) = self.display_position(node.x_coord, node.y_coord)
+        point = self.circle(x_value, y_value, 0.5, fill=node.color,
                             tags="node", activeoutline=tsputil.RESCOLORS[0],
                             activewidth=3)
         # register point for the click event
-        self.tag_bind(point, "<Button-1>", lambda e: self.node_selected(index))
-        self._points[index] = point
+        self.tag_bind(point, "<Button-1>", lambda e: self.node_selected(node))
+        self._points[node] = point
 
-    def ind_to_coord(self, index):
-        """ Converts an index to X,Y coordinates """
-        y_value = math.floor(index / self._cols)
-        x_value = index - y_value * self._cols
-        return (x_value, y_value)
+    def display_position(self, x_value, y_value):
+        """ Returns the position of the given node coordinates in the grid,
+            which is not a cell if the display transform is used"""
+        if self._transform is None:
+            return (x_value, y_value)
+        (x_offset, y_offset, factor) = self._transform
+        return ((x_value - x_offset) * factor, (y_value - y_offset) * factor)
+
+    def node_position(self, x_value, y_value):
+        """ Returns the node coordinates of the given cell, the inverse of
+            display_position"""
+        if self._transform is None:
+            return (x_value, y_value)
+        (x_offset, y_offset, factor) = self._transform
+        return (x_offset + x_value / factor, y_offset + y_value / factor)
 
-    def node_selected(self, index):
-        """ Selects the point at the index position.
-        If the point is already selected, it is deselected.
+    def fit_transform(self, coords):
+        """ Returns the display transform of the given (n, 2) node
+            coordinates, None if all nodes lie in cells of the grid"""
+        if not len(coords):
+            return None
+        (low, high) = (coords.min(axis=0), coords.max(axis=0))
+        if (np.all(coords == np.floor(coords)) and low.min() >= 0 and
+                high[0] < self._cols and high[1] < self._rows):
+            return None
+        extent = np.maximum(high - low, 1.0)
+        factor = min((self._cols - 1) / extent[0], (self._rows - 1) / extent[1])
+        return (float(low[0]), float(low[1]), float(factor))
+
+    def node_selected(self, node):
+        """ Selects the given node.
+        If the node is already selected, it is deselected.
         In both cases the event is passed to the other modules"""
-        if self._selected_node == index:
+        if self._selected_node is node:
             self._selected_node = None
             self._datacontroller.commit_change('selectedNode', None)
         else:
-            # find node in nodes array
-            (x_value, y_value) = self.ind_to_coord(index)
-            for node in self._nodes:
-                if node.x_coord == x_value and node.y_coord == y_value:
-                    self._datacontroller.commit_change('selectedNode', node)
-                    break
+            self._datacontroller.commit_change('selectedNode', node)
 
-    def draw_selection_indicator(self, index):
-        """ Draws a red ring around the selected point """
-        coords = self.ind_to_coord(index)
-        self.circle(coords[0], coords[1], 0.5, outline=tsputil.RESCOLORS[1],
+    def draw_selection_indicator(self, node):
+        """ Draws a red ring around the point of the node """
+        (x_value, y_value) = self.display_position(node.x_coord, node.y_coord)
+        self.circle(x_value, y_value, 0.5, outline=tsputil.RESCOLORS[1],
                     width=3, fill="", tags="selector")
 
-    def draw_start_indicator(self, index):
-        """ Draws a blue ring around the selected point """
-        coords = self.ind_to_coord(index)
-        self.circle(coords[0], coords[1], 0.6, outline=tsputil.RESCOLORS[2],
+    def draw_start_indicator(self, node):
+        """ Draws a blue ring around the point of the node """
+        (x_value, y_value) = self.display_position(node.x_coord, node.y_coord)
+        self.circle(x_value, y_value, 0.6, outline=tsputil.RESCOLORS[2],
                     width=5, fill="", tags="startnode")
 
     def draw_center_of_mass(self):
@@ -175,11 +206,11 @@ class ResizingCanvas(tk.Canvas):
         self.delete("com")
         if len(self._nodes):
             # accumulate x and y coordinates
-            x_sum = sum([node.x_coord for node in self._nodes])
-            y_sum = sum([node.y_coord for node in self._nodes])
+            coords = tsputil.node_coords(self._datacontroller.get_data('nodes'))
+            (x_sum, y_sum) = coords.sum(axis=0).tolist()
             # normalize accumulated values
-            x_value = x_sum / len(self._nodes)
-            y_value = y_sum / len(self._nodes)
+            (x_value, y_value) = self.display_position(
+                x_sum / len(self._nodes), y_sum / len(self._nodes))
             # draw the com circle
             self.circle(x_value, y_value, 0.2, outline="#44f",
                         width=3, fill="", tags="com")
@@ -190,10 +221,11 @@ class ResizingCanvas(tk.Canvas):
         """ Draws a small blue ring at the geometrical center """
         self.delete("cog")
         if len(self._nodes):
-            x_coords = [node.x_coord for node in self._nodes]
-            y_coords = [node.y_coord for node in self._nodes]
-            x_value = (max(x_coords) + min(x_coords)) / 2
-            y_value = (max(y_coords) + min(y_coords)) / 2
+            coords = tsputil.node_coords(self._datacontroller.get_data('nodes'))
+            (x_max, y_max) = coords.max(axis=0).tolist()
+            (x_min, y_min) = coords.min(axis=0).tolist()
+            (x_value, y_value) = self.display_position(
+                (x_max + x_min) / 2, (y_max + y_min) / 2)
             self.circle(x_value, y_value, 0.2, outline="#f44",
                         width=3, fill="", tags="cog")
             self.tag_lower("cog")
@@ -231,12 +263,11 @@ class ResizingCanvas(tk.Canvas):
         return circ
 
     def delete_node(self, node):
-        """ Delete the point at cell x,y"""
-        ind = int(node.y_coord * self._cols + node.x_coord)
-        if ind == self._selected_node:
-            self.node_selected(ind)
-        self.delete(self._points[ind])
-        self._points[ind] = None
+        """ Delete the point of the node"""
+        if node is self._selected_node:
+            self.node_selected(node)
+        if node in self._points:
+            self.delete(self._points.pop(node))
 
     def redraw_starts(self):
         """Deletes all start markers and redraws them. Is needed when
@@ -244,19 +275,42 @@ class ResizingCanvas(tk.Canvas):
         self.delete("startnode")
         for node in self._nodes:
             if node.start:
-                index = int(node.y_coord * self._cols + node.x_coord)
-                self.draw_start_indicator(index)
+                self.draw_start_indicator(node)
+
+    def draw_path(self):
+        """ Draws the lines of the current path"""
+        self.delete("path_line")
+        tour = self._path.get('Tour', [])
+        # a path of deleted nodes is not drawn
+        if all(0 <= int(nid) < len(self._nodes) for nid in tour):
+            for current in range(0, len(tour) - 1):
+                start = self._nodes[int(tour[current])]
+                end = self._nodes[int(tour[current + 1])]
+                self.line(*(self.display_position(start.x_coord, start.y_coord) +
+                            self.display_position(end.x_coord, end.y_coord)))
+        self.tag_raise("node")
 
     def data_update(self, key, data):
         """ Handles upates in the observed data"""
         if key is 'nodes':
             diffadd = list(set(data)-set(self._nodes))
             diffsub = list(set(self._nodes) - set(data))
-            for node in diffadd:
-                self.add_node(node)
             for node in diffsub:
                 self.delete_node(node)
-            self._nodes = copy.copy(data)
+            self._nodes = list(data)
+            transform = self.fit_transform(tsputil.node_coords(data))
+            if transform != self._transform:
+                # every node moves, all points and markers are drawn again
+                self._transform = transform
+                self.delete("node")
+                self._points = {}
+                diffadd = self._nodes
+                self.draw_path()
+                self.delete("selector")
+                if self._selected_node is not None:
+                    self.draw_selection_indicator(self._selected_node)
+            for node in diffadd:
+                self.add_node(node)
             self.redraw_starts()
             self.draw_center_of_mass()
             self.draw_geometrical_center()
@@ -266,18 +320,10 @@ class ResizingCanvas(tk.Canvas):
             self._selected_node = None
             if data:
                 # set new selection
-                index = int(data.y_coord * self._cols + data.x_coord)
-                self._selected_node = index
-                self.draw_selection_indicator(index)
+                self._selected_node = data
+                self.draw_selection_indicator(data)
         elif key is 'path':
-            self.delete("path_line")
-            if 'Tour' in data:
-                tour = data['Tour']
-                for current in range(0, len(tour) - 1):
-                    start = self._nodes[int(tour[current])]
-                    end = self._nodes[int(tour[current + 1])]
-                    self.line(start.x_coord, start.y_coord,
-                              end.x_coord, end.y_coord)
-            self.tag_raise("node")
+            self._path = data or {}
+            self.draw_path()
         elif key is 'startnode':
             self.redraw_starts()
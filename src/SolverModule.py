@@ -7,23 +7,90 @@ import tsputil
 import platform
 import subprocess
 import os
-import copy
-from random import randint
+import shutil
+import tempfile
+import random
+import multiprocessing
+import numpy as np
+from BranchAndBound import BranchAndBound
+from ClusterDecomposition import ClusterDecomposition, cluster_path
+from DistanceCache import MATRIX_LIMIT
+from InsertionEngine import InsertionEngine
+from LocalSearch import LocalSearch
+from LowerBound import LowerBound, gap
+from Metric import Metric
+from SolverProfiler import SolverProfiler
+from SpanningTree import SpanningTree
+from BackgroundWorker import BackgroundWorker
+from Node import Node
+from TourStore import TourStore
+from WeightMatrix import WeightMatrix
+from StepLog import StepLog
+from NodeStore import NodeStore
+from DataController import DataController
+
+# Concorde solutions of this session by instance hash
+_SOLUTIONS = {}
+# Held-Karp lower bounds of this session by instance hash
+_BOUNDS = {}
+# Problems up to this size are solved optimally by dynamic programming
+# instead of concorde (2 ** (n - 1) * (n - 1) table entries)
+HELD_KARP_LIMIT = 18
+# Default number of seconds the branch and bound search runs
+BRANCH_AND_BOUND_BUDGET = 30
+# Upper limit for randomly chosen base seeds of Monte Carlo runs
+MAX_SEED = 2 ** 31
+# Percentiles of the tour lengths shown in a Monte Carlo summary
+PERCENTILES = [5, 25, 50, 75, 95]
+# The solver module and data controller of a Monte Carlo worker process
+_WORKER = None
 
 
 class SolverModule:
 
     """ The solver module includes all solving algorithms and bindings
         to external programs. Completed tours are passed to the given
-        datacontroller, not the calling parent."""
+        datacontroller, not the calling parent. A module created without a
+        store solves every run, it neither reads nor writes the tour store
+        and the concorde solution cache."""
 
-    def __init__(self, parent, datacontroller):
+    def __init__(self, parent, datacontroller, store=True):
 
         self._parent = parent
         self._datacontroller = datacontroller
 
+        # long running solvers are executed on a background thread, unless
+        # the module is used without a Tk parent
+        self._worker = None
+        # lower bounds have a worker of their own, so they are computed
+        # while a solver runs
+        self._bound_worker = None
+        self._bound_key = None
+        # the tours found by a running branch and bound search
+        self._incumbents = None
+        if parent is not None:
+            self._worker = BackgroundWorker(parent)
+            self._bound_worker = BackgroundWorker(parent)
+
+        # results of deterministic runs and concorde solutions are stored
+        # across sessions, unless every run has to be solved (e.g. to
+        # measure it)
+        self._store = TourStore() if store else None
+        # measures the runs started with profile()
+        self._profiler = SolverProfiler(datacontroller)
+
         self._datacontroller.register_data('path', {})
         self._datacontroller.register_data('pathsteps', [])
+        self._datacontroller.register_data('solverRunning', False)
+        self._datacontroller.register_data('info', "")
+        self._datacontroller.register_data('lowerBound', None)
+
+    def profile(self, label, function):
+        """ Calls a solver function as a measured run. Its wall time, CPU
+            time and (if enabled) its peak memory and hot calls are shown as
+            'info' and logged once the solver has finished, also if it runs
+            on the background worker. See SolverProfiler."""
+        self._profiler.run(label, function)
 
     def empty_solution(self):
         """ commits an empty path and an empty pathsteps array"""
@@ -36,86 +103,265 @@ class SolverModule:
         ------------------------------------------------------------------------
         Uses the tool concorde to find the optimal tour in the problem.
         See  http://www.math.uwaterloo.ca/tsp/concorde.html for more information
+        Concorde runs on the background worker, its output is shown as
+        'info' and the tour is committed when it has finished.
+        Small problems are solved by the Held-Karp dynamic program instead,
+        which runs on the background worker as well.
         """
         nodes = self._datacontroller.get_data('nodes')
-        if len(nodes):
+        if 0 < len(nodes) <= HELD_KARP_LIMIT:
+            # the worker gets its own copy of the distances
+            matrix = np.array(self._datacontroller.get_distances().matrix())
+            if self._worker is None:
+                self._concorde_done(solve_held_karp(matrix), "Held-Karp")
+            else:
+                self._start_worker(
+                    lambda context: solve_held_karp(matrix, context),
+                    on_progress=None,
+                    on_done=lambda tour: self._concorde_done(tour,
+                                                             "Held-Karp"))
+        elif len(nodes):
             scale = self._datacontroller.get_data('scale')
-            comment = "GENERATED TEMPORARY FILE"
-            # generate temporary file containing the current problem
-            filename = tspio.export_tsp(nodes, scale, comment,
-                                        tsputil.FilenameWrapper("tmpfile.tsp"))
-            directory = os.path.dirname(os.path.realpath(__file__))
-
-            # Check operating system first
-            sysos = platform.system()
-            # and call the corresponding binary of concorde
-            if sysos == "Darwin":
-                subprocess.call([directory + "/../bin/concorde-osx", filename])
-            elif sysos == "Linux":
-                subprocess.call(
-                    [directory + "/../bin/concorde-fedora", filename])
-            elif sysos == "Windows":
-                return  # this function is not supported under windows yet
+            metric = self._datacontroller.get_data('metric')
+            # an unchanged problem is not solved again
+            key = None
+            tour = None
+            if self._store is not None:
+                key = tsputil.instance_hash(nodes, scale, metric)
+                tour = load_concorde_solution(key)
+            if tour is not None:
+                self._concorde_done(tour)
+            elif self._worker is None:
+                self._concorde_done(solve_concorde(nodes, scale, key, metric=metric))
             else:
-                return
-            #the basename is the filename without path and extension
-            basename = os.path.splitext(filename)[0]
-
-            # open solution file and parse solution string
-            solution = tspio.parse_solution_file(basename + ".sol")
-            # generate a list of ids from the character list in the solution file
-            tour = [int(char) for char in solution.split()]
-            # concorde doesn't include the start again as end, so it is added here
-            tour.append(tour[0])
-
-            # delete files generated by concorde
-            for prefix in ["", "O"]:
-                for extension in [".tsp", ".sol", ".mas", ".pul", ".sav"]:
-                    file_to_delete = directory + "/" + prefix + basename + extension
-                    if os.path.isfile(file_to_delete):
-                        os.remove(file_to_delete)
-
-            result = construct_step(tour, 'Unknown', 'Unknown', nodes, scale)
-            steps = [{'Tour': [], 'Tourlength': 0}, result]
+                # the worker gets its own copy of the problem
+                coords = [(node.x_coord, node.y_coord) for node in nodes]
+                self._start_worker(
+                    lambda context: solve_concorde(coords, scale, key, context,
+                                                   metric),
+                    on_progress=lambda line: self._datacontroller.commit_change(
+                        'info', "Concorde: " + line),
+                    on_done=self._concorde_done)
+
+    def branch_and_bound(self, budget=BRANCH_AND_BOUND_BUDGET):
+        """ Searches the optimal tour with branch and bound for at most
+        budget seconds, starting from a Christofides tour improved by 2-opt
+        and Or-opt. Every better tour is appended to the pathsteps and
+        committed as 'path', so the best tour so far is shown while the
+        search runs on the background worker. The search works on the
+        complete distance matrix, so it is limited to MATRIX_LIMIT nodes.
+        """
+        nodes = self._datacontroller.get_data('nodes')
+        if len(nodes) < 3:
+            return
+        if len(nodes) > MATRIX_LIMIT:
+            self._datacontroller.commit_change(
+                'info', "Branch and bound: the problem is too large")
+            return
+        self._incumbents = StepLog(self._datacontroller.get_distances())
+        self._incumbents.describe('Node 0', 'Unknown', 'Branch and bound')
+        if self._worker is None:
+            search = branch_and_bound_search(self._datacontroller)
+            search.solve(budget, on_improvement=self._branch_and_bound_improved)
+            self._branch_and_bound_done(search)
+        else:
+            # the worker gets its own copy of the problem
+            problem = NodeStore(nodes)
+            scale = self._datacontroller.get_data('scale')
+            metric = self._datacontroller.get_data('metric')
+            self._start_worker(
+                lambda context: solve_branch_and_bound(problem, scale, budget,
+                                                       context, metric),
+                on_progress=self._branch_and_bound_improved,
+                on_done=self._branch_and_bound_done)
+
+    def _branch_and_bound_improved(self, tour):
+        """ Private: commits a better tour of the branch and bound search"""
+        self._incumbents.add_tour(tour)
+        self._datacontroller.commit_change('pathsteps', self._incumbents)
+        self._datacontroller.commit_change('path', self._incumbents[-1])
+        self._datacontroller.commit_change(
+            'info', "Branch and bound: best tour " +
+            str(round(self._incumbents[-1]['Tourlength'], 2)))
+
+    def _branch_and_bound_done(self, search):
+        """ Private: shows the result of the branch and bound search"""
+        self._datacontroller.commit_change('solverRunning', False)
+        percent = gap(search.length, search.bound)
+        if search.optimal:
+            message = "the tour is optimal"
+        elif percent is None:
+            message = "time is up, the tour is the best one found"
+        else:
+            message = "time is up, the tour is at most %.2f%% longer " \
+                "than the optimal tour" % percent
+        self._datacontroller.commit_change(
+            'info', "Branch and bound: " + message)
+
+    def cancel(self):
+        """ Cancels a solver running on the background worker"""
+        if self._worker is not None and self._worker.is_running():
+            self._worker.cancel()
+            self._datacontroller.commit_change('solverRunning', False)
+            self._datacontroller.commit_change('info', "Solver cancelled")
+            self._profiler.stop()
+
+    def _start_worker(self, task, on_progress, on_done):
+        """ Private: starts a solver task on the background worker. A
+            measured run lasts until the task has finished"""
+        self._datacontroller.commit_change('solverRunning', True)
+        self._worker.start(self._profiler.wrap(task), on_progress=on_progress,
+                           on_done=self._profiler.finishing(on_done),
+                           on_error=self._profiler.finishing(self._worker_failed))
+
+    def lower_bound(self):
+        """ Commits the Held-Karp lower bound of the current problem as
+            'lowerBound'. The bounds are cached per problem, an unknown bound
+            is computed on the background worker and None is committed
+            until it is known."""
+        nodes = self._datacontroller.get_data('nodes')
+        if len(nodes) < 3:
+            self._datacontroller.commit_change('lowerBound', None)
+            return
+        scale = self._datacontroller.get_data('scale')
+        metric = self._datacontroller.get_data('metric')
+        key = tsputil.instance_hash(nodes, scale, metric)
+        if key in _BOUNDS:
+            self._datacontroller.commit_change('lowerBound', _BOUNDS[key])
+            return
+        self._datacontroller.commit_change('lowerBound', None)
+        if self._bound_worker is None:
+            bound = LowerBound(self._datacontroller.get_distances(),
+                               self._datacontroller.get_candidates()).compute()
+            self._lower_bound_done((key, bound))
+        elif key != self._bound_key or not self._bound_worker.is_running():
+            self._bound_key = key
+            # the worker gets its own copy of the problem
+            problem = NodeStore(nodes)
+            self._bound_worker.start(
+                lambda context: (key, compute_lower_bound(problem, scale, context,
+                                                          metric)),
+                on_done=self._lower_bound_done)
+
+    def _lower_bound_done(self, result):
+        """ Private: caches and commits a computed lower bound"""
+        (key, bound) = result
+        if bound is None:
+            return
+        _BOUNDS[key] = bound
+        self._datacontroller.commit_change('lowerBound', bound)
+
+    def _concorde_done(self, tour, solver="Concorde"):
+        """ Private: commits the optimal tour found by the given solver"""
+        self._datacontroller.commit_change('solverRunning', False)
+        if tour is None:
+            self._datacontroller.commit_change(
+                'info', "Concorde is not available on this system")
+            return
+        steps = StepLog(self._datacontroller.get_distances())
+        steps.describe('Unknown', 'Unknown')
+        steps.add_tour(tour)
 
-            self._datacontroller.commit_change('pathsteps', steps)
-            self._datacontroller.commit_change('path', result)
+        self._datacontroller.commit_change('pathsteps', steps)
+        self._datacontroller.commit_change('path', steps[-1])
+        self._datacontroller.commit_change('info', solver + " finished")
+
+    def _load_run(self, solver, params):
+        """ Private: returns the stored pathsteps of a deterministic run on
+            the current problem or None"""
+        if self._store is None:
+            return None
+        nodes = self._datacontroller.get_data('nodes')
+        scale = self._datacontroller.get_data('scale')
+        metric = self._datacontroller.get_data('metric')
+        state = self._store.get(tsputil.instance_hash(nodes, scale, metric),
+                                solver, params)
+        if not isinstance(state, dict):
+            # entries of older versions hold the complete steps
+            return None
+        return StepLog.from_state(self._datacontroller.get_distances(), state)
+
+    def _store_run(self, solver, params, steps):
+        """ Private: stores the pathsteps of a deterministic run on the
+            current problem"""
+        if self._store is None:
+            return
+        nodes = self._datacontroller.get_data('nodes')
+        scale = self._datacontroller.get_data('scale')
+        metric = self._datacontroller.get_data('metric')
+        self._store.put(tsputil.instance_hash(nodes, scale, metric), solver,
+                        params, steps.state())
+
+    def _commit_stored_run(self, solver, params):
+        """ Private: commits the stored pathsteps of a deterministic run.
+            Returns true if the run was found in the store"""
+        steps = self._load_run(solver, params)
+        if not steps:
+            return False
+        self._datacontroller.commit_change('pathsteps', steps)
+        self._datacontroller.commit_change('path', steps[-1])
+        return True
+
+    def _worker_failed(self, error):
+        """ Private: shows the error of a failed background solver"""
+        self._datacontroller.commit_change('solverRunning', False)
+        self._datacontroller.commit_change('info', "Solver failed: " + str(error))
 
     def convex_hull(self):
         """ Returns all nodes defining the convex_hull or lying on its edge."""
         nodes = self._datacontroller.get_data('nodes')
-        scale = self._datacontroller.get_data('scale')
-        hull = tsputil.convex_hull_helper(nodes)
+        distances = self._datacontroller.get_distances()
+        stored = self._load_run('convex_hull', {})
+        if stored:
+            self._datacontroller.commit_change('path', stored[-1])
+            return
+        hull = tsputil.convex_hull_helper(
+            nodes, self._datacontroller.get_node_index())
         if hull:
-            result = construct_step(hull, 'Most Top Left Node', 'Clockwise', nodes, scale)
-            self._datacontroller.commit_change('path', result)
+            steps = StepLog(distances)
+            steps.describe('Most Top Left Node', 'Clockwise')
+            steps.add_tour(hull)
+            self._store_run('convex_hull', {}, steps)
+            self._datacontroller.commit_change('path', steps[-1])
 
-    def convex_hull_model(self, _start='random', _direction='random'):
+    def convex_hull_model(self, _start='random', _direction='random', seed=None):
         """------------------------------------------------------------------------
            ------------------------ Convex Hull Model -----------------------------
            ------------------------------------------------------------------------
            A model for the simulation of human solving strategies for TSP, designed
            by MacGregor et al.
            Description comments in the code are citations from the original paper:
+           Runs with a seed are deterministic and their results are stored.
         """
-        steps = [{'Tour': [], 'Tourlength': 0}]
         nodes = self._datacontroller.get_data('nodes')
-        scale = self._datacontroller.get_data('scale')
+        distances = self._datacontroller.get_distances()
+        steps = StepLog(distances)
+        params = {'start': _start, 'direction': _direction, 'seed': seed,
+                  'starts': [node.nid for node in nodes if node.start]}
+        if seed is not None and self._commit_stored_run('convex_hull_model', params):
+            return
+        rng = random.Random(seed) if seed is not None else random
 
         if nodes:
             # Step 1: Sketch the connections between adjacent boundary
             #        points of the convex hull.
             # hull is a list of ids, not nodes,the hull is always generated CW
-            hull = tsputil.convex_hull_helper(nodes)
+            hull = tsputil.convex_hull_helper(
+                nodes, self._datacontroller.get_node_index())
             # Step 2: Select a starting point and a direction (randomly).
             # start is an id not a node
-            startinfo = get_direction_and_start(nodes, _start, _direction)
+            startinfo = get_direction_and_start(nodes, _start, _direction, rng)
             start = startinfo[0]
             # if direction is ccw ,reverse hull
             if not startinfo[1] == 1:
                 hull.reverse()
+            # the engine scores insertions by their cost instead of
+            # evaluating every candidate tour
+            engine = InsertionEngine(distances, hull)
+            hull = engine.tour
 
-            steps.append(construct_step(hull, startinfo[2], startinfo[3], nodes, scale))
+            steps.describe(startinfo[2], startinfo[3])
+            steps.add_tour(hull)
 
             # Step 3: If the starting point is on the boundary,
             # the starting node is the current node. """
@@ -132,13 +378,14 @@ class SolverModule:
             else:
                 # If the starting point is not on the boundary, apply the
                 # insertion rule to find the closest arc on the boundary. """
-                closest_arc = find_closest_arc(start, hull, nodes)
+                closest_arc = engine.closest_arc(start)
                 # Connect the starting point to the end node of the closest
                 # arc which is in the direction of travel.
                 # This node becomes the current node."""
                 # insert startnode into hull
-                hull.insert(hull.index(closest_arc[0]) + 1, start)
-                steps.append(construct_step(hull, startinfo[2], startinfo[3], nodes, scale))
+                index = hull.index(closest_arc[0]) + 1
+                engine.insert(index, start)
+                steps.insert(index, start)
                 # update current arc nodes
                 current_node = start
                 adjacent_node = hull[hull.index(closest_arc[1])]
@@ -149,10 +396,10 @@ class SolverModule:
                 while True:
                     current_arc = (current_node, adjacent_node)
                     # find closest node not in the hull
-                    interior_node = find_closest_interior_node(current_arc, hull, nodes)
+                    interior_node = engine.closest_interior_node(current_arc)
                     # Apply the insertion criterion to check whether the
                     # closest node is closer to any other arc.
-                    is_closer = is_closer_to_other_arc(interior_node, current_arc, hull, nodes)
+                    is_closer = is_closer_to_other_arc(interior_node, current_arc, engine)
                     # If not, proceed to Step 5. If it is, move to the end node of
                     # the current arc. This becomes the current node. Repeat
                     # Step 4.
@@ -166,58 +413,560 @@ class SolverModule:
                 # current node and the newly inserted node becomes the current arc.
                 # Retaining the current node, return to Step 4 and repeat Steps 4 and
                 # 5 until a complete tour is obtained"""
-                hull.insert(hull.index(current_node) + 1, interior_node)
+                index = hull.index(current_node) + 1
+                engine.insert(index, interior_node)
+                steps.insert(index, interior_node)
                 adjacent_node = interior_node
-                steps.append(construct_step(hull, startinfo[2], startinfo[3], nodes, scale))
 
+            if seed is not None:
+                self._store_run('convex_hull_model', params, steps)
             self._datacontroller.commit_change('pathsteps', steps)
             self._datacontroller.commit_change('path', steps[-1])
 
-    def nearest_neighbor(self):
-        """ Constructs a tour by folowing the nearest neighbor heuristic"""
-        steps = [{'Tour': [], 'Tourlength': 0}]
-        tour = []
-        original_nodes = self._datacontroller.get_data('nodes')
-        nodes = copy.deepcopy(original_nodes)
-        scale = self._datacontroller.get_data('scale')
+    def nearest_neighbor(self, start='random', seed=None):
+        """ Constructs a tour by folowing the nearest neighbor heuristic.
+            Runs from a given start node id or with a seed are deterministic
+            and their results are stored."""
+        nodes = self._datacontroller.get_data('nodes')
+        distances = self._datacontroller.get_distances()
+        if not nodes:
+            return
+        params = {'start': start, 'seed': seed,
+                  'starts': [node.nid for node in nodes if node.start]}
+        deterministic = start != 'random' or seed is not None
+        if deterministic and self._commit_stored_run('nearest_neighbor', params):
+            return
+        rng = random.Random(seed) if seed is not None else random
 
         # Step 1: Get a tour start
         starts = [node for node in nodes if node.start]
         _start = 'Random from marked nodes'
-        if not len(starts):
+        if start != 'random':
+            starts = [nodes[start]]
+            _start = 'Node ' + str(start)
+        elif not len(starts):
             starts = nodes
             _start = 'Random from all nodes'
 
-        current = starts[randint(0, (len(starts) - 1))]
+        # the unvisited nodes are kept in a spatial index, so every step
+        # is a nearest neighbor query instead of a scan over all nodes.
+        # Mostly one of the candidate neighbors is still unvisited and the
+        # query is not needed. Other metrics than the euclidean one scan
+        # the distances of the current node with the visited nodes masked.
+        unvisited = tsputil.spatial_index(nodes)
+        euclidean = distances.metric().is_euclidean()
+        visited = np.zeros(len(nodes))
+        candidates = self._datacontroller.get_candidates()
+        current = starts[rng.randint(0, (len(starts) - 1))].nid
+        first = current
+        steps = StepLog(distances)
+        steps.describe(str(_start), 'random')
+        while True:
+            steps.append(current)
+            unvisited.remove(current)
+            visited[current] = np.inf
+            if not len(unvisited):
+                break
+            following = None
+            for other in candidates.k_nearest(current):
+                if other in unvisited:
+                    following = other
+                    break
+            if following is None and euclidean:
+                following = unvisited.nearest(*nodes[current].get_coords())
+            elif following is None:
+                following = int(np.argmin(distances.row(current) + visited))
+            current = following
+        steps.append(first)
+        if deterministic:
+            self._store_run('nearest_neighbor', params, steps)
+        self._datacontroller.commit_change('pathsteps', steps)
+        self._datacontroller.commit_change('path', steps[-1])
+
+    def double_tree(self):
+        """ Constructs a tour by shortcutting a depth first traversal of a
+            spanning tree of the candidate graph. Its length has no
+            guarantee, see SpanningTree."""
+        self._spanning_tree_tour('double_tree')
+
+    def christofides(self):
+        """ Constructs a tour by shortcutting an euler tour of a minimum
+            spanning tree joined with a greedy matching of its odd degree
+            nodes (Christofides heuristic)."""
+        self._spanning_tree_tour('christofides')
+
+    def _spanning_tree_tour(self, solver):
+        """ Private: runs a spanning tree heuristic from the first start
+            node and commits its tour. The results are stored."""
+        nodes = self._datacontroller.get_data('nodes')
+        if not nodes:
+            return
+        starts = [node.nid for node in nodes if node.start]
+        params = {'starts': starts}
+        if self._commit_stored_run(solver, params):
+            return
+        root = starts[0] if starts else 0
+        tree = SpanningTree(self._datacontroller.get_distances(),
+                            self._datacontroller.get_candidates())
+        steps = StepLog(self._datacontroller.get_distances())
+        steps.describe('Node ' + str(root), 'Unknown')
+        steps.add_tour(getattr(tree, solver)(root))
+        self._store_run(solver, params, steps)
+        self._datacontroller.commit_change('pathsteps', steps)
+        self._datacontroller.commit_change('path', steps[-1])
+
+    def clustered(self, processes=None):
+        """ Constructs a tour that visits the nodes of every color
+            contiguously (clustered TSP). The order of the clusters is
+            solved on the distances between them, the paths through the
+            clusters are solved independently on a process pool. In the GUI
+            the pool is driven by the background worker and reports its
+            progress as 'info'."""
+        nodes = self._datacontroller.get_data('nodes')
+        if len(nodes) < 3:
+            return
+        decomposition = ClusterDecomposition(
+            self._datacontroller.get_distances(),
+            self._datacontroller.get_candidates(), nodes)
+        subproblems = decomposition.connect(cluster_order(decomposition.gaps))
+        # the pool gets its own copy of the problem
+        problem = NodeStore(nodes)
+        scale = self._datacontroller.get_data('scale')
+        metric = self._datacontroller.get_data('metric')
+        if self._worker is None:
+            paths = run_cluster_paths(problem, scale, subproblems, processes,
+                                      metric=metric)
+            self._clustered_done((decomposition, paths))
+        else:
+            self._start_worker(
+                lambda context: (decomposition, run_cluster_paths(
+                    problem, scale, subproblems, processes, context, metric)),
+                on_progress=lambda message: self._datacontroller.commit_change(
+                    'info', "Clustered: " + message),
+                on_done=self._clustered_done)
+
+    def _clustered_done(self, result):
+        """ Private: commits the clustered tour. Every cluster path is
+            added as a step"""
+        self._datacontroller.commit_change('solverRunning', False)
+        (decomposition, paths) = result
+        if paths is None:
+            return
+        tour = decomposition.join(paths)
+        steps = StepLog(self._datacontroller.get_distances())
+        steps.describe('Node ' + str(tour[0]), 'Unknown')
+        visited = []
+        for path in paths:
+            visited.extend(path)
+            steps.add_tour(visited)
+        steps.add_tour(tour)
+        self._datacontroller.commit_change('pathsteps', steps)
+        self._datacontroller.commit_change('path', steps[-1])
+        self._datacontroller.commit_change(
+            'info', "Clustered tour through " + str(len(paths)) + " clusters")
+
+    def monte_carlo(self, solver, runs, seed=None, processes=None):
+        """ Runs a stochastic solver (convex_hull_model or nearest_neighbor)
+            with the given number of consecutive seeds on a process pool.
+            The best tour is committed together with a summary of the tour
+            lengths. The runs are started from a random base seed, unless a
+            seed is given. In the GUI the pool is driven by the background
+            worker and reports its progress as 'info'."""
+        nodes = self._datacontroller.get_data('nodes')
+        if not nodes or runs < 1:
+            return
+        if seed is None:
+            seed = random.randrange(MAX_SEED)
+        seeds = list(range(seed, seed + runs))
+        # the pool gets its own copy of the problem
+        problem = NodeStore(nodes)
+        scale = self._datacontroller.get_data('scale')
+        metric = self._datacontroller.get_data('metric')
+        if self._worker is None:
+            results = run_monte_carlo(problem, scale, solver, seeds, processes,
+                                      metric=metric)
+            self._monte_carlo_done((solver, results))
+        else:
+            self._start_worker(
+                lambda context: (solver, run_monte_carlo(
+                    problem, scale, solver, seeds, processes, context, metric)),
+                on_progress=lambda message: self._datacontroller.commit_change(
+                    'info', "Monte Carlo: " + message),
+                on_done=self._monte_carlo_done)
+
+    def _monte_carlo_done(self, result):
+        """ Private: commits the steps of the best Monte Carlo run and shows
+            the summary of all runs with the path"""
+        self._datacontroller.commit_change('solverRunning', False)
+        (solver, results) = result
+        if not results:
+            return
+        summary = summarize_runs(results)
+        # seeded runs are deterministic, the best one is repeated (or loaded
+        # from the store) to get its steps
+        getattr(self, solver)(seed=summary['Best seed'])
+        path = dict(self._datacontroller.get_data('path'))
+        path.update(summary)
+        self._datacontroller.commit_change('path', path)
+        self._datacontroller.commit_change(
+            'info', "Monte Carlo finished " + str(len(results)) + " runs")
+
+    def two_opt(self):
+        """ Improves the current path with 2-opt and Or-opt moves until
+            neither finds an improvement. Every improving pass is appended
+            as a step to the current pathsteps."""
+        path = self._datacontroller.get_data('path')
+        if not path or len(path['Tour']) < 6 or path['Tour'][0] != path['Tour'][-1]:
+            return
+        distances = self._datacontroller.get_distances()
+        # continue the steps that lead to the current path
+        pathsteps = self._datacontroller.get_data('pathsteps')
+        index = pathsteps.index(path) if isinstance(pathsteps, StepLog) else None
+        if index is not None:
+            steps = pathsteps.copy(index + 1)
+        else:
+            steps = StepLog(distances)
+            steps.describe(path.get('Start', 'Unknown'), path.get('Direction', 'Unknown'))
+            steps.add_tour(path['Tour'])
+        search = LocalSearch(distances, path['Tour'],
+                             candidates=self._datacontroller.get_candidates())
         while True:
-            tour.append(current.nid)
-            nodes.remove(current)
-            steps.append(construct_step(tour, str(_start), 'random', original_nodes, scale))
-            if not len(nodes):
+            improved = False
+            for (name, improve) in [('2-opt', search.two_opt),
+                                    ('Or-opt', search.or_opt)]:
+                if improve():
+                    improved = True
+                    steps.describe(path.get('Start', 'Unknown'),
+                                   path.get('Direction', 'Unknown'), name)
+                    steps.add_tour(search.tour())
+            if not improved:
                 break
-            current = nodes[tsputil.nearest_neighbor(nodes, current)[0]]
-        tour.append(tour[0])
-        steps.append(construct_step(tour, str(_start), 'random', original_nodes, scale))
         self._datacontroller.commit_change('pathsteps', steps)
         self._datacontroller.commit_change('path', steps[-1])
 
 
-def is_closer_to_other_arc(interior_node, arc, hull, nodes):
+def solve_concorde(nodes, scale, key=None, context=None, metric=None):
+    """ Runs concorde on the given nodes (or (x, y) tuples) with the given
+        metric and returns the optimal tour, or None if concorde is not
+        available on this system or the run was cancelled. Every run uses its own temporary
+        directory. If a key is given, the tour is stored in the solution
+        cache. If a task context is given, the output of concorde is
+        reported line by line and concorde is killed when the context is
+        cancelled."""
+    directory = os.path.dirname(os.path.realpath(__file__))
+
+    # Check operating system first
+    sysos = platform.system()
+    # and call the corresponding binary of concorde
+    if sysos == "Darwin":
+        binary = directory + "/../bin/concorde-osx"
+    elif sysos == "Linux":
+        binary = directory + "/../bin/concorde-fedora"
+    else:
+        return None  # this function is not supported under windows yet
+
+    workdir = tempfile.mkdtemp(prefix="tspedit-", dir=tsputil.temp_directory())
+    try:
+        nodes = [node if hasattr(node, 'x_coord') else Node(nid, node[0], node[1], None)
+                 for (nid, node) in enumerate(nodes)]
+        # generate temporary file containing the current problem
+        tspio.export_tsp(nodes, scale, "GENERATED TEMPORARY FILE",
+                         tsputil.FilenameWrapper(os.path.join(workdir, "problem.tsp")),
+                         metric)
+        # concorde writes its files into the working directory
+        process = subprocess.Popen([binary, "problem.tsp"], cwd=workdir,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT,
+                                   universal_newlines=True)
+        if context is not None:
+            context.attach_process(process)
+        for line in iter(process.stdout.readline, ''):
+            if context is not None and line.strip():
+                context.report(line.strip())
+        process.stdout.close()
+        process.wait()
+        if context is not None and context.cancelled():
+            return None
+        # open solution file and parse solution string
+        solution = tspio.parse_solution_file(os.path.join(workdir, "problem.sol"))
+    finally:
+        # delete all files generated by concorde
+        shutil.rmtree(workdir, ignore_errors=True)
+    # generate a list of ids from the character list in the solution file
+    tour = [int(char) for char in solution.split()]
+    # concorde doesn't include the start again as end, so it is added here
+    tour.append(tour[0])
+    if key is not None:
+        store_concorde_solution(key, tour)
+    return tour
+
+
+def solve_held_karp(matrix, context=None):
+    """ Returns an optimal tour through the nodes of the given distance
+        matrix, that starts and ends at node 0. The Held-Karp dynamic
+        program computes the shortest path from node 0 through every
+        subset of the other nodes to each of its members. The subsets are
+        bitmasks, all subsets of the same size are handled at once.
+        If a task context is given, None is returned as soon as it is
+        cancelled."""
+    size = len(matrix)
+    if size < 3:
+        return list(range(size)) + [0]
+    count = size - 1
+    full = 1 << count
+    # cost[mask, last]: shortest path from node 0 through the nodes of
+    # mask ending at last, the nodes 1..count are the bits 0..count-1
+    cost = np.full((full, count), np.inf)
+    parent = np.zeros((full, count), dtype=np.int8)
+    inner = matrix[1:, 1:]
+    singles = np.arange(count)
+    cost[1 << singles, singles] = matrix[0, 1:]
+    masks = np.arange(full)
+    bits = np.zeros(full, dtype=np.int8)
+    for bit in range(count):
+        bits += (masks >> bit) & 1
+    for members in range(2, count + 1):
+        if context is not None and context.cancelled():
+            return None
+        layer = masks[bits == members]
+        for last in range(count):
+            subsets = layer[(layer >> last) & 1 == 1]
+            candidates = cost[subsets ^ (1 << last)] + inner[:, last]
+            best = np.argmin(candidates, axis=1)
+            cost[subsets, last] = candidates[np.arange(len(subsets)), best]
+            parent[subsets, last] = best
+    # close the tour and follow the parents back to node 0
+    last = int(np.argmin(cost[full - 1] + matrix[1:, 0]))
+    tour = []
+    mask = full - 1
+    while mask:
+        tour.append(last + 1)
+        (mask, last) = (mask ^ (1 << last), int(parent[mask, last]))
+    return [0] + tour[::-1] + [0]
+
+
+def branch_and_bound_search(datacontroller):
+    """ Returns the branch and bound search of the problem of the given
+        datacontroller, starting from a Christofides tour improved by 2-opt
+        and Or-opt"""
+    distances = datacontroller.get_distances()
+    candidates = datacontroller.get_candidates()
+    search = LocalSearch(distances,
+                         SpanningTree(distances, candidates).christofides(),
+                         candidates=candidates)
+    while search.two_opt() or search.or_opt():
+        pass
+    return BranchAndBound(distances.matrix(), search.tour())
+
+
+def solve_branch_and_bound(nodes, scale, budget, context=None, metric=None):
+    """ Runs the branch and bound search on the given nodes for at most
+        budget seconds and returns it. The problem is set up on a data
+        controller of its own, so this can run on another thread. If a task
+        context is given, every better tour is reported and the search
+        stops when the context is cancelled."""
+    datacontroller = DataController()
+    datacontroller.commit_change('scale', scale)
+    _commit_metric(datacontroller, metric)
+    datacontroller.commit_change('nodes', nodes)
+    search = branch_and_bound_search(datacontroller)
+    search.solve(budget, context,
+                 on_improvement=context.report if context is not None else None)
+    return search
+
+
+def load_concorde_solution(key):
+    """ Returns the cached concorde tour of the problem with the given
+        instance hash or None"""
+    if key in _SOLUTIONS:
+        return list(_SOLUTIONS[key])
+    filename = os.path.join(tsputil.cache_directory("concorde"), key + ".sol")
+    try:
+        with open(filename, 'r') as _file:
+            tour = [int(nid) for nid in _file.read().split()]
+    except (IOError, OSError, ValueError):
+        return None
+    _SOLUTIONS[key] = tour
+    return list(tour)
+
+
+def store_concorde_solution(key, tour):
+    """ Stores a concorde tour under the instance hash of its problem"""
+    _SOLUTIONS[key] = list(tour)
+    directory = tsputil.cache_directory("concorde")
+    try:
+        # write to a temporary file first, so concurrent runs never see a
+        # partially written solution
+        (handle, tmpname) = tempfile.mkstemp(dir=directory)
+        with os.fdopen(handle, 'w') as _file:
+            _file.write(" ".join(str(nid) for nid in tour))
+        os.rename(tmpname, os.path.join(directory, key + ".sol"))
+    except (IOError, OSError):
+        pass
+
+
+def compute_lower_bound(nodes, scale, context=None, metric=None):
+    """ Returns the Held-Karp lower bound of the given nodes or None if the
+        context is cancelled. The problem is set up on a data controller of
+        its own, so this can run on another thread."""
+    datacontroller = DataController()
+    datacontroller.commit_change('scale', scale)
+    _commit_metric(datacontroller, metric)
+    datacontroller.commit_change('nodes', nodes)
+    return LowerBound(datacontroller.get_distances(),
+                      datacontroller.get_candidates()).compute(context=context)
+
+
+def run_monte_carlo(nodes, scale, solver, seeds, processes=None, context=None,
+                    metric=None):
+    """ Runs the solver once for every seed on a process pool and returns
+        the list of (seed, tourlength, tour) tuples ordered by seed. If a
+        task context is given, the progress is reported after every run and
+        None is returned when the context is cancelled."""
+    pool = multiprocessing.Pool(processes, initializer=_init_monte_carlo_worker,
+                                initargs=(nodes, scale, metric))
+    results = []
+    try:
+        for result in pool.imap_unordered(
+                _monte_carlo_run, [(solver, seed) for seed in seeds]):
+            results.append(result)
+            if context is not None:
+                if context.cancelled():
+                    return None
+                context.report(str(len(results)) + "/" + str(len(seeds)) + " runs")
+    finally:
+        pool.terminate()
+        pool.join()
+    return sorted(results)
+
+
+def cluster_order(gaps):
+    """ Returns the order of the clusters with the given distance matrix.
+        Up to HELD_KARP_LIMIT clusters the order is optimal, otherwise the
+        nearest unvisited cluster is visited next"""
+    if len(gaps) <= HELD_KARP_LIMIT:
+        return solve_held_karp(gaps)[:-1]
+    order = [0]
+    unvisited = set(range(1, len(gaps)))
+    while unvisited:
+        order.append(min(unvisited, key=lambda index: (gaps[order[-1], index], index)))
+        unvisited.remove(order[-1])
+    return order
+
+
+def run_cluster_paths(nodes, scale, subproblems, processes=None, context=None,
+                      metric=None):
+    """ Solves the (nids, entry, exit) path subproblems of a clustered tour
+        on a process pool and returns the paths in the order of the
+        subproblems. Every worker only gets the nodes of its cluster, the
+        largest clusters are started first. If a task context is given, the
+        progress is reported after every cluster and None is returned when
+        the context is cancelled."""
+    coords = tsputil.node_coords(nodes)
+    tasks = [(position, coords[nids].tolist(), nids.index(entry),
+              nids.index(exit_), scale,
+              _cluster_metric(metric, coords, scale, nids))
+             for (position, (nids, entry, exit_)) in enumerate(subproblems)]
+    tasks.sort(key=lambda task: -len(task[1]))
+    pool = multiprocessing.Pool(processes)
+    paths = [None] * len(subproblems)
+    try:
+        for (count, (position, path)) in enumerate(
+                pool.imap_unordered(_cluster_path_run, tasks)):
+            nids = subproblems[position][0]
+            paths[position] = [nids[local] for local in path]
+            if context is not None:
+                if context.cancelled():
+                    return None
+                context.report(str(count + 1) + "/" + str(len(tasks)) +
+                               " clusters")
+    finally:
+        pool.terminate()
+        pool.join()
+    return paths
+
+
+def _init_monte_carlo_worker(nodes, scale, metric):
+    """ Private: sets up the solver module of a worker process. The runs
+        are not stored, the best run is stored by the caller when it is
+        repeated"""
+    global _WORKER
+    datacontroller = DataController()
+    datacontroller.commit_change('scale', scale)
+    _commit_metric(datacontroller, metric)
+    datacontroller.commit_change('nodes', nodes)
+    _WORKER = (SolverModule(None, datacontroller, store=False), datacontroller)
+
+
+def _cluster_path_run(task):
+    """ Private: solves the path through a cluster in a worker process.
+        The cluster is set up as a problem of its own, its path is returned
+        by the positions of the nodes in the cluster"""
+    (position, coords, entry, exit_, scale, metric) = task
+    nodes = NodeStore()
+    for (x_value, y_value) in coords:
+        nodes.add(x_value, y_value, tsputil.COLORS[0])
+    datacontroller = DataController()
+    datacontroller.commit_change('scale', scale)
+    _commit_metric(datacontroller, metric)
+    datacontroller.commit_change('nodes', nodes)
+    return (position, cluster_path(datacontroller.get_distances(),
+                                   list(range(len(coords))), entry, exit_,
+                                   datacontroller.get_candidates()))
+
+
+def _commit_metric(datacontroller, metric):
+    """ Private: commits the metric of a copied problem, the default metric
+        is kept if there is none"""
+    if metric is not None:
+        datacontroller.commit_change('metric', metric)
+
+
+def _cluster_metric(metric, coords, scale, nids):
+    """ Private: the metric of the subproblem of a cluster. Explicit
+        weights are copied to a matrix of the cluster nodes"""
+    if metric is None or metric.edge_weight_type != 'EXPLICIT':
+        return metric
+    nids = np.asarray(nids)
+    weights = WeightMatrix(len(nids), 'FULL_MATRIX')
+    weights.fill(metric.lengths(coords, scale, nids[:, np.newaxis], nids).ravel())
+    return Metric('EXPLICIT', weights)
+
+
+def _monte_carlo_run(task):
+    """ Private: runs a solver with a seed in a worker process"""
+    (solver, seed) = task
+    (solver_module, datacontroller) = _WORKER
+    getattr(solver_module, solver)(seed=seed)
+    path = datacontroller.get_data('path')
+    return (seed, path['Tourlength'], path['Tour'])
+
+
+def summarize_runs(results):
+    """ Returns the summary of the (seed, tourlength, tour) tuples of
+        Monte Carlo runs. Ties of the best length go to the lower seed"""
+    lengths = np.array([length for (_, length, _) in results])
+    best = min(results, key=lambda result: (result[1], result[0]))
+    summary = {'Runs': len(results),
+               'Seeds': str(results[0][0]) + "-" + str(results[-1][0]),
+               'Best seed': best[0],
+               'Min': round(float(lengths.min()), 2),
+               'Mean': round(float(lengths.mean()), 2)}
+    for (percentile, value) in zip(PERCENTILES,
+                                   np.percentile(lengths, PERCENTILES)):
+        summary['P' + str(percentile)] = round(float(value), 2)
+    summary['Max'] = round(float(lengths.max()), 2)
+    return summary
+
+
+def is_closer_to_other_arc(interior_node, arc, engine):
     """ Returns true, if the given node forms a shorter path, when
         inserted into an other arc than the given one """
-    closest_arc = find_closest_arc(interior_node, hull, nodes)
+    closest_arc = engine.closest_arc(interior_node)
     return not ((closest_arc == arc) or (closest_arc[::-1] == arc))
 
 
-def construct_step(tour, start, direction, nodes, scale):
-    """ Constructs a step object from tour information"""
-    return {'Tour': copy.deepcopy(tour),
-            'Tourlength': tsputil.get_path_length(nodes, scale, tour),
-            'Start': start,
-            'Direction': direction}
-
-
-def get_direction_and_start(nodes, _start, _direction):
+def get_direction_and_start(nodes, _start, _direction, rng=random):
     """ Returns a startnode and a direction. If multiple starts are possible
     a random one will be returned. If a direction is predefined it will
     be retained, otherwise the direction will be random ccw or cw."""
@@ -227,46 +976,15 @@ def get_direction_and_start(nodes, _start, _direction):
         start_string = _start
     else:
         start_string = 'Random from marked nodes'
-    start = starts[randint(0, (len(starts) - 1))].nid
+    start = starts[rng.randint(0, (len(starts) - 1))].nid
     # directions: -1 = ccw, 1 = cw
-    if not _direction is 'random':
+    direction_string = "Clockwise"
+    if not _direction == 'random':
         direction = _direction
     else:
-        direction = randint(0, 1)
-        direction_string = "Clockwise"
+        direction = rng.randint(0, 1)
     if not direction == 1:
         direction_string = "Counter Clockwise"
         if _direction == 'random':
             direction_string += " (random)"
     return (start, direction, start_string, direction_string)
-
-
-def find_closest_arc(point, _hull, nodes):
-    """ Finds the arc to a point, so that when the point is included into
-        that arc, the resulting tour is shorter than any other tour
-        formed by inserting the point into an other arc"""
-    hull = copy.deepcopy(_hull)
-    lengths = [float("inf") for x in range(len(hull))]
-    # insert the point into every existing arc and remember
-    # the resulting tour length
-    for i in range(1, len(hull)):
-        hull.insert(i, point)
-        lengths[i] = (tsputil.get_path_length(nodes, 100, hull))
-        hull.pop(i)
-
-    ci_index = lengths.index(min(lengths))
-    an_index = (ci_index - 1) % len(hull)
-    return (hull[an_index], hull[ci_index])
-
-
-def find_closest_interior_node(arc, hull, nodes):
-    """ Returns the node that forms the shortest hull, when inserted
-        in the given arc of the given hull """
-    lengths = [float("inf") for x in range(len(nodes))]
-    for (j, node) in enumerate(nodes):
-        if not node.nid in hull:
-            i = hull.index(arc[1])
-            hull.insert(i, node.nid)
-            lengths[j] = (tsputil.get_path_length(nodes, 100, hull))
-            hull.pop(i)
-    return lengths.index(min(lengths))
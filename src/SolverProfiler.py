@@ -0,0 +1,237 @@
+"""
+    SolverProfiler.py
+    See class description
+"""
+import cProfile
+import logging
+import logging.handlers
+import os
+import pstats
+import re
+import threading
+import time
+import timeit
+import tracemalloc
+import tsputil
+from DistanceCache import DistanceCache
+
+# Environment variable with the comma separated list of the detailed
+# measurements of a run: 'memory' (peak of the traced memory), 'calls'
+# (counts of the hot calls), 'cprofile' (a profile dump per run) or 'all'.
+# The details slow the solvers down, tracing the memory by several times
+PROFILE_VARIABLE = "TSPEDIT_PROFILE"
+DETAILS = ['memory', 'calls', 'cprofile']
+# Hot functions whose calls are counted, as (owner, attribute) pairs
+COUNTED = [(DistanceCache, 'distance'), (DistanceCache, 'edge_lengths'),
+           (DistanceCache, 'path_length')]
+# Size of the profile log in bytes before it is rotated and the number of
+# rotated logs that are kept
+LOG_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+# Number of cProfile dumps that are kept
+MAX_DUMPS = 20
+# The logger of the profile log
+_LOGGER = None
+
+
+class SolverProfiler(object):
+
+    """ Measures solver runs. A run lasts from the call of the solver until
+        it has finished, which for solvers on the background worker is the
+        end of their done or error callback. The wall time and the CPU time
+        of the run are always measured. The CPU time is the time of the
+        whole process including its threads and finished child processes.
+        The peak of the memory traced by tracemalloc, the numbers of calls of
+        the hot functions in COUNTED and a cProfile dump (of the Tk thread
+        and the worker thread) are measured if they are enabled in the
+        environment variable TSPEDIT_PROFILE. Only the calls of the thread
+        that started the run and of the worker thread of its task are
+        counted, not those of other workers like the lower bound.
+        The measurements are shown as 'info' after the message the solver
+        left there and appended to a rotating log in the cache directory,
+        next to the dumps."""
+
+    def __init__(self, datacontroller, details=None):
+        self._datacontroller = datacontroller
+        if details is None:
+            details = os.environ.get(PROFILE_VARIABLE, "")
+        details = set(detail.strip() for detail in details.split(","))
+        if 'all' in details:
+            details = set(DETAILS)
+        self._details = details
+        self._run = None
+
+    def run(self, label, function):
+        """ Calls the solver function as a measured run with the given
+            label. The run ends when the function returns, unless it started
+            a task with a wrapped callback on the background worker"""
+        self.stop("replaced")
+        run = self._start(label)
+        try:
+            function()
+        finally:
+            if not run['background']:
+                self._stop(run, "done")
+
+    def wrap(self, task):
+        """ Returns the background task of the current run. The run
+            continues until a callback from finishing() was executed and
+            the calls of the worker thread are profiled and counted as
+            well"""
+        run = self._run
+        if run is None:
+            return task
+        run['background'] = True
+        if run['profiles'] is None and run['calls'] is None:
+            return task
+
+        def profiled_task(context):
+            """ Runs the task with a profiler of the worker thread and
+                counts its calls"""
+            run['threads'].add(threading.get_ident())
+            if run['profiles'] is None:
+                return task(context)
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(task, context)
+            finally:
+                run['profiles'].append(profile)
+        return profiled_task
+
+    def finishing(self, callback):
+        """ Returns a callback of the background task of the current run
+            that ends the run after it was executed"""
+        run = self._run
+
+        def finish(value):
+            """ Executes the callback and ends the run"""
+            try:
+                callback(value)
+            finally:
+                self._stop(run, "done")
+        return finish
+
+    def stop(self, status="cancelled"):
+        """ Ends the current run early with the given status"""
+        if self._run is not None:
+            self._stop(self._run, status)
+
+    def _start(self, label):
+        """ Private: starts the measurements of a run"""
+        run = {'label': label, 'background': False, 'calls': None,
+               'profiles': None, 'patched': [], 'tracing': False,
+               'threads': set([threading.get_ident()]),
+               'info': self._datacontroller.get_data('info'),
+               'nodes': len(self._datacontroller.get_data('nodes'))}
+        if 'calls' in self._details:
+            run['calls'] = dict((name, 0) for (_, name) in COUNTED)
+            for (owner, name) in COUNTED:
+                original = getattr(owner, name)
+                run['patched'].append((owner, name, original))
+                setattr(owner, name, _counting(original, run['calls'], name,
+                                               run['threads']))
+        if 'memory' in self._details:
+            run['tracing'] = not tracemalloc.is_tracing()
+            if run['tracing']:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+        if 'cprofile' in self._details:
+            profile = cProfile.Profile()
+            run['profiles'] = [profile]
+            profile.enable()
+        run['cpu'] = _cpu_time()
+        run['wall'] = timeit.default_timer()
+        self._run = run
+        return run
+
+    def _stop(self, run, status):
+        """ Private: ends the measurements of a run, unless it has ended
+            already, shows and logs them"""
+        if self._run is not run:
+            return
+        self._run = None
+        result = {'wall': timeit.default_timer() - run['wall'],
+                  'cpu': _cpu_time() - run['cpu']}
+        if run['profiles'] is not None:
+            run['profiles'][0].disable()
+        if 'memory' in self._details:
+            result['peak'] = tracemalloc.get_traced_memory()[1]
+            if run['tracing']:
+                tracemalloc.stop()
+        for (owner, name, original) in run['patched']:
+            setattr(owner, name, original)
+        summary = self._summary(run, result)
+        info = self._datacontroller.get_data('info')
+        if info and info != run['info']:
+            # the message of the solver is kept
+            info = str(info) + " (" + summary + ")"
+        else:
+            info = run['label'] + ": " + summary
+        self._datacontroller.commit_change('info', info)
+        message = "%s: %s, %d nodes, %s" % (status, run['label'], run['nodes'],
+                                            summary)
+        directory = tsputil.cache_directory("profiles")
+        if run['profiles'] is not None:
+            message += ", " + self._dump(run, directory)
+        _profile_logger(directory).info(message)
+
+    def _summary(self, run, result):
+        """ Private: the measurements of a run as text"""
+        parts = ["%.3f s wall" % result['wall'], "%.3f s CPU" % result['cpu']]
+        if 'peak' in result:
+            parts.append("peak %.1f MiB" % (result['peak'] / 1048576.0))
+        if run['calls'] is not None:
+            parts.extend("%d %s calls" % (run['calls'][name], name)
+                         for (_, name) in COUNTED)
+        return ", ".join(parts)
+
+    def _dump(self, run, directory):
+        """ Private: writes the combined profiles of a run to the given
+            directory, removes the oldest dumps and returns the file name"""
+        stats = pstats.Stats(run['profiles'][0])
+        for profile in run['profiles'][1:]:
+            stats.add(profile)
+        name = re.sub(r"[^A-Za-z0-9]+", "_", run['label']).strip("_")
+        filename = os.path.join(directory, "%s-%s.prof" % (
+            time.strftime("%Y%m%d-%H%M%S"), name or "run"))
+        stats.dump_stats(filename)
+        dumps = sorted(entry for entry in os.listdir(directory)
+                       if entry.endswith(".prof"))
+        for entry in dumps[:-MAX_DUMPS]:
+            os.remove(os.path.join(directory, entry))
+        return filename
+
+
+def _counting(function, calls, name, threads):
+    """ Private: wraps a function to count its calls from the given
+        threads"""
+    def counted(*args, **kwargs):
+        """ Counts the call and calls the function"""
+        if threading.get_ident() in threads:
+            calls[name] += 1
+        return function(*args, **kwargs)
+    return counted
+
+
+def _cpu_time():
+    """ Private: the CPU time of the process, its threads and its finished
+        child processes"""
+    times = os.times()
+    return time.process_time() + times[2] + times[3]
+
+
+def _profile_logger(directory):
+    """ Private: returns the logger of the rotating profile log"""
+    global _LOGGER
+    if _LOGGER is None:
+        _LOGGER = logging.getLogger("tspedit.profile")
+        _LOGGER.setLevel(logging.INFO)
+        # the runs are only written to the log, not to the console
+        _LOGGER.propagate = False
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(directory, "profile.log"), maxBytes=LOG_BYTES,
+            backupCount=LOG_BACKUPS)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        _LOGGER.addHandler(handler)
+    return _LOGGER
@@ -0,0 +1,226 @@
+"""
+    SpanningTree.py
+    See class description
+"""
+import numpy as np
+from SpatialIndex import KDTree
+
+# Number of nearest odd degree nodes every odd degree node is matched with
+# first
+NEIGHBORS = 10
+
+
+class SpanningTree(object):
+
+    """ A spanning tree of the nodes, usually minimal or close to it, and
+        the tour heuristics based on it. The tree is built with Kruskal's
+        algorithm on the edges of the CandidateGraph, which holds almost all
+        edges of the euclidean minimum spanning tree. Components the
+        candidate graph leaves unconnected are joined by the shortest edges
+        between them.
+        The double tree tour shortcuts a walk around the tree. The tree
+        isn't guaranteed to be minimal, and for explicit weights of nodes
+        placed on a grid it is far from it, so the 2 guarantee doesn't
+        hold, but the tour is usually well below it.
+        The Christofides tour matches the odd degree nodes of the tree
+        greedily instead of perfectly, so its 1.5 guarantee doesn't hold,
+        but it is usually much shorter than the double tree tour."""
+
+    def __init__(self, distances, candidates):
+        self._distances = distances
+        self._coords = distances.coords()
+        self.edges = self._kruskal(candidates.edges())
+
+    def length(self):
+        """ Returns the summed length of the tree edges"""
+        if not self.edges:
+            return 0
+        (starts, ends) = zip(*self.edges)
+        return float(self._distances.edge_lengths(list(starts),
+                                                  list(ends)).sum())
+
+    def double_tree(self, root=0):
+        """ Returns the closed tour that visits the nodes in the order of a
+            depth first search of the tree from the given root"""
+        adjacency = self._adjacency(self.edges)
+        tour = []
+        visited = set()
+        stack = [root]
+        while stack:
+            nid = stack.pop()
+            if nid in visited:
+                continue
+            visited.add(nid)
+            tour.append(nid)
+            # neighbors are visited in ascending order
+            stack.extend(sorted(adjacency[nid], reverse=True))
+        return tour + [root]
+
+    def christofides(self, root=0):
+        """ Returns the closed tour that shortcuts an euler tour of the tree
+            joined with a greedy matching of its odd degree nodes"""
+        adjacency = self._adjacency(self.edges + self._odd_matching())
+        tour = []
+        visited = set()
+        for nid in self._euler_tour(adjacency, root):
+            if nid not in visited:
+                visited.add(nid)
+                tour.append(nid)
+        return tour + [root]
+
+    def _kruskal(self, edges):
+        """ Private: the minimum spanning forest of the candidate edges,
+            completed to a tree by the shortest edges between components"""
+        lengths = self._distances.edge_lengths(edges[:, 0], edges[:, 1])
+        (positions, parents) = spanning_forest(len(self._coords), edges,
+                                               lengths)
+        tree = [tuple(edge) for edge in edges[positions].tolist()]
+        if len(tree) < len(self._coords) - 1:
+            for (start, end) in self._component_edges(parents):
+                if _union(parents, start, end):
+                    tree.append((start, end))
+        return tree
+
+    def _component_edges(self, parents):
+        """ Private: the shortest edge between every pair of components,
+            sorted by length. The points of the smaller component are
+            searched in a spatial index of the larger one, or in the
+            distances for other metrics than the euclidean one"""
+        euclidean = self._distances.metric().is_euclidean()
+        members = {}
+        for nid in range(len(self._coords)):
+            members.setdefault(_find(parents, nid), []).append(nid)
+        components = sorted(members.values(), key=len)
+        indices = [KDTree(self._coords[component]) for component in components]
+        edges = []
+        for (first, small) in enumerate(components):
+            for second in range(first + 1, len(components)):
+                large = components[second]
+                best = None
+                for nid in small:
+                    if euclidean:
+                        other = large[indices[second].nearest(
+                            *self._coords[nid])]
+                    else:
+                        other = large[self._distances.nearest(nid, large)[0]]
+                    length = self._distances.distance(nid, other)
+                    if best is None or length < best[0]:
+                        best = (length, nid, other)
+                edges.append(best)
+        return [(start, end) for (_, start, end) in sorted(edges)]
+
+    def _odd_matching(self):
+        """ Private: matches the nodes of odd degree in the tree greedily,
+            first along the edges to their nearest odd neighbors in order of
+            length, then every remaining node with its nearest remaining
+            one. Other metrics than the euclidean one are searched in the
+            distances instead of a spatial index"""
+        euclidean = self._distances.metric().is_euclidean()
+        degrees = np.zeros(len(self._coords), dtype=int)
+        for (start, end) in self.edges:
+            degrees[start] += 1
+            degrees[end] += 1
+        odd = np.flatnonzero(degrees % 2 == 1)
+        if not len(odd):
+            return []
+        coords = self._coords[odd]
+        index = KDTree(coords)
+        count = min(NEIGHBORS + 1, len(odd))
+        candidates = set()
+        for (local, (x_value, y_value)) in enumerate(coords.tolist()):
+            if euclidean:
+                nearest = index.k_nearest(x_value, y_value, count)
+            else:
+                nearest = self._distances.nearest(int(odd[local]), odd, count)
+            for other in nearest:
+                if other != local:
+                    candidates.add((min(local, other), max(local, other)))
+        candidates = np.array(sorted(candidates), dtype=int).reshape(-1, 2)
+        lengths = self._distances.edge_lengths(odd[candidates[:, 0]],
+                                               odd[candidates[:, 1]])
+        matching = []
+        # the matched nodes are masked when the distances are scanned
+        matched = np.zeros(len(odd))
+        for (first, second) in \
+                candidates[np.argsort(lengths, kind='mergesort')].tolist():
+            if first in index and second in index:
+                index.remove(first)
+                index.remove(second)
+                matched[[first, second]] = np.inf
+                matching.append((int(odd[first]), int(odd[second])))
+        for local in range(len(odd)):
+            if local in index:
+                index.remove(local)
+                matched[local] = np.inf
+                if euclidean:
+                    other = index.nearest(*coords[local])
+                else:
+                    other = int(np.argmin(
+                        self._distances.row(int(odd[local]))[odd] + matched))
+                index.remove(other)
+                matched[other] = np.inf
+                matching.append((int(odd[local]), int(odd[other])))
+        return matching
+
+    def _adjacency(self, edges):
+        """ Private: the neighbor lists of the (multi)graph of the edges"""
+        adjacency = [[] for _ in range(len(self._coords))]
+        for (start, end) in edges:
+            adjacency[start].append(end)
+            adjacency[end].append(start)
+        return adjacency
+
+    @staticmethod
+    def _euler_tour(adjacency, root):
+        """ Private: the node sequence of an euler tour through a connected
+            multigraph with even degrees (Hierholzer's algorithm)"""
+        remaining = [sorted(neighbors, reverse=True)
+                     for neighbors in adjacency]
+        stack = [root]
+        tour = []
+        while stack:
+            nid = stack[-1]
+            if remaining[nid]:
+                other = remaining[nid].pop()
+                # the edge is used, remove its other direction as well
+                remaining[other].remove(nid)
+                stack.append(other)
+            else:
+                tour.append(stack.pop())
+        return tour[::-1]
+
+
+def spanning_forest(size, edges, lengths, components=1):
+    """ Returns the positions of the edges of a minimum spanning forest of
+        the nodes 0 to size-1 in ascending order of length (Kruskal's
+        algorithm) and the parents of the union find structure of its
+        components. The search stops as soon as the forest has the given
+        number of components"""
+    parents = list(range(size))
+    (starts, ends) = (edges[:, 0].tolist(), edges[:, 1].tolist())
+    positions = []
+    for position in np.argsort(lengths, kind='mergesort').tolist():
+        if len(positions) >= size - components:
+            break
+        if _union(parents, starts[position], ends[position]):
+            positions.append(position)
+    return (np.array(positions, dtype=int), parents)
+
+
+def _find(parents, nid):
+    """ Private: returns the representative of the set of a node"""
+    while parents[nid] != nid:
+        parents[nid] = parents[parents[nid]]
+        nid = parents[nid]
+    return nid
+
+
+def _union(parents, first, second):
+    """ Private: joins the sets of two nodes. Returns false if they were
+        in the same set already"""
+    first = _find(parents, first)
+    second = _find(parents, second)
+    if first == second:
+        return False
+    parents[second] = first
+    return True
@@ -0,0 +1,126 @@
+"""
+    SpatialIndex.py
+    See class description
+"""
+import heapq
+import numpy as np
+
+# Maximum number of points in a leaf of the tree
+LEAF_SIZE = 8
+
+
+class KDTree(object):
+
+    """ A 2D tree over a fixed set of points that supports the deletion of
+        points. Every tree node stores the bounding box of its points and
+        the number of points that were not deleted yet, so empty subtrees
+        are skipped by all queries. Points are identified by their index
+        in the coordinate list the tree was built with. Ties in distance
+        are decided in favour of the lower index."""
+
+    def __init__(self, coords):
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        self._x = coords[:, 0].tolist()
+        self._y = coords[:, 1].tolist()
+        self._box = []
+        self._children = []
+        self._bucket = []
+        self._alive = []
+        self._parent = []
+        self._leaf_of = [0] * len(coords)
+        self._removed = [False] * len(coords)
+        if len(coords):
+            self._build(coords, np.arange(len(coords)), -1)
+
+    def __len__(self):
+        return self._alive[0] if self._alive else 0
+
+    def __contains__(self, index):
+        return not self._removed[index]
+
+    def remove(self, index):
+        """ Removes the point with the given index from the tree"""
+        if self._removed[index]:
+            return
+        self._removed[index] = True
+        leaf = self._leaf_of[index]
+        self._bucket[leaf].remove(index)
+        while leaf >= 0:
+            self._alive[leaf] -= 1
+            leaf = self._parent[leaf]
+
+    def nearest(self, x_value, y_value):
+        """ Returns the index of the remaining point closest to x,y or None
+            if the tree is empty"""
+        result = self.k_nearest(x_value, y_value, 1)
+        return result[0] if result else None
+
+    def k_nearest(self, x_value, y_value, k, region=None):
+        """ Returns the indices of the k remaining points closest to x,y
+            sorted by their distance. If a region (x_min, y_min, x_max, y_max)
+            is given, only points within it are considered"""
+        if not len(self) or k < 1:
+            return []
+        (r_x_min, r_y_min, r_x_max, r_y_max) = region or (
+            -float('inf'), -float('inf'), float('inf'), float('inf'))
+        # max heap of the best points found so far as (-d^2, -index)
+        best = []
+        queue = [(0.0, 0)]
+        (coords_x, coords_y, alive) = (self._x, self._y, self._alive)
+        while queue:
+            (bound, tree_node) = heapq.heappop(queue)
+            if len(best) == k and bound > -best[0][0]:
+                break
+            children = self._children[tree_node]
+            if children is None:
+                for index in self._bucket[tree_node]:
+                    if region is not None and not (
+                            r_x_min <= coords_x[index] <= r_x_max and
+                            r_y_min <= coords_y[index] <= r_y_max):
+                        continue
+                    delta_x = coords_x[index] - x_value
+                    delta_y = coords_y[index] - y_value
+                    entry = (-(delta_x * delta_x + delta_y * delta_y), -index)
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+            else:
+                for child in children:
+                    if alive[child]:
+                        (x_min, y_min, x_max, y_max) = self._box[child]
+                        if x_min > r_x_max or x_max < r_x_min or \
+                                y_min > r_y_max or y_max < r_y_min:
+                            continue
+                        delta_x = max(x_min - x_value, 0.0, x_value - x_max)
+                        delta_y = max(y_min - y_value, 0.0, y_value - y_max)
+                        heapq.heappush(queue, (delta_x * delta_x +
+                                               delta_y * delta_y, child))
+        return [-index for (_, index) in sorted(best, reverse=True)]
+
+    def _build(self, coords, indices, parent):
+        """ Private: builds the subtree for the given point indices and
+            returns the id of its root"""
+        tree_node = len(self._box)
+        points = coords[indices]
+        lower = points.min(axis=0)
+        upper = points.max(axis=0)
+        self._box.append((float(lower[0]), float(lower[1]),
+                          float(upper[0]), float(upper[1])))
+        self._children.append(None)
+        self._bucket.append(None)
+        self._alive.append(len(indices))
+        self._parent.append(parent)
+        if len(indices) <= LEAF_SIZE:
+            self._bucket[tree_node] = sorted(indices.tolist())
+            for index in self._bucket[tree_node]:
+                self._leaf_of[index] = tree_node
+        else:
+            # split at the median of the wider dimension
+            axis = int(np.argmax(upper - lower))
+            middle = len(indices) // 2
+            order = np.argpartition(points[:, axis], middle)
+            self._children[tree_node] = (
+                self._build(coords, indices[order[:middle]], tree_node),
+                self._build(coords, indices[order[middle:]], tree_node))
+        return tree_node
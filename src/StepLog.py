@@ -0,0 +1,221 @@
+"""
+    StepLog.py
+    See class description
+"""
+from collections import OrderedDict
+import numpy as np
+
+# Number of insertions between two checkpoints of the complete tour
+CHECKPOINT_INTERVAL = 32
+# Upper limit for the number of node ids held by all checkpoints. If it is
+# exceeded, every other checkpoint is dropped and the interval is doubled.
+CHECKPOINT_BUDGET = 4 * 1024 * 1024
+# Number of rebuilt steps that are kept, so a committed step is found again
+CACHE_SIZE = 8
+
+
+class StepLog(object):
+
+    """ The StepLog holds the steps of a solver run. Instead of a copy of
+        the tour, a step that inserts a single node only stores the position,
+        the node id and the tour length after the insertion, which is
+        updated by the length delta of the insertion.
+        Steps with a new tour (e.g. the convex hull or an improvement pass)
+        and periodic checkpoints hold complete tours. The tour of a step is
+        rebuilt from the closest preceding checkpoint when it is requested.
+        The log behaves like the list of step dictionaries it replaces, so
+        it can be committed as 'pathsteps'. The first step is always the
+        empty tour."""
+
+    def __init__(self, distances):
+        self._distances = distances
+        # per step: insert position and node id, -1 for steps with a tour
+        self._positions = [-1]
+        self._nids = [-1]
+        self._lengths = [0]
+        # per step: the shared dictionary of 'Start', 'Direction', ...
+        self._descriptions = [{}]
+        self._description = {}
+        # the tours of steps with a new tour, are never dropped
+        self._tours = {0: np.zeros(0, dtype=np.int32)}
+        self._checkpoints = {}
+        self._interval = CHECKPOINT_INTERVAL
+        self._since_checkpoint = 0
+        self._stored = 0
+        # the tour of the last step
+        self._tail = []
+        # the last rebuilt tour (index, tour) for stepping through the log
+        self._cursor = (0, [])
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("step index out of range")
+        if index in self._cache:
+            self._cache[index] = self._cache.pop(index)
+            return self._cache[index]
+        step = {'Tour': self.tour(index), 'Tourlength': self._lengths[index]}
+        step.update(self._descriptions[index])
+        self._cache[index] = step
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return step
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def describe(self, start, direction, improvement=None):
+        """ Sets the 'Start' and 'Direction' of the following steps"""
+        self._description = {'Start': start, 'Direction': direction}
+        if improvement is not None:
+            self._description['Improvement'] = improvement
+
+    def add_tour(self, tour):
+        """ Appends a step with a new tour"""
+        self._tail = list(tour)
+        self._positions.append(-1)
+        self._nids.append(-1)
+        self._lengths.append(self._distances.path_length(self._tail))
+        self._descriptions.append(self._description)
+        self._tours[len(self) - 1] = np.array(self._tail, dtype=np.int32)
+        self._since_checkpoint = 0
+
+    def insert(self, position, nid):
+        """ Appends a step that inserts the node with the given id into the
+            tour of the last step at the given position"""
+        tail = self._tail
+        dist = self._distances.distance
+        delta = 0
+        if position > 0:
+            delta += dist(tail[position - 1], nid)
+        if position < len(tail):
+            delta += dist(nid, tail[position])
+            if position > 0:
+                delta -= dist(tail[position - 1], tail[position])
+        tail.insert(position, nid)
+        self._positions.append(position)
+        self._nids.append(nid)
+        self._lengths.append(self._lengths[-1] + delta)
+        self._descriptions.append(self._description)
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self._interval:
+            self._add_checkpoint()
+
+    def append(self, nid):
+        """ Appends a step that adds the node with the given id to the end
+            of the tour of the last step"""
+        self.insert(len(self._tail), nid)
+
+    def tour(self, index):
+        """ Rebuilds the tour of the step with the given index"""
+        if index < 0:
+            index += len(self)
+        if index == len(self) - 1:
+            return list(self._tail)
+        (cursor, tour) = self._cursor
+        if not cursor <= index or self._base(index) > cursor:
+            base = self._base(index)
+            cursor = base
+            tour = (self._tours[base] if base in self._tours
+                    else self._checkpoints[base]).tolist()
+        for step in range(cursor + 1, index + 1):
+            tour.insert(self._positions[step], self._nids[step])
+        self._cursor = (index, tour)
+        return list(tour)
+
+    def index(self, step):
+        """ Returns the index of the last step equal to the given step or
+            None. Recently requested steps are found by identity"""
+        for (index, cached) in self._cache.items():
+            if cached is step:
+                return index
+        for index in range(len(self) - 1, -1, -1):
+            if self._lengths[index] == step.get('Tourlength') and \
+                    self.tour(index) == step.get('Tour'):
+                return index
+        return None
+
+    def copy(self, count=None):
+        """ Returns a log holding the first count steps of this log"""
+        if count is None:
+            count = len(self)
+        result = StepLog(self._distances)
+        result._positions = self._positions[:count]
+        result._nids = self._nids[:count]
+        result._lengths = self._lengths[:count]
+        result._descriptions = self._descriptions[:count]
+        result._description = self._descriptions[count - 1]
+        result._tours = dict((index, tour) for (index, tour) in
+                             self._tours.items() if index < count)
+        result._checkpoints = dict((index, tour) for (index, tour) in
+                                   self._checkpoints.items() if index < count)
+        result._interval = self._interval
+        result._stored = sum(len(tour) for tour in
+                             result._checkpoints.values())
+        result._since_checkpoint = count - 1 - result._base(count - 1)
+        result._tail = self.tour(count - 1)
+        return result
+
+    def state(self):
+        """ Returns the log as a json serializable dictionary"""
+        descriptions = []
+        described = []
+        for description in self._descriptions:
+            if not descriptions or descriptions[-1] is not description:
+                descriptions.append(description)
+            described.append(len(descriptions) - 1)
+        return {'positions': self._positions, 'nids': self._nids,
+                'lengths': self._lengths, 'descriptions': descriptions,
+                'described': described,
+                'tours': dict((str(index), tour.tolist()) for (index, tour)
+                              in self._tours.items())}
+
+    @staticmethod
+    def from_state(distances, state):
+        """ Creates a log from a dictionary returned by state()"""
+        result = StepLog(distances)
+        result._positions = state['positions']
+        result._nids = state['nids']
+        result._lengths = state['lengths']
+        result._descriptions = [state['descriptions'][index]
+                                for index in state['described']]
+        result._description = result._descriptions[-1]
+        result._tours = dict((int(index), np.array(tour, dtype=np.int32))
+                             for (index, tour) in state['tours'].items())
+        # rebuilding the last tour sets the checkpoints again
+        base = max(result._tours)
+        result._tail = result._tours[base].tolist()
+        for index in range(base + 1, len(result)):
+            result._tail.insert(result._positions[index], result._nids[index])
+            result._since_checkpoint += 1
+            if result._since_checkpoint >= result._interval:
+                result._add_checkpoint(index)
+        return result
+
+    def _base(self, index):
+        """ Private: the index of the last checkpoint or tour step at or
+            before the given index"""
+        base = index
+        while base not in self._tours and base not in self._checkpoints:
+            base -= 1
+        return base
+
+    def _add_checkpoint(self, index=None):
+        """ Private: stores the tour of the last step as a checkpoint and
+            thins out the checkpoints if they exceed the budget"""
+        if index is None:
+            index = len(self) - 1
+        self._checkpoints[index] = np.array(self._tail, dtype=np.int32)
+        self._stored += len(self._tail)
+        self._since_checkpoint = 0
+        while self._stored > CHECKPOINT_BUDGET and self._checkpoints:
+            self._interval *= 2
+            for (number, checkpoint) in enumerate(sorted(self._checkpoints)):
+                if number % 2 == 0:
+                    self._stored -= len(self._checkpoints.pop(checkpoint))
@@ -0,0 +1,112 @@
+"""
+    TourStore.py
+    See class description
+"""
+import contextlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+import tsputil
+
+# Upper limit for the summed size of all stored tours in bytes
+MAX_BYTES = 64 * 1024 * 1024
+
+
+class TourStore(object):
+
+    """ A persistent store for the results of deterministic solver runs.
+        Entries are identified by the instance hash of the problem, the name
+        of the solver and its parameters and hold the zlib compressed
+        pathsteps of the run. The store is a SQLite database, so it can be
+        shared by several processes. Whenever the stored entries exceed the
+        size limit, the least recently used entries are evicted."""
+
+    def __init__(self, filename=None, max_bytes=MAX_BYTES):
+        if filename is None:
+            filename = os.path.join(tsputil.cache_directory("tours"),
+                                    "tours.sqlite")
+        self._filename = filename
+        self._max_bytes = max_bytes
+        try:
+            with self._transaction() as connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS tours ("
+                    "key TEXT PRIMARY KEY, steps BLOB, size INTEGER, "
+                    "accessed REAL)")
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS tours_accessed "
+                    "ON tours (accessed)")
+        except sqlite3.Error:
+            # without a usable database every lookup misses
+            self._filename = None
+
+    def get(self, instance, solver, params):
+        """ Returns the stored pathsteps of a run or None"""
+        if self._filename is None:
+            return None
+        key = make_key(instance, solver, params)
+        try:
+            with self._transaction() as connection:
+                row = connection.execute(
+                    "SELECT steps FROM tours WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                connection.execute(
+                    "UPDATE tours SET accessed = ? WHERE key = ?",
+                    (time.time(), key))
+        except sqlite3.Error:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, instance, solver, params, steps):
+        """ Stores the pathsteps of a run and evicts the least recently used
+            entries if the store grew too large"""
+        if self._filename is None:
+            return
+        key = make_key(instance, solver, params)
+        data = zlib.compress(json.dumps(steps).encode('utf-8'))
+        if len(data) > self._max_bytes:
+            return
+        try:
+            with self._transaction() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO tours VALUES (?, ?, ?, ?)",
+                    (key, sqlite3.Binary(data), len(data), time.time()))
+                self._evict(connection)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, connection):
+        """ Private: deletes the least recently used entries until the
+            summed size is below the limit"""
+        total = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM tours").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        rows = connection.execute(
+            "SELECT key, size FROM tours ORDER BY accessed").fetchall()
+        for (key, size) in rows:
+            if total <= self._max_bytes:
+                break
+            connection.execute("DELETE FROM tours WHERE key = ?", (key,))
+            total -= size
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """ Private: opens a connection to the database and commits the
+            statements executed on it. Connections are not kept, so the
+            store can be used from every thread"""
+        connection = sqlite3.connect(self._filename, timeout=10)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+def make_key(instance, solver, params):
+    """ Combines the instance hash, the solver name and the parameters of a
+        run into the key of its entry"""
+    return instance + "/" + solver + "/" + json.dumps(params, sort_keys=True)
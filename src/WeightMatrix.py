@@ -0,0 +1,173 @@
+"""
+    WeightMatrix.py
+    See class description
+"""
+import tempfile
+import numpy as np
+import tsputil
+
+# The EDGE_WEIGHT_FORMATs as functions of the row i and the dimension n that
+# return the (lowest, highest) column of the values listed for the row. The
+# column formats list the values of the transposed matrix in row order,
+# which are the values of the row format of the other triangle
+FORMATS = {
+    'FULL_MATRIX': lambda i, n: (0, n - 1),
+    'UPPER_ROW': lambda i, n: (i + 1, n - 1),
+    'LOWER_ROW': lambda i, n: (0, i - 1),
+    'UPPER_DIAG_ROW': lambda i, n: (i, n - 1),
+    'LOWER_DIAG_ROW': lambda i, n: (0, i)}
+FORMATS['UPPER_COL'] = FORMATS['LOWER_ROW']
+FORMATS['LOWER_COL'] = FORMATS['UPPER_ROW']
+FORMATS['UPPER_DIAG_COL'] = FORMATS['LOWER_DIAG_ROW']
+FORMATS['LOWER_DIAG_COL'] = FORMATS['UPPER_DIAG_ROW']
+# Number of rows that are copied at once when a node is removed
+FILL_ROWS = 256
+
+
+class WeightMatrix(object):
+
+    """ The WeightMatrix holds the explicit edge weights of a symmetric
+        problem. Only the weights below the diagonal are kept, packed row
+        by row into a buffer that is memory mapped from an anonymous
+        temporary file, so large matrices are paged in on demand instead of
+        being held in memory. The weights are stored as 32 bit integers
+        until a value doesn't fit, then the buffer is converted to floats.
+        The matrix is filled in the order of the values of an
+        EDGE_WEIGHT_SECTION, values on the diagonal are dropped. A matrix
+        created with a packed lower triangle as returned by packed() is
+        complete and uses it as its buffer, which may be memory mapped."""
+
+    def __init__(self, dimension, edge_weight_format='FULL_MATRIX',
+                 packed=None):
+        if edge_weight_format not in FORMATS:
+            raise ValueError("unsupported edge weight format: " +
+                             str(edge_weight_format))
+        self._dimension = dimension
+        columns = [FORMATS[edge_weight_format](row, dimension)
+                   for row in range(dimension)]
+        # the number of values of every row in the section and the position
+        # of the first value of every row
+        self._first = np.array([low for (low, _) in columns], dtype=np.int64)
+        self._counts = np.array([max(high - low + 1, 0)
+                                 for (low, high) in columns], dtype=np.int64)
+        self._starts = np.concatenate(([0], np.cumsum(self._counts)[:-1])) \
+            if dimension else np.zeros(0, dtype=np.int64)
+        self._filled = 0
+        self._file = None
+        if packed is None:
+            self._weights = self._buffer(np.int32)
+        else:
+            self._weights = packed
+            self._filled = self.expected()
+
+    def __len__(self):
+        return self._dimension
+
+    def __reduce__(self):
+        # the matrix is sent to other processes as the complete lower
+        # triangle, which is stored again in a buffer of the receiver
+        return (_restore, (self._dimension, np.asarray(self._weights)))
+
+    def expected(self):
+        """ Returns the number of values of the EDGE_WEIGHT_SECTION"""
+        return int(self._counts.sum())
+
+    def complete(self):
+        """ Returns true if all values of the section were filled in"""
+        return self._filled >= self.expected()
+
+    def fill(self, values):
+        """ Stores the next values of the EDGE_WEIGHT_SECTION in the order
+            of the format of the matrix. Surplus values are ignored"""
+        values = np.asarray(values, dtype=float)
+        values = values[:self.expected() - self._filled]
+        positions = self._filled + np.arange(len(values))
+        self._filled += len(values)
+        rows = np.searchsorted(self._starts, positions, side='right') - 1
+        columns = self._first[rows] + positions - self._starts[rows]
+        below = rows != columns
+        (rows, columns, values) = (rows[below], columns[below], values[below])
+        if self._weights.dtype != np.float64 and len(values) and \
+                (np.any(values != np.round(values)) or
+                 np.abs(values).max() > np.iinfo(np.int32).max):
+            self._weights = self._buffer(np.float64, self._weights)
+        self._weights[_packed(np.maximum(rows, columns),
+                              np.minimum(rows, columns))] = values
+
+    def weight(self, start, end):
+        """ Returns the weight of the edge between the nodes with the given
+            ids"""
+        if start == end:
+            return 0.0
+        if start < end:
+            (start, end) = (end, start)
+        return float(self._weights[start * (start - 1) // 2 + end])
+
+    def weights(self, starts, ends):
+        """ Returns the weights of the edges between the broadcast arrays of
+            node ids starts and ends as a float array"""
+        (starts, ends) = np.broadcast_arrays(
+            np.asarray(starts, dtype=np.int64),
+            np.asarray(ends, dtype=np.int64))
+        result = np.zeros(starts.shape)
+        off = starts != ends
+        result[off] = self._weights[_packed(
+            np.maximum(starts[off], ends[off]),
+            np.minimum(starts[off], ends[off]))]
+        return result
+
+    def packed(self):
+        """ Returns the buffer of the packed lower triangle"""
+        return self._weights
+
+    def row(self, nid):
+        """ Returns the weights of the node with the given id to the nodes
+            with smaller ids"""
+        return np.asarray(self._weights[_packed(nid, 0):_packed(nid, nid)],
+                          dtype=float)
+
+    def without(self, nid):
+        """ Returns a new complete matrix without the row and the column of
+            the node with the given id, the following nodes move up by one
+            like the rows of a NodeStore"""
+        result = WeightMatrix(self._dimension - 1, 'LOWER_ROW')
+        rows = []
+        for row in range(self._dimension):
+            if row == nid:
+                continue
+            values = self.row(row)
+            rows.append(np.delete(values, nid) if nid < row else values)
+            if len(rows) >= FILL_ROWS:
+                result.fill(np.concatenate(rows))
+                rows = []
+        if rows:
+            result.fill(np.concatenate(rows))
+        return result
+
+    def _buffer(self, dtype, values=None):
+        """ Private: returns a new memory mapped buffer of the given type for
+            the packed lower triangle, that holds the given values"""
+        size = max(self._dimension * (self._dimension - 1) // 2, 1)
+        handle = tempfile.TemporaryFile(dir=tsputil.temp_directory())
+        handle.truncate(size * np.dtype(dtype).itemsize)
+        weights = np.memmap(handle, dtype=dtype, mode='r+', shape=(size,))
+        if values is not None:
+            weights[:] = values
+        if self._file is not None:
+            self._file.close()
+        # the temporary file is deleted when it is closed
+        self._file = handle
+        return weights
+
+
+def _packed(rows, columns):
+    """ Private: the positions of the entries below the diagonal in the
+        packed lower triangle"""
+    return rows * (rows - 1) // 2 + columns
+
+
+def _restore(dimension, weights):
+    """ Private: rebuilds a pickled weight matrix"""
+    matrix = WeightMatrix(dimension, 'LOWER_ROW')
+    matrix.fill(weights)
+    return matrix
@@ -0,0 +1,169 @@
+#!/usr/local/bin/python3
+"""
+    Headless batch solver for the tspedit program.
+    Runs the algorithms of the SolverModule on many .tsp files in a process
+    pool and streams one result row per instance and solver as CSV or JSONL.
+
+    Example:
+        python batch.py problems/ "more/*.tsp" -s nearest_neighbor+two_opt \\
+            -s convex_hull_model --seed 1 -o results.csv
+"""
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import tspio
+from DataController import DataController
+from SolverModule import SolverModule
+
+# Solver methods that can be selected, a '+' chains them (e.g. to improve
+# the tour of a construction heuristic)
+SOLVERS = ['convex_hull', 'convex_hull_model', 'nearest_neighbor',
+           'concorde', 'two_opt']
+# Solvers that accept a seed
+SEEDED = ['convex_hull_model', 'nearest_neighbor']
+# Columns of a result row
+FIELDS = ['instance', 'solver', 'seed', 'nodes', 'tour_length', 'runtime',
+          'error']
+
+
+def find_instances(patterns):
+    """ Expands directories and glob patterns into a sorted list of .tsp
+        files. Directories are searched for plain and compressed files"""
+    result = set()
+    for pattern in patterns:
+        expanded = [pattern]
+        if os.path.isdir(pattern):
+            expanded = [os.path.join(pattern, "*.tsp" + suffix) for suffix
+                        in [''] + sorted(tspio.COMPRESSIONS)]
+        for name in expanded:
+            result.update(path for path in glob.glob(name)
+                          if os.path.isfile(path))
+    return sorted(result)
+
+
+def solve(task):
+    """ Loads an instance and runs a solver chain on it. Executed in the
+        worker processes, errors are returned as part of the result row"""
+    (filename, solver, seed, scale) = task
+    row = {'instance': filename, 'solver': solver, 'seed': seed,
+           'nodes': None, 'tour_length': None, 'runtime': None,
+           'error': None}
+    try:
+        datacontroller = DataController()
+        # every run is solved, the runtime never measures a stored result
+        solver_module = SolverModule(None, datacontroller, store=False)
+        data = tspio.load_tsp(filename, scale)
+        nodes = data['nodes']
+        datacontroller.commit_change('scale', data['scale'])
+        datacontroller.commit_change('metric', data['metric'])
+        datacontroller.commit_change('nodes', nodes)
+        row['nodes'] = len(nodes)
+        start = time.time()
+        for name in solver.split('+'):
+            if name in SEEDED and seed is not None:
+                getattr(solver_module, name)(seed=seed)
+            else:
+                getattr(solver_module, name)()
+        row['runtime'] = time.time() - start
+        row['tour_length'] = datacontroller.get_data('path').get('Tourlength')
+    except Exception as error:  # pylint: disable=broad-except
+        row['error'] = repr(error)
+    return row
+
+
+class ResultWriter(object):
+
+    """ Writes result rows to a stream as CSV or JSONL and flushes after
+        every row, so results can be watched while the batch runs"""
+
+    def __init__(self, stream, output_format):
+        self._stream = stream
+        self._writer = None
+        if output_format == 'csv':
+            self._writer = csv.DictWriter(stream, fieldnames=FIELDS)
+            self._writer.writeheader()
+
+    def write(self, row):
+        """ Writes a single row"""
+        if self._writer is not None:
+            self._writer.writerow(row)
+        else:
+            self._stream.write(json.dumps(row) + "\n")
+        self._stream.flush()
+
+
+def parse_arguments(argv):
+    """ Parses the command line"""
+    parser = argparse.ArgumentParser(
+        description="Runs tspedit solvers on .tsp files without the GUI.")
+    parser.add_argument('instances', nargs='+',
+                        help=".tsp files, directories or glob patterns")
+    parser.add_argument('-s', '--solver', action='append', dest='solvers',
+                        help="solver to run, chain solvers with '+' "
+                        "(default: all construction heuristics). "
+                        "Available: " + ", ".join(SOLVERS))
+    parser.add_argument('--seed', type=int, action='append', dest='seeds',
+                        help="seed for the randomized solvers, may be given "
+                        "several times")
+    parser.add_argument('--scale', type=int, default=100,
+                        help="scale of the grid coordinates (default: 100)")
+    parser.add_argument('-p', '--processes', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument('-o', '--output', default='-',
+                        help="output file, '-' writes to stdout (default)")
+    parser.add_argument('-f', '--format', choices=['csv', 'jsonl'],
+                        help="output format (default: by the extension of "
+                        "the output file, jsonl for stdout)")
+    arguments = parser.parse_args(argv)
+    if not arguments.solvers:
+        arguments.solvers = ['convex_hull', 'convex_hull_model',
+                             'nearest_neighbor']
+    for solver in arguments.solvers:
+        for name in solver.split('+'):
+            if name not in SOLVERS:
+                parser.error("unknown solver: " + name)
+    if arguments.format is None:
+        arguments.format = 'csv' if arguments.output.endswith('.csv') \
+            else 'jsonl'
+    return arguments
+
+
+def main(argv=None):
+    """ Runs the batch and returns the exit code"""
+    arguments = parse_arguments(argv)
+    instances = find_instances(arguments.instances)
+    if not instances:
+        sys.stderr.write("No .tsp files found\n")
+        return 1
+    tasks = [(filename, solver, seed, arguments.scale)
+             for filename in instances
+             for solver in arguments.solvers
+             for seed in (arguments.seeds or [None])]
+
+    if arguments.output == '-':
+        stream = sys.stdout
+    else:
+        stream = open(arguments.output, 'w')
+    try:
+        writer = ResultWriter(stream, arguments.format)
+        pool = multiprocessing.Pool(max(1, arguments.processes))
+        try:
+            for row in pool.imap_unordered(solve, tasks):
+                writer.write(row)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,421 @@
+#!/usr/local/bin/python3
+"""
+    Benchmark suite for the tspedit program.
+    Generates seeded uniform and clustered problems of growing size, times
+    the solvers of the SolverModule and the helpers of tsputil and tspio on
+    them without the GUI and writes a JSON report with the run times, the
+    peak memory and the fitted scaling exponents. Log-log plots of the
+    scaling curves are drawn if matplotlib is installed.
+
+    Example:
+        python benchmark.py -b nearest_neighbor -b two_opt \\
+            --sizes 100 1000 10000 -o report.json --plot plots/
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from collections import OrderedDict
+import numpy as np
+import tspio
+import tsputil
+from DataController import DataController
+from NodeStore import NodeStore
+from SolverModule import SolverModule
+
+# Timed methods of the SolverModule with the solvers that run untimed
+# before them (e.g. to build the tour that is improved), their keyword
+# arguments and the largest problem they are timed on (None for no limit)
+SOLVERS = OrderedDict([
+    ('convex_hull', ([], {}, None)),
+    ('convex_hull_model', ([], {}, None)),
+    ('nearest_neighbor', ([], {}, None)),
+    ('double_tree', ([], {}, None)),
+    ('christofides', ([], {}, None)),
+    ('clustered', ([], {'processes': 1}, None)),
+    ('two_opt', (['nearest_neighbor'], {}, None)),
+    ('lower_bound', ([], {}, None)),
+    ('monte_carlo', ([], {'solver': 'nearest_neighbor', 'runs': 4,
+                          'processes': 1}, None)),
+    ('concorde', ([], {}, 2000)),
+    ('branch_and_bound', ([], {'budget': 10}, 200)),
+])
+# Solvers that accept a seed, they get the seed of the problem
+SEEDED = ['convex_hull_model', 'nearest_neighbor', 'monte_carlo']
+# Timed helper functions of tsputil and tspio
+HELPERS = ['get_path_length', 'convex_hull_helper', 'tsputil.nearest_neighbor',
+           'export_tsp', 'parse_tsp_file', 'load_tsp']
+BENCHMARKS = list(SOLVERS) + HELPERS
+# Kinds of generated problems
+KINDS = ['uniform', 'clustered']
+# Default problem sizes
+SIZES = [10, 100, 1000, 10000, 100000]
+# Side length of the grid per square root of the number of nodes
+GRID_DENSITY = 4
+# Scale of the grid coordinates
+SCALE = 100
+# Seconds after which a run is stopped. Larger problems are not timed
+# with a benchmark that ran out of time
+TIMEOUT = 300
+
+
+def generate_instance(kind, size, seed):
+    """ Returns the nodes of a seeded problem on a grid. The nodes of a
+        uniform problem are spread evenly, the nodes of a clustered problem
+        are normally distributed around random centers and colored by their
+        cluster. No two nodes share a grid point"""
+    rng = np.random.RandomState(seed)
+    side = GRID_DENSITY * int(math.ceil(math.sqrt(size)))
+    if kind == 'uniform':
+        cells = rng.choice(side * side, size, replace=False)
+        coords = np.column_stack((cells % side, cells // side))
+        labels = np.zeros(size, dtype=int)
+    else:
+        count = min(len(tsputil.COLORS), max(2, int(round(size ** (1 / 3.0)))))
+        centers = rng.uniform(0.1 * side, 0.9 * side, (count, 2))
+        spread = side / (4.0 * count)
+        (coords, labels, taken) = ([], [], set())
+        while len(coords) < size:
+            label = int(rng.randint(count))
+            point = np.clip(np.round(rng.normal(centers[label], spread)),
+                            0, side - 1).astype(int)
+            cell = (int(point[0]), int(point[1]))
+            if cell not in taken:
+                taken.add(cell)
+                coords.append(cell)
+                labels.append(label)
+        (coords, labels) = (np.array(coords), np.array(labels))
+    nodes = NodeStore()
+    for ((x_coord, y_coord), label) in zip(coords.tolist(), labels.tolist()):
+        nodes.add(x_coord, y_coord, tsputil.COLORS[label])
+    return nodes
+
+
+def run_benchmark(name, kind, size, seed, trace=False):
+    """ Runs a benchmark once on a generated problem and returns its
+        run time in seconds, the peak of the memory allocated by Python
+        and NumPy while it ran if trace is set, and the tour length of a
+        solver. Allocations of external programs and of the processes of
+        a pool are not traced"""
+    nodes = generate_instance(kind, size, seed)
+    datacontroller = DataController()
+    datacontroller.commit_change('scale', SCALE)
+    datacontroller.commit_change('nodes', nodes)
+    directory = tempfile.mkdtemp(prefix="tspedit-benchmark-")
+    try:
+        if name in SOLVERS:
+            function = _prepare_solver(name, datacontroller, seed)
+        else:
+            function = _prepare_helper(name, datacontroller, directory)
+        if trace:
+            tracemalloc.start()
+        start = timeit.default_timer()
+        function()
+        seconds = timeit.default_timer() - start
+        peak = None
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    length = None
+    if name in SOLVERS:
+        length = datacontroller.get_data('path').get('Tourlength')
+    return {'seconds': seconds, 'peak_memory': peak, 'tour_length': length}
+
+
+def _prepare_solver(name, datacontroller, seed):
+    """ Private: runs the prerequisites of a solver and returns its timed
+        call"""
+    (before, arguments, _) = SOLVERS[name]
+    solver_module = SolverModule(None, datacontroller)
+    for solver in before:
+        if solver in SEEDED:
+            getattr(solver_module, solver)(seed=seed)
+        else:
+            getattr(solver_module, solver)()
+    arguments = dict(arguments)
+    if name in SEEDED:
+        arguments['seed'] = seed
+    method = getattr(solver_module, name)
+    return lambda: method(**arguments)
+
+
+def _prepare_helper(name, datacontroller, directory):
+    """ Private: returns the timed call of a helper function. The files of
+        the tspio helpers are written to the given directory"""
+    nodes = datacontroller.get_data('nodes')
+    filename = os.path.join(directory, "problem.tsp")
+    if name == 'get_path_length':
+        path = list(range(len(nodes))) + [0]
+        return lambda: tsputil.get_path_length(nodes, SCALE, path)
+    if name == 'convex_hull_helper':
+        return lambda: tsputil.convex_hull_helper(nodes)
+    if name == 'tsputil.nearest_neighbor':
+        # the helper searches lists of nodes
+        others = list(nodes)
+        return lambda: tsputil.nearest_neighbor(others, others[0])
+    target = tsputil.FilenameWrapper(filename)
+    if name == 'export_tsp':
+        return lambda: tspio.export_tsp(nodes, SCALE, None, target)
+    tspio.export_tsp(nodes, SCALE, None, target)
+    if name == 'parse_tsp_file':
+        return lambda: tspio.parse_tsp_file(filename)
+    return lambda: tspio.load_tsp(filename, SCALE)
+
+
+def _measure(task, connection):
+    """ Private: runs a benchmark in a process of its own and sends the
+        result or the error. Every process has its own cache directory, so
+        no run reuses the stored results of another one"""
+    directory = tempfile.mkdtemp(prefix="tspedit-cache-")
+    os.environ['XDG_CACHE_HOME'] = directory
+    try:
+        connection.send(run_benchmark(*task))
+    except Exception as error:  # pylint: disable=broad-except
+        connection.send({'error': repr(error)})
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        connection.close()
+
+
+def measure(name, kind, size, seed, trace=False, timeout=TIMEOUT):
+    """ Runs a benchmark in a new process, so the caches and the memory of
+        a run don't influence the others, and returns its result. A run is
+        stopped after timeout seconds. The processes are not daemonic, so
+        the solvers can start pools of their own"""
+    (receiver, sender) = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=_measure,
+                                      args=((name, kind, size, seed, trace),
+                                            sender))
+    process.start()
+    sender.close()
+    result = {'error': "timeout after " + str(timeout) + " seconds"}
+    if receiver.poll(timeout):
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = None
+    if process.is_alive():
+        process.terminate()
+    process.join()
+    receiver.close()
+    if result is None:
+        # the process died without a result
+        result = {'error': "process exited with code " + str(process.exitcode)}
+    return result
+
+
+def scaling_exponent(sizes, values):
+    """ Returns the slope of the least squares line through the points in
+        log-log space, the exponent k of a growth like n^k, or None if
+        there are less than two points"""
+    points = [(size, value) for (size, value) in zip(sizes, values)
+              if value is not None and value > 0]
+    if len(set(size for (size, _) in points)) < 2:
+        return None
+    logs = np.log(np.array(points, dtype=float))
+    return float(np.polyfit(logs[:, 0], logs[:, 1], 1)[0])
+
+
+def run_suite(benchmarks, kinds, sizes, seed, repeats, timeout=TIMEOUT,
+              log=None):
+    """ Runs the benchmarks on the problems of all kinds and sizes and
+        returns the result rows. Every run is repeated, the peak memory is
+        measured in an additional run, since tracing slows down the code.
+        A benchmark is not run on larger problems after it failed"""
+    rows = []
+    for name in benchmarks:
+        limit = SOLVERS[name][2] if name in SOLVERS else None
+        for kind in kinds:
+            failed = False
+            for size in sorted(sizes):
+                if failed or (limit is not None and size > limit):
+                    continue
+                row = OrderedDict([('benchmark', name), ('kind', kind),
+                                   ('nodes', size), ('seed', seed)])
+                times = []
+                for _ in range(repeats):
+                    result = measure(name, kind, size, seed, timeout=timeout)
+                    if 'error' in result:
+                        break
+                    times.append(result['seconds'])
+                row['times'] = times
+                row['best'] = min(times) if times else None
+                row['median'] = float(np.median(times)) if times else None
+                row['tour_length'] = result.get('tour_length')
+                row['error'] = result.get('error')
+                row['peak_memory'] = None
+                if row['error'] is None:
+                    # a traced run that fails or runs out of time leaves
+                    # the peak memory unknown
+                    traced = measure(name, kind, size, seed, True, timeout)
+                    row['peak_memory'] = traced.get('peak_memory')
+                failed = row['error'] is not None
+                rows.append(row)
+                if log is not None:
+                    log(row)
+    return rows
+
+
+def build_report(rows, arguments):
+    """ Returns the report of the result rows together with the setup and
+        the scaling exponents of the run time and the peak memory of every
+        benchmark and kind of problem"""
+    scaling = OrderedDict()
+    for name in OrderedDict.fromkeys(row['benchmark'] for row in rows):
+        scaling[name] = OrderedDict()
+        for kind in OrderedDict.fromkeys(row['kind'] for row in rows):
+            selected = [row for row in rows if row['benchmark'] == name and
+                        row['kind'] == kind and row['error'] is None]
+            sizes = [row['nodes'] for row in selected]
+            scaling[name][kind] = OrderedDict([
+                ('time', scaling_exponent(
+                    sizes, [row['median'] for row in selected])),
+                ('memory', scaling_exponent(
+                    sizes, [row['peak_memory'] for row in selected]))])
+    return OrderedDict([
+        ('created', time.strftime("%Y-%m-%dT%H:%M:%S")),
+        ('python', platform.python_version()),
+        ('numpy', np.__version__),
+        ('platform', platform.platform()),
+        ('processors', multiprocessing.cpu_count()),
+        ('seed', arguments.seed),
+        ('repeats', arguments.repeats),
+        ('timeout', arguments.timeout),
+        ('results', rows),
+        ('scaling', scaling)])
+
+
+def plot_report(report, directory):
+    """ Draws the log-log curves of the run times and the peak memory of
+        every kind of problem into PNG files in the given directory.
+        Returns the written files, nothing is drawn if matplotlib is not
+        installed"""
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        sys.stderr.write("matplotlib is not installed, no plots are drawn\n")
+        return []
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    rows = [row for row in report['results'] if row['error'] is None]
+    files = []
+    for kind in OrderedDict.fromkeys(row['kind'] for row in rows):
+        (figure, axes) = plt.subplots(1, 2, figsize=(14, 6))
+        names = OrderedDict.fromkeys(row['benchmark'] for row in rows)
+        for (index, name) in enumerate(names):
+            selected = [row for row in rows
+                        if row['benchmark'] == name and row['kind'] == kind]
+            if not selected:
+                continue
+            sizes = [row['nodes'] for row in selected]
+            # the colors repeat after ten lines, the line styles tell
+            # them apart
+            style = {'marker': 'o', 'label': name,
+                     'linestyle': ['-', '--', ':'][index // 10 % 3]}
+            axes[0].plot(sizes, [row['median'] for row in selected], **style)
+            axes[1].plot(sizes, [row['peak_memory'] for row in selected],
+                         **style)
+        for (axis, label) in zip(axes, ["run time [s]",
+                                        "peak memory [bytes]"]):
+            axis.set_xscale('log')
+            axis.set_yscale('log')
+            axis.set_xlabel("nodes")
+            axis.set_ylabel(label)
+            axis.grid(True, which='both', alpha=0.3)
+        axes[1].legend(fontsize='small', loc='upper left',
+                       bbox_to_anchor=(1.02, 1))
+        figure.suptitle(kind + " problems")
+        filename = os.path.join(directory, "scaling-" + kind + ".png")
+        figure.savefig(filename, dpi=100, bbox_inches='tight')
+        plt.close(figure)
+        files.append(filename)
+    return files
+
+
+def log_row(row):
+    """ Writes the progress line of a result row to stderr"""
+    if row['error'] is not None:
+        result = "failed: " + row['error']
+    else:
+        result = "%.4fs" % row['median']
+        if row['peak_memory'] is not None:
+            result += ", peak %.1f MiB" % (row['peak_memory'] / 1048576.0)
+    sys.stderr.write("%s %s n=%d: %s\n" % (row['benchmark'], row['kind'],
+                                           row['nodes'], result))
+    sys.stderr.flush()
+
+
+def parse_arguments(argv):
+    """ Parses the command line"""
+    parser = argparse.ArgumentParser(
+        description="Times tspedit solvers and helpers on generated problems.")
+    parser.add_argument('-b', '--benchmark', action='append',
+                        dest='benchmarks',
+                        help="benchmark to run, may be given several times "
+                        "(default: all). Available: " + ", ".join(BENCHMARKS))
+    parser.add_argument('-k', '--kind', action='append', dest='kinds',
+                        choices=KINDS,
+                        help="kind of the generated problems (default: all)")
+    parser.add_argument('-n', '--sizes', type=int, nargs='+', default=SIZES,
+                        help="numbers of nodes of the problems (default: " +
+                        " ".join(str(size) for size in SIZES) + ")")
+    parser.add_argument('--seed', type=int, default=1,
+                        help="seed of the problems and the randomized "
+                        "solvers (default: 1)")
+    parser.add_argument('-r', '--repeats', type=int, default=3,
+                        help="timed runs per benchmark and problem "
+                        "(default: 3)")
+    parser.add_argument('-t', '--timeout', type=float, default=TIMEOUT,
+                        help="seconds after which a run is stopped "
+                        "(default: " + str(TIMEOUT) + ")")
+    parser.add_argument('-o', '--output', default='-',
+                        help="JSON report file, '-' writes to stdout "
+                        "(default)")
+    parser.add_argument('--plot', metavar='DIRECTORY',
+                        help="draw log-log scaling plots into the directory "
+                        "(requires matplotlib)")
+    arguments = parser.parse_args(argv)
+    if not arguments.benchmarks:
+        arguments.benchmarks = BENCHMARKS
+    for name in arguments.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark: " + name)
+    if not arguments.kinds:
+        arguments.kinds = KINDS
+    if arguments.repeats < 1 or min(arguments.sizes) < 1:
+        parser.error("repeats and sizes have to be positive")
+    return arguments
+
+
+def main(argv=None):
+    """ Runs the benchmarks and returns the exit code"""
+    arguments = parse_arguments(argv)
+    rows = run_suite(arguments.benchmarks, arguments.kinds, arguments.sizes,
+                     arguments.seed, arguments.repeats, arguments.timeout,
+                     log_row)
+    report = build_report(rows, arguments)
+    if arguments.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(arguments.output, 'w') as stream:
+            json.dump(report, stream, indent=2)
+    if arguments.plot:
+        plot_report(report, arguments.plot)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+    The tspbinary module reads and writes problems in the binary .tspb
+    format. A .tspb file starts with a short JSON header that describes the
+    problem and the arrays following it. Every array is stored raw and
+    aligned, so loading a file maps it into memory and hands out views on
+    the mapping instead of parsing and copying the data.
+    Besides the problem a file may hold the current path and its steps."""
+import json
+import os
+import struct
+import tempfile
+import numpy as np
+from Metric import Metric
+from NodeStore import NodeStore
+from WeightMatrix import WeightMatrix
+
+# First bytes of every .tspb file
+MAGIC = b"TSPB"
+# Version of the format, files of other versions are not read
+VERSION = 1
+# The magic, the version and the length of the JSON header
+PREFIX = struct.Struct("<4sIQ")
+# The header and every array start at a multiple of this number of bytes
+ALIGNMENT = 64
+# Extension of the binary files
+EXTENSION = ".tspb"
+
+
+def save_tspb(filename, nodes, scale, metric=None, name=None, comment="",
+              path=None, pathsteps=None, source=None):
+    """ Writes the nodes, the scale and the metric of a problem to a .tspb
+        file, together with the path and the pathsteps (a StepLog) if they
+        are given. The source describes the text file a cached problem was
+        loaded from. The file is written to a temporary file first, so
+        readers never see a partially written file."""
+    if metric is None:
+        metric = Metric()
+    if not isinstance(nodes, NodeStore):
+        nodes = NodeStore(nodes)
+    (coords, colors, starts, palette) = nodes.arrays()
+    header = {'name': name or os.path.basename(filename),
+              'comment': comment, 'scale': scale,
+              'edge_weight_type': metric.edge_weight_type,
+              'palette': palette, 'source': source}
+    arrays = [('coords', coords), ('colors', colors), ('starts', starts)]
+    if metric.weights is not None:
+        header['dimension'] = len(metric.weights)
+        arrays.append(('weights', metric.weights.packed()))
+    if path and 'Tour' in path:
+        header['path'] = dict((key, value) for (key, value) in path.items()
+                              if key != 'Tour')
+        arrays.append(('tour', np.asarray(path['Tour'], dtype=np.int64)))
+    if pathsteps is not None and hasattr(pathsteps, 'state'):
+        (steps, step_arrays) = _steps_arrays(pathsteps.state())
+        header['steps'] = steps
+        arrays.extend(step_arrays)
+    header['arrays'] = {}
+    offset = 0
+    for (key, array) in arrays:
+        header['arrays'][key] = {'dtype': array.dtype.str,
+                                 'shape': list(array.shape), 'offset': offset}
+        offset += _aligned(array.nbytes)
+    text = json.dumps(header, default=_json_value).encode('utf-8')
+    directory = os.path.dirname(os.path.abspath(filename))
+    (handle, tmpname) = tempfile.mkstemp(dir=directory, suffix=EXTENSION)
+    try:
+        with os.fdopen(handle, 'wb') as _file:
+            _file.write(PREFIX.pack(MAGIC, VERSION, len(text)))
+            _file.write(text)
+            _pad(_file)
+            for (_, array) in arrays:
+                _file.write(np.ascontiguousarray(array).tobytes())
+                _pad(_file)
+        os.rename(tmpname, filename)
+    except (IOError, OSError):
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+
+def read_header(filename):
+    """ Returns the JSON header of a .tspb file and the position of its
+        first array, raises ValueError if the file isn't a .tspb file of
+        this version"""
+    with open(filename, 'rb') as _file:
+        prefix = _file.read(PREFIX.size)
+        if len(prefix) < PREFIX.size:
+            raise ValueError("not a .tspb file: " + filename)
+        (magic, version, length) = PREFIX.unpack(prefix)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a .tspb file of version " + str(VERSION) +
+                             ": " + filename)
+        header = json.loads(_file.read(length).decode('utf-8'))
+    return (header, _aligned(PREFIX.size + length))
+
+
+def load_tspb(filename):
+    """ Loads a .tspb file and returns its data like tspio.load_tsp: the
+        name, comment, start nodes, groups, nodes, scale and metric, and the
+        'path' and the 'pathsteps' state if the file holds them. The nodes
+        and the explicit weights use the memory mapped arrays of the file,
+        copy on write, so the file itself is never changed."""
+    (header, start) = read_header(filename)
+    mapping = np.memmap(filename, dtype=np.uint8, mode='c')
+    arrays = dict((key, _view(mapping, start, spec))
+                  for (key, spec) in header['arrays'].items())
+    nodes = NodeStore.from_arrays(arrays['coords'], arrays['colors'],
+                                  arrays['starts'], header['palette'])
+    weights = None
+    if 'weights' in arrays:
+        weights = WeightMatrix(header['dimension'], 'LOWER_ROW',
+                               arrays['weights'])
+    result = {'name': header['name'], 'comment': header['comment'],
+              'startnodes': np.flatnonzero(arrays['starts']).tolist(),
+              'groups': _groups(arrays['colors'], len(header['palette'])),
+              'nodes': nodes, 'scale': header['scale'],
+              'metric': Metric(header['edge_weight_type'], weights),
+              'source': header['source'], 'path': None, 'pathsteps': None}
+    if 'tour' in arrays:
+        result['path'] = dict(header['path'])
+        result['path']['Tour'] = arrays['tour'].tolist()
+    if 'steps' in header:
+        result['pathsteps'] = _steps_state(header['steps'], arrays)
+    return result
+
+
+def source_of(filename, scale):
+    """ Returns the description of a text file a problem is cached for:
+        its name, size and modification time and the scale it is loaded
+        with"""
+    stat = os.stat(filename)
+    return {'name': os.path.basename(filename), 'size': stat.st_size,
+            'mtime': stat.st_mtime, 'scale': scale}
+
+
+def sidecar_name(filename):
+    """ Returns the name of the .tspb cache next to the given text file. The
+        extension of the text file is kept, so the cache never replaces a
+        .tspb file saved by the user"""
+    return filename + EXTENSION
+
+
+def fresh_sidecar(filename, scale):
+    """ Returns the name of the .tspb cache next to the given text file if
+        it is newer than the text file and was cached from its current
+        version with the given scale, otherwise None"""
+    sidecar = sidecar_name(filename)
+    try:
+        if os.path.getmtime(sidecar) < os.path.getmtime(filename):
+            return None
+        (header, _) = read_header(sidecar)
+        if header.get('source') != source_of(filename, scale):
+            return None
+    except (IOError, OSError, ValueError):
+        return None
+    return sidecar
+
+
+def store_sidecar(filename, scale, data):
+    """ Caches the problem data loaded from the given text file with the
+        given scale in a .tspb file next to it. Nothing is written if the
+        directory isn't writable or a file that isn't a cache is in the
+        way. Returns true if the cache was written"""
+    sidecar = sidecar_name(filename)
+    try:
+        if os.path.exists(sidecar) and \
+                read_header(sidecar)[0].get('source') is None:
+            return False
+        save_tspb(sidecar, data['nodes'], data['scale'], data['metric'],
+                  data['name'], data['comment'],
+                  source=source_of(filename, scale))
+    except (IOError, OSError, ValueError):
+        return False
+    return True
+
+
+def _json_value(value):
+    """ Private: converts NumPy scalars in the header to Python values"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("not serializable: " + repr(value))
+
+
+def _aligned(size):
+    """ Private: rounds a size up to a multiple of the alignment"""
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def _pad(_file):
+    """ Private: pads a file to the next multiple of the alignment"""
+    _file.write(b"\0" * (_aligned(_file.tell()) - _file.tell()))
+
+
+def _view(mapping, start, spec):
+    """ Private: the array described by spec as a view on the mapping"""
+    dtype = np.dtype(spec['dtype'])
+    first = start + spec['offset']
+    count = int(np.prod(spec['shape'], dtype=np.int64))
+    return mapping[first:first + count * dtype.itemsize].view(dtype) \
+        .reshape(spec['shape'])
+
+
+def _groups(colors, count):
+    """ Private: the 1-based node ids of every color like the CLUSTERS of a
+        .tsp file, empty if there is a single color"""
+    if count <= 1:
+        return []
+    return [(np.flatnonzero(colors == index) + 1).tolist()
+            for index in range(count) if np.any(colors == index)]
+
+
+def _steps_arrays(state):
+    """ Private: splits the state of a StepLog into the JSON part and
+        arrays"""
+    tours = sorted((int(index), tour)
+                   for (index, tour) in state['tours'].items())
+    offsets = np.cumsum([0] + [len(tour) for (_, tour) in tours])
+    flat = [nid for (_, tour) in tours for nid in tour]
+    arrays = [('step_positions', np.array(state['positions'], dtype=np.int64)),
+              ('step_nids', np.array(state['nids'], dtype=np.int64)),
+              ('step_lengths', np.array(state['lengths'], dtype=np.float64)),
+              ('step_described', np.array(state['described'], dtype=np.int64)),
+              ('step_tour_indices', np.array([index for (index, _) in tours],
+                                             dtype=np.int64)),
+              ('step_tour_offsets', offsets.astype(np.int64)),
+              ('step_tours', np.array(flat, dtype=np.int32))]
+    return ({'descriptions': state['descriptions']}, arrays)
+
+
+def _steps_state(steps, arrays):
+    """ Private: joins the parts of a StepLog state written by
+        _steps_arrays"""
+    offsets = arrays['step_tour_offsets'].tolist()
+    step_tours = arrays['step_tours']
+    tours = dict((str(index),
+                  step_tours[offsets[number]:offsets[number + 1]].tolist())
+                 for (number, index) in
+                 enumerate(arrays['step_tour_indices'].tolist()))
+    return {'positions': arrays['step_positions'].tolist(),
+            'nids': arrays['step_nids'].tolist(),
+            'lengths': arrays['step_lengths'].tolist(),
+            'descriptions': steps['descriptions'],
+            'described': arrays['step_described'].tolist(),
+            'tours': tours}
@@ -5,66 +5,284 @@
     from data structures."""
 import re
 import ast
+import bz2
+import gzip
+import lzma
+import mmap
 import os
+import numpy as np
 import tsputil
-from Node import Node
-try:
-    # for Python2
-    from tkFileDialog import asksaveasfile, askopenfile
-except ImportError:
-    # for Python3
-    from tkinter.filedialog import asksaveasfile, askopenfile
-
-
-def parse_tsp_file(file):
-    """ Parses data from a tspfile with regexes and returns a tuple
-    holding the nodes and groupinformation"""
-    # define regular expressions for the fields to parse
-    regexes = {'name': re.compile("NAME : (.*)"),
-               'comment': re.compile("COMMENT : (?!STARTNODE :|STARTNODES : |CLUSTERS :)(.*)"),
-               'single_start': re.compile("COMMENT : STARTNODE : ([0-9])+"),
-               'multi_start': re.compile("COMMENT : STARTNODES : (.*)"),
-               'nodes':
-               re.compile(
-                   r"([0-9]+)\ *([0-9]*\.?[0-9]*)\ *([0-9]*\.?[0-9]*)",
-                   re.MULTILINE),
-               'groups': re.compile("COMMENT : CLUSTERS : (.*)")}
-    # initialize results
+import tspbinary
+from Metric import Metric
+from NodeStore import NodeStore
+from WeightMatrix import WeightMatrix
+
+# Regular expressions of the header fields, in the order they are applied
+HEADER_FIELDS = [
+    ('name', re.compile("NAME : (.*)")),
+    ('comment', re.compile(
+        "COMMENT : (?!STARTNODE :|STARTNODES : |CLUSTERS :)(.*)")),
+    ('single_start', re.compile("COMMENT : STARTNODE : ([0-9])+")),
+    ('multi_start', re.compile("COMMENT : STARTNODES : (.*)")),
+    ('groups', re.compile("COMMENT : CLUSTERS : (.*)")),
+    ('dimension', re.compile(r"DIMENSION\s*:\s*([0-9]+)")),
+    ('edge_weight_type', re.compile(r"EDGE_WEIGHT_TYPE\s*:\s*(\w+)")),
+    ('edge_weight_format', re.compile(r"EDGE_WEIGHT_FORMAT\s*:\s*(\w+)"))]
+# A line that starts with a keyword ends the node section
+SECTION_END = re.compile(br"^[ \t]*[A-Za-z]", re.MULTILINE)
+# True for the bytes that separate the values of a line, as in bytes.split
+WHITESPACE = np.zeros(256, dtype=bool)
+WHITESPACE[list(b" \t\n\r\x0b\x0c")] = True
+# Number of bytes of the node section that are converted at once
+BLOCK_SIZE = 4 * 1024 * 1024
+# Modules that open compressed files, by the extension of the file
+COMPRESSIONS = {'.gz': gzip, '.bz2': bz2, '.xz': lzma}
+# File types of the dialogs of .tsp files, plain and compressed
+TSP_FILETYPES = [("TSP files", "*.tsp *.tsp.bz2 *.tsp.gz *.tsp.xz"),
+                 ("All files", "*")]
+# File types of the dialogs of .tour files
+TOUR_FILETYPES = [("Tour files", "*.tour *.tour.bz2 *.tour.gz *.tour.xz"),
+                  ("All files", "*")]
+
+
+def asksaveasfile(**options):
+    """ Shows a save-file-dialog. Tk is imported on first use, so the
+        module can be used without a display"""
+    try:
+        # for Python2
+        from tkFileDialog import asksaveasfile as dialog
+    except ImportError:
+        # for Python3
+        from tkinter.filedialog import asksaveasfile as dialog
+    return dialog(**options)
+
+
+def askopenfile(**options):
+    """ Shows an open-file-dialog. Tk is imported on first use, so the
+        module can be used without a display"""
+    try:
+        # for Python2
+        from tkFileDialog import askopenfile as dialog
+    except ImportError:
+        # for Python3
+        from tkinter.filedialog import askopenfile as dialog
+    return dialog(**options)
+
+
+def open_file(filename, mode='r'):
+    """ Opens a file like open(). Files ending with .gz, .bz2 or .xz are
+        opened through the module of their compression, which compresses
+        and decompresses the data while it is written and read"""
+    module = COMPRESSIONS.get(os.path.splitext(filename)[1].lower())
+    if module is None:
+        return open(filename, mode)
+    if 'b' not in mode:
+        mode += 't'
+    return module.open(filename, mode)
+
+
+def is_compressed(filename):
+    """ Returns true if the file is opened with a compression"""
+    return os.path.splitext(filename)[1].lower() in COMPRESSIONS
+
+
+def parse_tsp_file(file, use_mmap=False):
+    """ Parses a .tsp file and returns a dict holding its name, comment,
+        start nodes, groups, edge weights and the nodes as [x, y] lists of
+        the truncated coordinates ('nodes') and of the exact coordinates
+        ('coords'). See read_tsp_file"""
+    result = read_tsp_file(file, use_mmap)
+    result['nodes'] = result['nodes'].tolist()
+    result['coords'] = result['coords'].tolist()
+    return result
+
+
+def read_tsp_file(file, use_mmap=False):
+    """ Parses a .tsp file in a single pass like parse_tsp_file, but
+        returns the nodes as a (n, 2) integer array and the exact
+        coordinates as a (n, 2) float array.
+        The file is streamed section by section: every line outside the
+        data sections is matched against the header fields, the
+        NODE_COORD_SECTION (or the DISPLAY_DATA_SECTION of a problem without
+        one) and the EDGE_WEIGHT_SECTION are read in blocks that are split
+        and converted to floats at once. The edge weights are stored in a
+        WeightMatrix ('weights') of the EDGE_WEIGHT_FORMAT. The first tour
+        of a TOUR_SECTION is returned as an array of 0-based node ids
+        ('tour'), None if there is none. Lines of other data sections are
+        ignored and the file ends at EOF. If use_mmap is
+        set a plain file is memory mapped instead of read, compressed files
+        (see open_file) are decompressed while they are streamed."""
     result = {'name': 'No Name', 'comment': '', 'startnodes': [],
-              'nodes': [], 'groups': []}
-    # Define application rules
-
-    def apply_match(regex_name, match):
-        """Applies a specific processing rule for each regex sperately as the
-        fields vary in data types and structures"""
-        if regex_name is 'name':
-            result['name'] = match.group(1)
-        elif regex_name is 'single_start':
-            result['startnodes'] = [int(match.group(1))]
-        elif regex_name is 'multi_start':
-            result['startnodes'] = ast.literal_eval(match.group(1))
-        elif regex_name is 'groups':
-            result['groups'] = ast.literal_eval(
-                match.group(1).replace(" ", ""))
-        elif regex_name is 'comment':
-            result['comment'] += match.group(1) + "\n"
-        elif regex_name is 'nodes':
-            result['nodes'].append([int(float(match.group(2))),
-                                    int(float(match.group(3)))])
-    # Process the lines in the file and check for matches for each regular
-    # expression
-    _file = open(file, 'r')
-    lines = _file.readlines()
-    for line in lines:
-        if len(line):
-            for regex_name in regexes:
-                match = re.match(regexes[regex_name], line)
-                if match:
-                    apply_match(regex_name, match)
-    _file.close()
+              'nodes': [], 'groups': [], 'dimension': None,
+              'edge_weight_type': 'EUC_2D',
+              'edge_weight_format': 'FULL_MATRIX', 'weights': None,
+              'tour': None}
+    blocks = []
+    display = []
+    tours = []
+    with open_file(file, 'rb') as _file:
+        mapping = None
+        if use_mmap and not is_compressed(file) and os.path.getsize(file):
+            mapping = mmap.mmap(_file.fileno(), 0, access=mmap.ACCESS_READ)
+        stream = _Stream(mapping if mapping is not None else _file)
+        try:
+            while True:
+                line = stream.readline()
+                if not line:
+                    break
+                line = line.decode('utf-8', 'replace').rstrip('\r\n')
+                keyword = line.strip().rstrip(' :')
+                if keyword == 'EOF':
+                    break
+                elif keyword == 'NODE_COORD_SECTION':
+                    _read_section(stream, lambda block: blocks.append(
+                        _node_coords(block)))
+                elif keyword == 'DISPLAY_DATA_SECTION':
+                    _read_section(stream, lambda block: display.append(
+                        _node_coords(block)))
+                elif keyword == 'EDGE_WEIGHT_SECTION':
+                    if result['dimension'] is None:
+                        raise ValueError("EDGE_WEIGHT_SECTION without DIMENSION")
+                    weights = WeightMatrix(result['dimension'],
+                                           result['edge_weight_format'])
+                    _read_section(stream, lambda block: weights.fill(
+                        np.array(block.split(), dtype=float)))
+                    result['weights'] = weights
+                elif keyword == 'TOUR_SECTION':
+                    _read_section(stream, lambda block: tours.append(
+                        np.array(block.split(), dtype=np.int64)))
+                else:
+                    for (field, regex) in HEADER_FIELDS:
+                        match = regex.match(line)
+                        if match:
+                            _apply_header_field(result, field, match)
+        finally:
+            if mapping is not None:
+                mapping.close()
+    blocks = blocks or display
+    result['coords'] = np.concatenate(blocks) if blocks else np.zeros((0, 2))
+    result['nodes'] = result['coords'].astype(np.int64)
+    if tours:
+        tour = np.concatenate(tours)
+        # the tour ends with -1, other tours may follow
+        end = np.flatnonzero(tour < 0)
+        result['tour'] = (tour[:end[0]] if len(end) else tour) - 1
     return result
 
 
+def _apply_header_field(result, field, match):
+    """ Private: stores the value of a matched header field"""
+    if field == 'name':
+        result['name'] = match.group(1)
+    elif field == 'single_start':
+        result['startnodes'] = [int(match.group(1))]
+    elif field == 'multi_start':
+        result['startnodes'] = ast.literal_eval(match.group(1))
+    elif field == 'groups':
+        result['groups'] = ast.literal_eval(match.group(1).replace(" ", ""))
+    elif field == 'comment':
+        result['comment'] += match.group(1) + "\n"
+    elif field == 'dimension':
+        result['dimension'] = int(match.group(1))
+    else:
+        result[field] = match.group(1)
+
+
+def _read_section(stream, convert):
+    """ Private: reads the lines of a data section up to the next line
+        that starts with a keyword and passes them to the convert function
+        in blocks of complete lines. The rest of the block from that line
+        on is given back to the stream"""
+    while True:
+        block = stream.read(BLOCK_SIZE)
+        if not block:
+            return
+        if not block.endswith(b"\n"):
+            # the block ends with a complete line
+            block += stream.readline()
+        end = SECTION_END.search(block)
+        if end is not None:
+            stream.unread(block[end.start():])
+            block = block[:end.start()]
+        convert(block)
+        if end is not None:
+            return
+
+
+class _Stream(object):
+
+    """ Private: reads lines and blocks from a binary file or mapping.
+        Bytes that were read too far are given back with unread and are
+        read again first, so the file is never seeked, which a compressed
+        file can only do by decompressing it again"""
+
+    def __init__(self, source):
+        self._source = source
+        self._pending = b""
+        self._offset = 0
+
+    def unread(self, data):
+        """ Gives back data that is read again before the file"""
+        self._pending = data + self._pending[self._offset:]
+        self._offset = 0
+
+    def readline(self):
+        """ Returns the next line including its line break"""
+        if self._offset >= len(self._pending):
+            return self._source.readline()
+        end = self._pending.find(b"\n", self._offset)
+        if end < 0:
+            line = self._pending[self._offset:] + self._source.readline()
+            (self._pending, self._offset) = (b"", 0)
+            return line
+        line = self._pending[self._offset:end + 1]
+        self._offset = end + 1
+        return line
+
+    def read(self, size):
+        """ Returns the next size bytes, less at the end of the file"""
+        if self._offset >= len(self._pending):
+            return self._source.read(size)
+        data = self._pending[self._offset:self._offset + size]
+        self._offset += len(data)
+        if len(data) < size:
+            data += self._source.read(size - len(data))
+        return data
+
+
+def _node_coords(block):
+    """ Private: the coordinates of the node lines of a block.
+        Lines have the form 'id x y', in the common case every line holds
+        three values and the whole block is converted at once, otherwise
+        the lines are converted one by one and lines with less than three
+        values are skipped"""
+    values = block.split()
+    lines = block.count(b"\n") + (not block.endswith(b"\n"))
+    if len(values) == 3 * lines and np.all(_values_per_line(block) == 3):
+        coords = np.array(values, dtype=float).reshape(-1, 3)[:, 1:]
+    else:
+        coords = np.array([[float(value) for value in line.split()[1:3]]
+                           for line in block.splitlines()
+                           if len(line.split()) >= 3], dtype=float)
+    return coords.reshape(-1, 2)
+
+
+def _values_per_line(block):
+    """ Private: the number of whitespace separated values of every line
+        of a block"""
+    data = np.frombuffer(block, dtype=np.uint8)
+    space = WHITESPACE[data]
+    # a value starts at a non whitespace byte after whitespace
+    starts = ~space
+    starts[1:] &= space[:-1]
+    # the number of values before the end of every line
+    ends = np.searchsorted(np.flatnonzero(starts),
+                           np.flatnonzero(data == ord("\n")))
+    if not block.endswith(b"\n"):
+        ends = np.append(ends, np.count_nonzero(starts))
+    return np.diff(ends, prepend=0)
+
+
 def get_groups(nodes):
     """ return an array holding all occuring colorids of the given nodeset"""
     return list(set([node.color for node in nodes]))
@@ -108,44 +326,136 @@ def import_tsp(scale):
     """ Shows a filedialog to select a file to open and calls the callback
         with the parsed data  """
     # show a open-file-dialog
-    filename = askopenfile()
+    filename = askopenfile(filetypes=TSP_FILETYPES)
     # if the user selected a file, delete old data,parse the file and
     # load the new data. If the user canceled the selection, do nothing.
     if filename:
-        data = parse_tsp_file(filename.name)
+        return load_tsp_cached(filename.name, scale)
+    else:
+        return None
+
+
+def import_tspb():
+    """ Shows a filedialog to select a .tspb file and returns its data"""
+    filename = askopenfile(defaultextension=tspbinary.EXTENSION,
+                           filetypes=[("Binary TSP files",
+                                       "*" + tspbinary.EXTENSION),
+                                      ("All files", "*")])
+    if filename:
+        return tspbinary.load_tspb(filename.name)
+    else:
+        return None
+
 
-        #Construct the list of ungrouped nodes
-        color = tsputil.COLORS[0]
-        node_list = [Node(index, int(node[0] / scale), int(node[1] / scale), color)
-                     for (index, node) in enumerate(data['nodes'])]
+def load_tsp_cached(filename, scale):
+    """ Loads a .tsp file like load_tsp. The problem is read from the .tspb
+        cache next to the file if the cache is fresh, otherwise the file is
+        parsed and the cache is written"""
+    sidecar = tspbinary.fresh_sidecar(filename, scale)
+    if sidecar is not None:
+        return tspbinary.load_tspb(sidecar)
+    data = load_tsp(filename, scale)
+    tspbinary.store_sidecar(filename, scale, data)
+    return data
 
-        # if the nodes are grouped, change node colors accordingly
-        for (index, group) in enumerate(data['groups']):
-            for nid in group:
-                node_list[nid-1].color = tsputil.COLORS[index]
 
-        #mark nodes as startnode if specified
-        for nid in data['startnodes']:
-            node_list[nid].start = True
+def load_tsp(filename, scale, use_mmap=False):
+    """ Parses a .tsp file and returns its data with the nodes converted to
+        grid nodes of the given scale, the 'scale' of the nodes and the
+        'metric' of the problem. The distances of the other edge weight
+        types than EUC_2D are rounded, so their nodes keep the exact
+        coordinates with a scale of 1. Nodes of explicit weights without
+        display data are placed on a square grid."""
+    data = read_tsp_file(filename, use_mmap)
+    metric = Metric(data['edge_weight_type'], data['weights'])
 
-        result = data
-        result['nodes'] = node_list
-        return result
+    #Construct the list of ungrouped nodes
+    node_list = NodeStore()
+    if metric.is_euclidean():
+        node_list.add_coords((data['nodes'] / scale).astype(np.int64),
+                             tsputil.COLORS[0])
+    else:
+        scale = 1
+        coords = data['coords']
+        if not len(coords) and data['weights'] is not None:
+            coords = _grid_layout(len(data['weights']))
+        if np.all(coords == np.round(coords)):
+            coords = coords.astype(np.int64)
+        node_list.add_coords(coords, tsputil.COLORS[0])
+
+    # if the nodes are grouped, change node colors accordingly
+    for (index, group) in enumerate(data['groups']):
+        for nid in group:
+            node_list[nid-1].color = tsputil.COLORS[index]
+
+    #mark nodes as startnode if specified
+    for nid in data['startnodes']:
+        node_list[nid].start = True
+
+    result = data
+    result['nodes'] = node_list
+    result['scale'] = scale
+    result['metric'] = metric
+    return result
+
+
+def import_tour(dimension):
+    """ Shows a filedialog to select a .tour file and returns its tour for
+        a problem of the given dimension"""
+    filename = askopenfile(defaultextension=".tour", filetypes=TOUR_FILETYPES)
+    if filename:
+        return load_tour(filename.name, dimension)
     else:
         return None
 
 
-def export_tsp(nodes, scale, comment, pre_filename=None):
-    """ Exports the problem data in .tsp format  """
+def load_tour(filename, dimension):
+    """ Parses a .tour file and returns its name, comment and the 'tour' as
+        an array of the node ids of the closed path, which ends with its
+        first node. Raises ValueError if the file has no tour or the tour
+        doesn't visit every node of a problem of the given dimension once"""
+    data = read_tsp_file(filename)
+    tour = data['tour']
+    if tour is None:
+        raise ValueError("no TOUR_SECTION in " + os.path.basename(filename))
+    if data['dimension'] is not None and data['dimension'] != dimension:
+        raise ValueError("the tour is for " + str(data['dimension']) +
+                         " nodes, the problem has " + str(dimension))
+    if len(tour) and (tour.min() < 0 or tour.max() >= dimension):
+        raise ValueError("the tour visits nodes that don't exist")
+    if len(tour) != dimension or len(np.unique(tour)) != dimension:
+        raise ValueError("the tour doesn't visit every node once")
+    if len(tour):
+        tour = np.append(tour, tour[0])
+    return {'name': data['name'], 'comment': data['comment'], 'tour': tour}
+
+
+def _grid_layout(size):
+    """ Private: the coordinates of a square grid of the given number of
+        nodes, filled row by row"""
+    side = max(int(np.ceil(np.sqrt(size))), 1)
+    positions = np.arange(size)
+    return np.column_stack((positions % side, positions // side)) + 1
+
+
+def export_tsp(nodes, scale, comment, pre_filename=None, metric=None):
+    """ Exports the problem data in .tsp format with the edge weight type
+        of the given metric, by default EUC_2D. Explicit weights are
+        written as a LOWER_DIAG_ROW matrix and the coordinates of the nodes
+        as display data """
+    if metric is None:
+        metric = Metric()
     filename = pre_filename
     if comment is None:
         comment = "PUT PROBLEM DESCRIPTION HERE"
     # check if the function was called with a filename
     if filename is None:
-        filename = asksaveasfile(defaultextension=".tsp")
+        filename = asksaveasfile(defaultextension=".tsp",
+                                 filetypes=TSP_FILETYPES)
     # check if the user did select a file
     if filename:
-        _file = open(filename.name, 'w')
+        # a compressed file is written through its compression
+        _file = open_file(filename.name, 'w')
         _file.write("NAME : " + os.path.basename(filename.name) + "\n")
         _file.write("COMMENT : " + comment + "\n")
 
@@ -159,17 +469,84 @@ def export_tsp(nodes, scale, comment, pre_filename=None):
 
         _file.write("TYPE: TSP" + "\n")
         _file.write("DIMENSION: " + str(len(nodes)) + "\n")
-        _file.write("EDGE_WEIGHT_TYPE : EUC_2D" + "\n")
-        _file.write("NODE_COORD_SECTION" + "\n")
+        _file.write("EDGE_WEIGHT_TYPE : " + metric.edge_weight_type + "\n")
+        if metric.edge_weight_type == 'EXPLICIT':
+            _file.write("EDGE_WEIGHT_FORMAT : LOWER_DIAG_ROW" + "\n")
+            _file.write("DISPLAY_DATA_TYPE : TWOD_DISPLAY" + "\n")
+            _file.write("DISPLAY_DATA_SECTION" + "\n")
+        else:
+            _file.write("NODE_COORD_SECTION" + "\n")
 
-        for (index, node) in enumerate(nodes):
-            _file.write(str(index + 1) + "  " + str(node.x_coord * scale) +
-                        " " + str(node.y_coord * scale) + "\n")
+        # the coordinates of a store are read from its array, without
+        # creating a view for every node
+        if isinstance(nodes, NodeStore):
+            coords = nodes.arrays()[0].tolist()
+        else:
+            coords = [(node.x_coord, node.y_coord) for node in nodes]
+        _file.write("".join(
+            str(index + 1) + "  " + str(x_value * scale) + " " +
+            str(y_value * scale) + "\n"
+            for (index, (x_value, y_value)) in enumerate(coords)))
+        if metric.edge_weight_type == 'EXPLICIT':
+            _write_weights(_file, tsputil.node_coords(nodes), scale, metric)
         _file.write("EOF")
         _file.close()
         return os.path.basename(filename.name)
 
 
+def _write_weights(_file, coords, scale, metric):
+    """ Private: writes the EDGE_WEIGHT_SECTION of the explicit metric as a
+        lower triangular matrix including the diagonal, one row per node.
+        Integral rows are written as integers"""
+    _file.write("EDGE_WEIGHT_SECTION" + "\n")
+    for index in range(len(coords)):
+        row = metric.lengths(coords, scale, index, np.arange(index + 1))
+        if np.all(row == np.round(row)):
+            row = row.astype(np.int64)
+        _file.write(" ".join(str(value) for value in row.tolist()) + "\n")
+
+
+def export_tour(path, dimension, comment=None, pre_filename=None):
+    """ Exports the tour of the path in the TSPLIB .tour format. A closed
+        path is written without its last node, as a tour returns to its
+        first node. The length of the path is noted in the comment"""
+    filename = pre_filename
+    if filename is None:
+        filename = asksaveasfile(defaultextension=".tour",
+                                 filetypes=TOUR_FILETYPES)
+    if filename:
+        tour = list(path['Tour'])
+        if len(tour) > 1 and tour[0] == tour[-1]:
+            tour.pop()
+        with open_file(filename.name, 'w') as _file:
+            _file.write("NAME : " + os.path.basename(filename.name) + "\n")
+            if comment:
+                _file.write("COMMENT : " + comment + "\n")
+            if path.get('Tourlength') is not None:
+                _file.write("COMMENT : Length = " + str(path['Tourlength']) + "\n")
+            _file.write("TYPE : TOUR" + "\n")
+            _file.write("DIMENSION : " + str(dimension) + "\n")
+            _file.write("TOUR_SECTION" + "\n")
+            _file.write("".join(str(int(nid) + 1) + "\n" for nid in tour))
+            _file.write("-1" + "\n")
+            _file.write("EOF" + "\n")
+        return os.path.basename(filename.name)
+
+
+def export_tspb(nodes, scale, comment, metric=None, path=None,
+                pathsteps=None, pre_filename=None):
+    """ Exports the problem data with the current path and pathsteps in the
+        binary .tspb format"""
+    filename = pre_filename
+    if filename is None:
+        filename = asksaveasfile(defaultextension=tspbinary.EXTENSION)
+    if filename:
+        tspbinary.save_tspb(filename.name, nodes, scale, metric,
+                            os.path.basename(filename.name), comment or "",
+                            path, pathsteps)
+        return os.path.basename(filename.name)
+
+
 def export_tikz(nodes, scale, path):
     """ Exports the problem data as a tikz graphic in .tex format  """
     filename = asksaveasfile(defaultextension=".tex")
@@ -206,9 +583,7 @@ def export_tikz(nodes, scale, path):
             _file.write("\\addplot [draw=black,forget plot]\n")
             _file.write("table[row sep=crcr]{%\n")
             for path_node in path['Tour']:
-                print(path_node)
                 node = nodes[int(path_node)]
-                print(node)
                 _file.write(
                         str(node.x_coord * scale) + " " +
                         str(node.y_coord * scale) + "\\\\\n")
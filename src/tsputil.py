@@ -3,16 +3,28 @@
     Includes everything that doesn't fit in other modules and/or is
     used by more than one module"""
 import math
+import os
+import hashlib
+import tempfile
+import numpy as np
+from SpatialIndex import KDTree
+from NodeStore import NodeStore
 
 COLORS = ["Black", "Orange", "Cyan", "Magenta", "Yellow", "Blue",
           "White", "Brown", "Pink", "Gray", "Violet"]
 
 RESCOLORS = ["Red", "Green", "Purple"]
 
+# Length of a grid cell in the coordinates of a euclidean .tsp file
+GRID_SCALE = 100
+
 
 def reindex_nodes(nodes):
     """ Assigns node ids to a list of nodes according to their
         position in the list"""
+    if isinstance(nodes, NodeStore):
+        nodes.reindex()
+        return
     for (index, node) in enumerate(nodes):
         node.nid = index
 
@@ -33,40 +45,111 @@ def find_node_by_coords(coords, nodes):
         return None
 
 
-def get_path_length(nodes, scale, path):
+def node_coords(nodes):
+    """ Returns the coordinates of the given nodes as a (n, 2) array"""
+    if isinstance(nodes, NodeStore):
+        # the store already holds the coordinates in an array
+        return nodes.coords()
+    if not nodes:
+        return np.zeros((0, 2))
+    return np.array([(node.x_coord, node.y_coord) for node in nodes],
+                    dtype=float)
+
+
+def coordinate_positions(coords):
+    """ Returns a dictionary mapping every coordinate pair of the (n, 2)
+        array to the first position it occurs at"""
+    keys = [tuple(point) for point in coords.tolist()]
+    # later entries overwrite earlier ones, so the keys are added backwards
+    return dict(zip(reversed(keys), range(len(keys) - 1, -1, -1)))
+
+
+def spatial_index(nodes):
+    """ Builds a spatial index over the given nodes. The points of the
+        index are identified by the position of the node in the list"""
+    return KDTree(node_coords(nodes))
+
+
+def instance_hash(nodes, scale, metric=None):
+    """ Returns a hash of the node coordinates, the scale and the metric,
+        that identifies a problem independent of its file. Problems with
+        the euclidean metric have the hash of their coordinates and scale"""
+    digest = hashlib.sha1(node_coords(nodes).tobytes())
+    digest.update(repr(float(scale)).encode())
+    if metric is not None and not metric.is_euclidean():
+        digest.update(metric.fingerprint().encode())
+    return digest.hexdigest()
+
+
+def temp_directory():
+    """ Returns the directory for temporary files. A memory backed
+        file system is preferred if there is one."""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def cache_directory(name):
+    """ Returns (and creates) the directory for cached data of the given
+        name in the users cache directory"""
+    base = os.environ.get("XDG_CACHE_HOME",
+                          os.path.join(os.path.expanduser("~"), ".cache"))
+    directory = os.path.join(base, "tspedit", name)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            directory = tempfile.gettempdir()
+    return directory
+
+
+def get_path_length(nodes, scale, path, metric=None):
     """ Calculates the pathlength """
     result = 0
     for point in range(0, len(path) - 1):
         start = nodes[int(path[point])]
         end = nodes[int(path[point + 1])]
-        result += distance(start, end, scale)
+        result += distance(start, end, scale, metric)
     return result
 
 
-def distance(start, end, scale):
-    """ Calculates the euclidean distance between two nodes"""
-    return math.sqrt(math.pow((start.x_coord - end.x_coord) * scale, 2) +
-                     math.pow((start.y_coord - end.y_coord) * scale, 2))
+def distance(start, end, scale, metric=None):
+    """ Calculates the distance between two nodes with the given metric,
+        by default the euclidean distance"""
+    if metric is None or metric.is_euclidean():
+        return math.sqrt(math.pow((start.x_coord - end.x_coord) * scale, 2) +
+                         math.pow((start.y_coord - end.y_coord) * scale, 2))
+    return metric.distance((start.x_coord, start.y_coord),
+                           (end.x_coord, end.y_coord), scale,
+                           (start.nid, end.nid))
 
 
-def nearest_neighbor(nodes, origin):
-    """ Finds the distance of the nearest neighbor """
-    distances = [distance(origin, node, 100) for node in nodes]
+def nearest_neighbor(nodes, origin, cache=None):
+    """ Finds the distance of the nearest neighbor. If a distance cache
+        is given, the distances are read from the cache by node id """
+    if cache is None:
+        distances = [distance(origin, node, 100) for node in nodes]
+    else:
+        row = cache.row(origin.nid)
+        distances = [float(row[node.nid]) for node in nodes]
     if origin in nodes:
         distances[nodes.index(origin)] = float("Inf")
     result = min(distances)
     return (distances.index(result), result)
 
 
-def convex_hull_helper(nodes):
+def convex_hull_helper(nodes, index=None):
     """ calls the convex hull function from the tsputil module and
-        constructs the tour with the corresponding node objects"""
+        constructs the tour with the corresponding node objects. The nodes
+        of the hull points are looked up in the given CoordinateIndex of the
+        nodes or in a temporary one"""
     if len(nodes):
         # convert nodes into points (x,y)
-        points = [(node.x_coord, node.y_coord) for node in nodes]
+        coords = node_coords(nodes)
+        points = [tuple(point) for point in coords.tolist()]
+        find = index.find if index is not None else coordinate_positions(coords).get
         # get convex hull as list of ids
-        result = [find_node_by_coords(point, nodes).nid for
-                  point in convex_hull(points)]
+        result = [nodes[find(point)].nid for point in convex_hull(points)]
         result.append(result[0])
         return result
     else:
@@ -0,0 +1,78 @@
+"""
+    Tests of the exact solvers against brute force on small problems.
+    Run with python -m unittest discover tests
+"""
+import itertools
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+from BackgroundWorker import TaskContext
+from BranchAndBound import BranchAndBound
+from SolverModule import solve_held_karp
+
+# Largest problem solved by brute force
+BRUTE_FORCE_LIMIT = 9
+
+
+def problems():
+    """ Yields euclidean matrices of random points and matrices of random
+        weights with 4 to BRUTE_FORCE_LIMIT nodes"""
+    rng = np.random.RandomState(11)
+    for size in range(4, BRUTE_FORCE_LIMIT + 1):
+        for _ in range(3):
+            points = rng.randint(0, 100, (size, 2))
+            delta = points[:, np.newaxis] - points
+            yield np.sqrt((delta ** 2).sum(axis=2))
+            weights = rng.randint(1, 50, (size, size)).astype(float)
+            weights = np.triu(weights, 1)
+            yield weights + weights.T
+
+
+def tour_length(matrix, tour):
+    """ The length of a closed tour"""
+    return float(matrix[tour[:-1], tour[1:]].sum())
+
+
+def brute_force(matrix):
+    """ The length of the shortest tour, which starts at node 0"""
+    size = len(matrix)
+    orders = np.array(list(itertools.permutations(range(1, size))))
+    lengths = matrix[0, orders[:, 0]] + matrix[orders[:, -1], 0] + \
+        matrix[orders[:, :-1], orders[:, 1:]].sum(axis=1)
+    return float(lengths.min())
+
+
+class ExactSolverTest(unittest.TestCase):
+
+    def assert_tour(self, matrix, tour):
+        self.assertEqual(tour[0], tour[-1])
+        self.assertEqual(sorted(tour[:-1]), list(range(len(matrix))))
+
+    def test_held_karp(self):
+        for matrix in problems():
+            tour = solve_held_karp(matrix)
+            self.assert_tour(matrix, tour)
+            self.assertAlmostEqual(tour_length(matrix, tour),
+                                   brute_force(matrix))
+
+    def test_held_karp_cancelled(self):
+        context = TaskContext()
+        context.cancel()
+        self.assertIsNone(solve_held_karp(next(problems()), context))
+
+    def test_branch_and_bound(self):
+        for matrix in problems():
+            search = BranchAndBound(matrix, list(range(len(matrix))) + [0])
+            self.assertTrue(search.solve(60))
+            self.assert_tour(matrix, search.tour)
+            self.assertAlmostEqual(search.length, brute_force(matrix))
+            self.assertAlmostEqual(tour_length(matrix, search.tour),
+                                   search.length)
+
+
+if __name__ == '__main__':
+    unittest.main()
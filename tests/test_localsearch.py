@@ -0,0 +1,90 @@
+"""
+    Tests of the 2-opt and Or-opt local search.
+    Run with python -m unittest discover tests
+"""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+import tsputil
+from DataController import DataController
+from LocalSearch import LocalSearch
+from Metric import Metric
+from NodeStore import NodeStore
+
+# Number of nodes of the problems
+NODES = 300
+
+
+class LocalSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(4)
+
+    def problem(self, edge_weight_type='EUC_2D'):
+        """ Returns the datacontroller of random nodes"""
+        nodes = NodeStore()
+        nodes.add_coords([[self.rng.randint(0, 60), self.rng.randint(0, 40)]
+                          for _ in range(NODES)], tsputil.COLORS[0])
+        datacontroller = DataController()
+        datacontroller.commit_change('metric', Metric(edge_weight_type))
+        datacontroller.commit_change('nodes', nodes)
+        return datacontroller
+
+    def improve(self, search, tour, distances):
+        """ Runs the moves until none improves and checks every pass"""
+        length = distances.path_length(tour)
+        improved = True
+        while improved:
+            improved = False
+            for move in (search.two_opt, search.or_opt):
+                improved = move() or improved
+                result = search.tour()
+                self.assertEqual(result[0], result[-1])
+                self.assertEqual(sorted(result[:-1]), sorted(tour[:-1]))
+                self.assertLessEqual(distances.path_length(result),
+                                     length + 1e-6)
+                length = distances.path_length(result)
+        return search.tour()
+
+    def random_tour(self, nids):
+        tour = list(nids)
+        self.rng.shuffle(tour)
+        return tour + tour[:1]
+
+    def test_complete_tour(self):
+        for edge_weight_type in ('EUC_2D', 'MAN_2D', 'ATT'):
+            datacontroller = self.problem(edge_weight_type)
+            distances = datacontroller.get_distances()
+            tour = self.random_tour(range(NODES))
+            search = LocalSearch(distances, tour,
+                                 candidates=datacontroller.get_candidates())
+            result = self.improve(search, tour, distances)
+            self.assertLess(distances.path_length(result),
+                            distances.path_length(tour))
+
+    def test_partial_tour(self):
+        datacontroller = self.problem()
+        distances = datacontroller.get_distances()
+        tour = self.random_tour(self.rng.sample(range(NODES), NODES // 3))
+        search = LocalSearch(distances, tour,
+                             candidates=datacontroller.get_candidates())
+        self.improve(search, tour, distances)
+
+    def test_fixed_edge(self):
+        datacontroller = self.problem()
+        distances = datacontroller.get_distances()
+        tour = self.random_tour(range(NODES))
+        fixed = (tour[0], tour[1])
+        search = LocalSearch(distances, tour, fixed=fixed)
+        result = self.improve(search, tour, distances)[:-1]
+        position = result.index(fixed[0])
+        self.assertIn(fixed[1], (result[position - 1],
+                                 result[(position + 1) % len(result)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+    Tests of the explicit edge weights when nodes are deleted and of the
+    neighbors the solvers search under explicit weights.
+    Run with python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+import tsputil
+import tspio
+from DataController import DataController
+from Metric import Metric
+from NodeStore import NodeStore
+from SolverModule import SolverModule
+from WeightMatrix import WeightMatrix
+
+# A symmetric FULL_MATRIX of 5 nodes with distinct weights
+WEIGHTS = [[0, 1, 2, 3, 4],
+           [1, 0, 5, 6, 7],
+           [2, 5, 0, 8, 9],
+           [3, 6, 8, 0, 10],
+           [4, 7, 9, 10, 0]]
+
+
+class DeleteNodeTest(unittest.TestCase):
+
+    def setUp(self):
+        weights = WeightMatrix(len(WEIGHTS))
+        weights.fill(np.ravel(WEIGHTS))
+        nodes = NodeStore()
+        nodes.add_coords([[index, 0] for index in range(len(WEIGHTS))],
+                         tsputil.COLORS[0])
+        self.datacontroller = DataController()
+        self.datacontroller.commit_change('scale', 1)
+        self.datacontroller.commit_change('metric',
+                                          Metric('EXPLICIT', weights))
+        self.datacontroller.commit_change('nodes', nodes)
+        # compute the matrix, so deleting patches it
+        self.datacontroller.get_distances().matrix()
+
+    def assert_weights(self, expected):
+        nodes = self.datacontroller.get_data('nodes')
+        metric = self.datacontroller.get_data('metric')
+        distances = self.datacontroller.get_distances()
+        for start in range(len(nodes)):
+            for end in range(len(nodes)):
+                self.assertEqual(distances.distance(start, end),
+                                 expected[start][end])
+                self.assertEqual(tsputil.distance(nodes[start], nodes[end],
+                                                  1, metric),
+                                 expected[start][end])
+        self.assertTrue(np.array_equal(distances.matrix(), expected))
+
+    def test_delete_first_node(self):
+        self.datacontroller.delete_node(0)
+        self.assert_weights(np.delete(np.delete(WEIGHTS, 0, 0), 0, 1))
+
+    def test_delete_inner_nodes(self):
+        self.datacontroller.delete_node(2)
+        self.datacontroller.delete_node(1)
+        expected = np.delete(np.delete(WEIGHTS, [1, 2], 0), [1, 2], 1)
+        self.assert_weights(expected)
+
+    def test_delete_added_node(self):
+        nodes = self.datacontroller.get_data('nodes')
+        nodes.add(4, 3, tsputil.COLORS[0])
+        self.datacontroller.commit_change('nodes', nodes)
+        self.datacontroller.delete_node(0)
+        distances = self.datacontroller.get_distances()
+        metric = self.datacontroller.get_data('metric')
+        self.assertEqual(len(metric.weights), 4)
+        # the added node is measured like EUC_2D
+        self.assertEqual(distances.distance(3, 4), 3.0)
+        self.assertEqual(distances.distance(0, 1), 5.0)
+
+
+class ExplicitNeighborTest(unittest.TestCase):
+
+    def setUp(self):
+        # distances of random points, the nodes are placed on a grid
+        points = np.random.RandomState(3).randint(0, 1000, (40, 2))
+        delta = points[:, np.newaxis] - points
+        self.weights = np.round(np.sqrt((delta ** 2).sum(axis=2)))
+        weights = WeightMatrix(len(points))
+        weights.fill(self.weights.ravel())
+        nodes = NodeStore()
+        nodes.add_coords(tspio._grid_layout(len(points)).tolist(),
+                         tsputil.COLORS[0])
+        self.datacontroller = DataController()
+        self.datacontroller.commit_change('scale', 1)
+        self.datacontroller.commit_change('metric',
+                                          Metric('EXPLICIT', weights))
+        self.datacontroller.commit_change('nodes', nodes)
+
+    def test_candidates_follow_the_weights(self):
+        candidates = self.datacontroller.get_candidates()
+        ids = np.arange(len(self.weights))
+        for nid in ids.tolist():
+            order = np.lexsort((ids, self.weights[nid])).tolist()
+            order.remove(nid)
+            self.assertEqual(candidates.k_nearest(nid), order[:10])
+
+    def test_nearest_neighbor(self):
+        tour = [0]
+        while len(tour) < len(self.weights):
+            row = self.weights[tour[-1]].copy()
+            row[tour] = np.inf
+            tour.append(int(np.argmin(row)))
+        solver = SolverModule(None, self.datacontroller, store=False)
+        solver.nearest_neighbor(start=0)
+        self.assertEqual(self.datacontroller.get_data('path')['Tour'],
+                         tour + [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
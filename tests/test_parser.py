@@ -0,0 +1,134 @@
+"""
+    Tests of the streaming .tsp parser against the regex parser it replaced.
+    Run with python -m unittest discover tests
+"""
+import ast
+import gzip
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+import tspio
+import tsputil
+from NodeStore import NodeStore
+
+# Number of nodes of the generated TSPLIB file
+NODES = 3000
+
+
+def reference_parse(filename):
+    """ The regex parser that read every line of a .tsp file before the
+        streaming parser"""
+    regexes = {'name': re.compile("NAME : (.*)"),
+               'comment': re.compile("COMMENT : (?!STARTNODE :|STARTNODES : "
+                                     "|CLUSTERS :)(.*)"),
+               'single_start': re.compile("COMMENT : STARTNODE : ([0-9])+"),
+               'multi_start': re.compile("COMMENT : STARTNODES : (.*)"),
+               'nodes': re.compile(
+                   r"([0-9]+)\ *([0-9]*\.?[0-9]*)\ *([0-9]*\.?[0-9]*)",
+                   re.MULTILINE),
+               'groups': re.compile("COMMENT : CLUSTERS : (.*)")}
+    result = {'name': 'No Name', 'comment': '', 'startnodes': [],
+              'nodes': [], 'groups': []}
+    with open(filename, 'r') as _file:
+        for line in _file.readlines():
+            for (regex_name, regex) in regexes.items():
+                match = re.match(regex, line)
+                if not match:
+                    continue
+                if regex_name == 'name':
+                    result['name'] = match.group(1)
+                elif regex_name == 'single_start':
+                    result['startnodes'] = [int(match.group(1))]
+                elif regex_name == 'multi_start':
+                    result['startnodes'] = ast.literal_eval(match.group(1))
+                elif regex_name == 'groups':
+                    result['groups'] = ast.literal_eval(
+                        match.group(1).replace(" ", ""))
+                elif regex_name == 'comment':
+                    result['comment'] += match.group(1) + "\n"
+                elif regex_name == 'nodes':
+                    result['nodes'].append([int(float(match.group(2))),
+                                            int(float(match.group(3)))])
+    return result
+
+
+class ParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.files = [self.write_tsplib(), self.write_export()]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_tsplib(self):
+        """ Writes a TSPLIB file with integer and decimal coordinates"""
+        rng = random.Random(3)
+        lines = ["NAME : random", "COMMENT : generated", "TYPE : TSP",
+                 "DIMENSION : " + str(NODES), "EDGE_WEIGHT_TYPE : EUC_2D",
+                 "NODE_COORD_SECTION"]
+        for nid in range(NODES):
+            x_value = rng.choice([str(rng.randint(0, 9999)),
+                                  "%.3f" % rng.uniform(0, 9999)])
+            lines.append("%d %s %.2f" % (nid + 1, x_value,
+                                         rng.uniform(0, 5000)))
+        filename = os.path.join(self.directory, 'random.tsp')
+        with open(filename, 'w') as _file:
+            _file.write("\n".join(lines + ["EOF"]) + "\n")
+        return filename
+
+    def write_export(self):
+        """ Writes a problem with groups and start nodes like the editor"""
+        rng = random.Random(5)
+        nodes = NodeStore()
+        for nid in range(500):
+            nodes.add(rng.randint(0, 300), rng.randint(0, 300),
+                      tsputil.COLORS[nid % 3], start=nid in (3, 7))
+        filename = os.path.join(self.directory, 'export.tsp')
+        tspio.export_tsp(nodes, 100, "a comment",
+                         tsputil.FilenameWrapper(filename))
+        return filename
+
+    def assert_parsed(self, filename, expected, use_mmap=False):
+        result = tspio.parse_tsp_file(filename, use_mmap)
+        self.assertEqual(dict((key, result[key]) for key in expected),
+                         expected)
+
+    def test_plain(self):
+        for filename in self.files:
+            self.assert_parsed(filename, reference_parse(filename))
+
+    def test_mmap(self):
+        for filename in self.files:
+            self.assert_parsed(filename, reference_parse(filename), True)
+
+    def test_gzip(self):
+        for filename in self.files:
+            with open(filename, 'rb') as source:
+                with gzip.open(filename + '.gz', 'wb') as target:
+                    shutil.copyfileobj(source, target)
+            self.assert_parsed(filename + '.gz', reference_parse(filename))
+
+    def test_small_blocks(self):
+        # lines are split across the blocks of the numeric path
+        block_size = tspio.BLOCK_SIZE
+        try:
+            for size in (7, 64):
+                tspio.BLOCK_SIZE = size
+                for filename in self.files:
+                    expected = reference_parse(filename)
+                    self.assert_parsed(filename, expected)
+                    self.assert_parsed(filename, expected, True)
+        finally:
+            tspio.BLOCK_SIZE = block_size
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+    Tests of the StepLog against a plain list of steps.
+    Run with python -m unittest discover tests
+"""
+import json
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+import StepLog as steplog
+import tsputil
+from DataController import DataController
+from NodeStore import NodeStore
+from StepLog import StepLog
+
+# Number of nodes of the problem
+NODES = 120
+
+
+class StepLogTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(7)
+        nodes = NodeStore()
+        nodes.add_coords([[rng.randint(0, 50), rng.randint(0, 50)]
+                          for _ in range(NODES)], tsputil.COLORS[0])
+        self.datacontroller = DataController()
+        self.datacontroller.commit_change('nodes', nodes)
+        self.distances = self.datacontroller.get_distances()
+        # a small budget, so checkpoints are thinned out several times
+        self.budget = steplog.CHECKPOINT_BUDGET
+        steplog.CHECKPOINT_BUDGET = 100
+        (self.log, self.expected) = self.record(StepLog(self.distances),
+                                                [[]], rng)
+
+    def tearDown(self):
+        steplog.CHECKPOINT_BUDGET = self.budget
+
+    def record(self, log, expected, rng, count=400):
+        """ Appends random insertions and new tours to a log and to the
+            list of the expected tours"""
+        log.describe('Node 0', 'random')
+        for _ in range(count):
+            tour = list(expected[-1])
+            if len(tour) >= NODES or rng.random() < 0.01:
+                tour = rng.sample(range(NODES), rng.randint(1, 10))
+                log.add_tour(tour)
+            else:
+                nid = rng.choice([nid for nid in range(NODES)
+                                  if nid not in tour])
+                position = rng.randint(0, len(tour))
+                tour.insert(position, nid)
+                log.insert(position, nid)
+            expected.append(tour)
+        return (log, expected)
+
+    def assert_steps(self, log, expected):
+        self.assertEqual(len(log), len(expected))
+        # random access and stepping backwards rebuild from checkpoints
+        rng = random.Random(1)
+        indices = list(range(len(expected)))
+        indices += indices[::-1] + [rng.randrange(len(expected))
+                                    for _ in range(50)]
+        for index in indices:
+            step = log[index]
+            self.assertEqual(step['Tour'], expected[index])
+            self.assertAlmostEqual(step['Tourlength'], tsputil.get_path_length(
+                self.datacontroller.get_data('nodes'), self.distances.scale(),
+                expected[index]))
+
+    def test_steps(self):
+        self.assert_steps(self.log, self.expected)
+
+    def test_checkpoints_are_thinned(self):
+        self.assertGreater(self.log._interval, steplog.CHECKPOINT_INTERVAL)
+        self.assertLessEqual(self.log._stored, steplog.CHECKPOINT_BUDGET)
+
+    def test_copy(self):
+        for count in (1, 2, 33, 150, len(self.expected)):
+            copy = self.log.copy(count)
+            self.assert_steps(copy, self.expected[:count])
+            # the copy continues like the steps it was made from
+            (copy, expected) = self.record(copy, self.expected[:count],
+                                           random.Random(count), 100)
+            self.assert_steps(copy, expected)
+        self.assert_steps(self.log, self.expected)
+
+    def test_state(self):
+        state = json.loads(json.dumps(self.log.state()))
+        log = StepLog.from_state(self.distances, state)
+        self.assert_steps(log, self.expected)
+        self.assertEqual(log[-1]['Start'], 'Node 0')
+        (log, expected) = self.record(log, list(self.expected),
+                                      random.Random(2), 100)
+        self.assert_steps(log, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
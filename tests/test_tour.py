@@ -0,0 +1,79 @@
+"""
+    Tests of the TSPLIB .tour files.
+    Run with python -m unittest discover tests
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+import tspio
+import tsputil
+
+# Number of nodes of the problem
+NODES = 50
+
+
+class TourTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        tour = list(range(NODES))
+        random.Random(1).shuffle(tour)
+        self.path = {'Tour': tour + tour[:1], 'Tourlength': 1234.5}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def filename(self, name):
+        return os.path.join(self.directory, name)
+
+    def write(self, name, ids, dimension=None):
+        """ Writes a TOUR_SECTION of the given 1-based ids"""
+        lines = ["NAME : " + name, "TYPE : TOUR"]
+        if dimension is not None:
+            lines.append("DIMENSION : " + str(dimension))
+        lines += ["TOUR_SECTION"] + [str(nid) for nid in ids]
+        with open(self.filename(name), 'w') as _file:
+            _file.write("\n".join(lines + ["-1", "EOF"]) + "\n")
+        return self.filename(name)
+
+    def test_round_trip(self):
+        for name in ('tour.tour', 'tour.tour.gz', 'tour.tour.xz'):
+            tspio.export_tour(self.path, NODES, "a comment",
+                              tsputil.FilenameWrapper(self.filename(name)))
+            data = tspio.load_tour(self.filename(name), NODES)
+            self.assertEqual(data['tour'].tolist(), self.path['Tour'])
+            self.assertIn("Length = 1234.5", data['comment'])
+
+    def test_complete_tour(self):
+        filename = self.write('open.tour', range(NODES, 0, -1), NODES)
+        tour = tspio.load_tour(filename, NODES)['tour'].tolist()
+        self.assertEqual(tour, list(range(NODES - 1, -1, -1)) + [NODES - 1])
+
+    def test_reject_incomplete_tours(self):
+        tours = {'missing.tour': range(1, NODES),
+                 'duplicate.tour': [1] + list(range(1, NODES)),
+                 'unknown.tour': range(2, NODES + 2),
+                 'empty.tour': []}
+        for (name, ids) in tours.items():
+            filename = self.write(name, ids)
+            self.assertRaises(ValueError, tspio.load_tour, filename, NODES)
+
+    def test_reject_other_dimension(self):
+        filename = self.write('other.tour', range(1, NODES + 1), NODES + 1)
+        self.assertRaises(ValueError, tspio.load_tour, filename, NODES)
+
+    def test_reject_missing_section(self):
+        with open(self.filename('none.tour'), 'w') as _file:
+            _file.write("NAME : none\nTYPE : TOUR\nEOF\n")
+        self.assertRaises(ValueError, tspio.load_tour,
+                          self.filename('none.tour'), NODES)
+
+
+if __name__ == '__main__':
+    unittest.main()